@@ -0,0 +1,21 @@
+"""
+ASGI config for Buildly.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Requests to the async gateway (``/async/<service>/<model>/``) are performed on a persistent
+event loop, so a single worker can serve many concurrent requests to the underlying services,
+e.g. ``uvicorn buildly.asgi:application``.
+"""
+
+import os
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE",
+                      "buildly.settings.production")
+
+django.setup()
+
+from gateway.asgi import ASGIHandler  # noqa: E402
+
+application = ASGIHandler()
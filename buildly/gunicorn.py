@@ -0,0 +1,13 @@
+"""
+Gunicorn configuration for Buildly.
+
+In multi-process mode (`prometheus_multiproc_dir` is set) the metrics of exited workers are marked as dead,
+so their gauges aren't aggregated anymore.
+"""
+import os
+
+
+def child_exit(server, worker):
+    if 'prometheus_multiproc_dir' in os.environ:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
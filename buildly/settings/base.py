@@ -84,7 +84,11 @@ EXCEPTION_MIDDLEWARE = [
     'core.middleware.ExceptionMiddleware'
 ]
 
-MIDDLEWARE = MIDDLEWARE_DJANGO + MIDDLEWARE_CSRF + EXCEPTION_MIDDLEWARE
+METRICS_MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+]
+
+MIDDLEWARE = METRICS_MIDDLEWARE + MIDDLEWARE_DJANGO + MIDDLEWARE_CSRF + EXCEPTION_MIDDLEWARE
 
 ROOT_URLCONF = 'core.urls'
 
@@ -200,3 +204,76 @@ DEFAULT_ORG = os.getenv('DEFAULT_ORG')
 SWAGGER_SETTINGS = {
     'DEFAULT_INFO': 'gateway.urls.swagger_info',
 }
+
+# API Gateway
+
+# Swagger specs of logic modules are cached per process. A spec is served from the cache for
+# GATEWAY_SPEC_CACHE_TTL seconds and afterwards for GATEWAY_SPEC_CACHE_STALE_TTL seconds more
+# while it is revalidated in the background.
+GATEWAY_SPEC_CACHE_TTL = int(os.getenv('GATEWAY_SPEC_CACHE_TTL', 300))
+GATEWAY_SPEC_CACHE_STALE_TTL = int(os.getenv('GATEWAY_SPEC_CACHE_STALE_TTL', 60))
+
+# Upstream requests of the gateway reuse keep-alive connections. GATEWAY_HTTP_POOL_MAXSIZE is the
+# number of connections kept open per service host.
+GATEWAY_HTTP_POOL_CONNECTIONS = int(os.getenv('GATEWAY_HTTP_POOL_CONNECTIONS', 10))
+GATEWAY_HTTP_POOL_MAXSIZE = int(os.getenv('GATEWAY_HTTP_POOL_MAXSIZE', 10))
+
+# Asynchronous gateway requests share one aiohttp connector per event loop
+GATEWAY_ASYNC_CONNECTION_LIMIT = int(os.getenv('GATEWAY_ASYNC_CONNECTION_LIMIT', 100))
+GATEWAY_ASYNC_CONNECTION_LIMIT_PER_HOST = int(os.getenv('GATEWAY_ASYNC_CONNECTION_LIMIT_PER_HOST', 30))
+GATEWAY_DNS_CACHE_TTL = int(os.getenv('GATEWAY_DNS_CACHE_TTL', 300))
+GATEWAY_KEEPALIVE_TIMEOUT = int(os.getenv('GATEWAY_KEEPALIVE_TIMEOUT', 30))
+
+# Size of the thread pool for Django views and database access when Buildly is served via ASGI (buildly.asgi)
+GATEWAY_ASGI_THREADS = int(os.getenv('GATEWAY_ASGI_THREADS', 20))
+
+# Service responses passed through the gateway are streamed to the client in chunks of
+# GATEWAY_STREAMING_CHUNK_SIZE bytes if they are bigger than GATEWAY_STREAMING_THRESHOLD bytes
+GATEWAY_STREAMING_THRESHOLD = int(os.getenv('GATEWAY_STREAMING_THRESHOLD', 1024 * 1024))
+GATEWAY_STREAMING_CHUNK_SIZE = int(os.getenv('GATEWAY_STREAMING_CHUNK_SIZE', 64 * 1024))
+
+# GET responses of logic modules with a cache TTL are cached per process. The cache keeps at most
+# GATEWAY_RESPONSE_CACHE_MAX_SIZE bytes of response bodies and evicts least recently used responses.
+GATEWAY_RESPONSE_CACHE_MAX_SIZE = int(os.getenv('GATEWAY_RESPONSE_CACHE_MAX_SIZE', 64 * 1024 * 1024))
+
+# Identical concurrent GET requests to services share one upstream request (per process for threads and
+# per event loop for the async gateway)
+GATEWAY_REQUEST_COALESCING = False if os.getenv('GATEWAY_REQUEST_COALESCING') == 'False' else True
+
+# Default timeouts of requests to services in seconds, they can be set per logic module as well
+GATEWAY_CONNECT_TIMEOUT = float(os.getenv('GATEWAY_CONNECT_TIMEOUT', 5))
+GATEWAY_READ_TIMEOUT = float(os.getenv('GATEWAY_READ_TIMEOUT', 30))
+
+# Requests to a service fail fast with 503 after GATEWAY_CIRCUIT_BREAKER_FAILURES consecutive failures.
+# After GATEWAY_CIRCUIT_BREAKER_RESET_TIMEOUT seconds one request is let through to probe the service again.
+GATEWAY_CIRCUIT_BREAKER_FAILURES = int(os.getenv('GATEWAY_CIRCUIT_BREAKER_FAILURES', 5))
+GATEWAY_CIRCUIT_BREAKER_RESET_TIMEOUT = float(os.getenv('GATEWAY_CIRCUIT_BREAKER_RESET_TIMEOUT', 30))
+
+# Replicas of a logic module failing GATEWAY_EJECTION_FAILURES times in a row don't get requests
+# for GATEWAY_EJECTION_TIME seconds
+GATEWAY_EJECTION_FAILURES = int(os.getenv('GATEWAY_EJECTION_FAILURES', 3))
+GATEWAY_EJECTION_TIME = float(os.getenv('GATEWAY_EJECTION_TIME', 30))
+
+# Max. number of concurrent requests of a gateway process to one service (0 means unlimited), it can be set per
+# logic module as well. Requests wait GATEWAY_BULKHEAD_TIMEOUT seconds for a free slot and fail with 503 afterwards.
+GATEWAY_MAX_CONCURRENT_REQUESTS = int(os.getenv('GATEWAY_MAX_CONCURRENT_REQUESTS', 50))
+GATEWAY_BULKHEAD_TIMEOUT = float(os.getenv('GATEWAY_BULKHEAD_TIMEOUT', 10))
+
+# Max. number of requests in one request to the batch endpoint of the gateway
+GATEWAY_BATCH_MAX_REQUESTS = int(os.getenv('GATEWAY_BATCH_MAX_REQUESTS', 50))
+
+# If true, the durations of the phases of gateway requests are sent to the client in the Server-Timing header.
+# They are logged by the `gateway.timing` logger in any case.
+GATEWAY_SERVER_TIMING = False if os.getenv('GATEWAY_SERVER_TIMING') == 'False' else True
+
+# Metrics are served at /metrics only to clients from these comma-separated IP addresses or networks (p.e. the
+# network of the Prometheus server). The client address is taken from REMOTE_ADDR, forwarded headers are ignored.
+GATEWAY_METRICS_ALLOWED_NETWORKS = os.getenv('GATEWAY_METRICS_ALLOWED_NETWORKS', '127.0.0.1,::1').split(',')
+
+# Related objects of DataMesh models with a bulk lookup parameter are fetched with list requests. The comma-separated
+# lookup values of one request are at most DATAMESH_BULK_LOOKUP_MAX_LENGTH characters long, more are split into chunks.
+DATAMESH_BULK_LOOKUP_MAX_LENGTH = int(os.getenv('DATAMESH_BULK_LOOKUP_MAX_LENGTH', 2000))
+
+# DataMesh keeps LogicModuleModels and Relationships compiled in memory for DATAMESH_RELATIONSHIP_GRAPH_TTL seconds.
+# Changes drop them right away in the process making the change, other processes see them after the TTL.
+DATAMESH_RELATIONSHIP_GRAPH_TTL = float(os.getenv('DATAMESH_RELATIONSHIP_GRAPH_TTL', 60))
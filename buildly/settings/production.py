@@ -13,7 +13,7 @@ MIDDLEWARE_CORS = [
     'corsheaders.middleware.CorsMiddleware',
 ]
 
-MIDDLEWARE = MIDDLEWARE_CORS + MIDDLEWARE
+MIDDLEWARE = METRICS_MIDDLEWARE + MIDDLEWARE_CORS + MIDDLEWARE_DJANGO + MIDDLEWARE_CSRF + EXCEPTION_MIDDLEWARE
 
 CORS_ORIGIN_WHITELIST = os.environ['CORS_ORIGIN_WHITELIST'].split(',')
 
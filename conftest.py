@@ -3,6 +3,14 @@ import pytest
 from django.core.handlers.wsgi import WSGIRequest
 from rest_framework.test import APIRequestFactory
 
+from datamesh.graph import relationship_graph
+from gateway.balancing import load_balancers
+from gateway.breakers import circuit_breakers
+from gateway.bulkheads import bulkheads
+from gateway.cache import response_cache
+from gateway.sessions import session_pool
+from gateway.specs import spec_registry
+
 
 @pytest.fixture(scope='session')
 def request_factory():
@@ -25,3 +33,15 @@ def wsgi_request_factory():
         return WSGIRequest(environ)
 
     return _make_wsgi_request
+
+
+@pytest.fixture(autouse=True)
+def clear_gateway_caches():
+    """ Process-wide gateway caches must not leak between tests """
+    spec_registry.invalidate()
+    response_cache.clear()
+    circuit_breakers.reset()
+    bulkheads.reset()
+    load_balancers.reset()
+    session_pool.close()
+    relationship_graph.invalidate()
@@ -1,11 +1,14 @@
 import logging
 import json
 
+from django.db import connection
 from django.utils.deprecation import MiddlewareMixin
 from django.http import JsonResponse
 
 from .exceptions import SocialAuthFailed, SocialAuthNotConfigured
-from gateway.exceptions import PermissionDenied, EndpointNotFound, DataMeshError
+from gateway import metrics
+from gateway.asgi import DeferredGatewayResponse
+from gateway.exceptions import PermissionDenied, EndpointNotFound, DataMeshError, ServiceUnavailable
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +28,7 @@ MIDDLEWARE_EXCEPTIONS = (
     SocialAuthFailed,
     SocialAuthNotConfigured,
     DataMeshError,
+    ServiceUnavailable,
 )
 
 
@@ -36,3 +40,27 @@ class ExceptionMiddleware(MiddlewareMixin):
             return JsonResponse(data=json.loads(exception.content),
                                 status=exception.status)
         return None
+
+
+class MetricsMiddleware:
+    """
+    Tracks requests in flight and the number of database queries per request in the metrics.
+    Gateway responses completed later on the event loop (ASGI) are tracked until they are closed.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_metrics = metrics.RequestMetrics(request)
+        try:
+            with connection.execute_wrapper(request_metrics.query_counter):
+                response = self.get_response(request)
+        except Exception:
+            request_metrics.close()
+            raise
+        if isinstance(response, DeferredGatewayResponse):
+            response._closable_objects.append(request_metrics)
+        else:
+            request_metrics.close()
+        return response
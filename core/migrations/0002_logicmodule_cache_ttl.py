@@ -0,0 +1,18 @@
+# Generated by Django 2.2.4 on 2026-10-16 20:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='logicmodule',
+            name='cache_ttl',
+            field=models.PositiveIntegerField(blank=True, help_text='Seconds GET responses of the logic module are cached by the gateway. Responses are not cached if empty.', null=True, verbose_name='Response cache TTL'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.4 on 2026-10-16 20:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_logicmodule_cache_ttl'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='logicmodule',
+            name='connect_timeout',
+            field=models.FloatField(blank=True, help_text='Seconds the gateway waits for a connection to the service. GATEWAY_CONNECT_TIMEOUT is used if empty.', null=True),
+        ),
+        migrations.AddField(
+            model_name='logicmodule',
+            name='read_timeout',
+            field=models.FloatField(blank=True, help_text='Seconds the gateway waits for data from the service. GATEWAY_READ_TIMEOUT is used if empty.', null=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.4 on 2026-10-16 20:35
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_logicmodule_timeouts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='logicmodule',
+            name='load_balancing',
+            field=models.CharField(choices=[('round_robin', 'Round-robin'), ('least_outstanding', 'Least outstanding requests')], default='round_robin', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='logicmodule',
+            name='replica_endpoints',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=255), blank=True, default=list, help_text='Endpoints of further replicas of the service. The gateway balances requests between the endpoint and the replicas.', size=None),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.4 on 2026-10-16 20:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_logicmodule_replicas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='logicmodule',
+            name='max_concurrent_requests',
+            field=models.PositiveIntegerField(blank=True, help_text='Max. number of concurrent requests of a gateway process to the service, further requests wait for a free slot. GATEWAY_MAX_CONCURRENT_REQUESTS is used if empty, 0 means unlimited.', null=True),
+        ),
+    ]
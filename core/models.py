@@ -237,12 +237,37 @@ class EmailTemplate(models.Model):
 
 
 class LogicModule(models.Model):
+    LOAD_BALANCING_ROUND_ROBIN = 'round_robin'
+    LOAD_BALANCING_LEAST_OUTSTANDING = 'least_outstanding'
+    LOAD_BALANCING_CHOICES = (
+        (LOAD_BALANCING_ROUND_ROBIN, 'Round-robin'),
+        (LOAD_BALANCING_LEAST_OUTSTANDING, 'Least outstanding requests'),
+    )
+
     module_uuid = models.CharField(max_length=255, verbose_name='Logic Module UUID', default=uuid.uuid4, unique=True)
     name = models.CharField("Logic Module Name", max_length=255, blank=True)
     description = models.TextField("Description/Notes", max_length=765, null=True, blank=True)
     endpoint = models.CharField(blank=True, null=True, max_length=255)
     endpoint_name = models.CharField(blank=True, null=True, max_length=255)
+    replica_endpoints = ArrayField(models.CharField(max_length=255), blank=True, default=list,
+                                   help_text='Endpoints of further replicas of the service. The gateway balances '
+                                             'requests between the endpoint and the replicas.')
+    load_balancing = models.CharField(max_length=32, choices=LOAD_BALANCING_CHOICES,
+                                      default=LOAD_BALANCING_ROUND_ROBIN)
     docs_endpoint = models.CharField(blank=True, null=True, max_length=255)
+    cache_ttl = models.PositiveIntegerField('Response cache TTL', blank=True, null=True,
+                                            help_text='Seconds GET responses of the logic module are cached by the '
+                                                      'gateway. Responses are not cached if empty.')
+    connect_timeout = models.FloatField(blank=True, null=True,
+                                        help_text='Seconds the gateway waits for a connection to the service. '
+                                                  'GATEWAY_CONNECT_TIMEOUT is used if empty.')
+    read_timeout = models.FloatField(blank=True, null=True,
+                                     help_text='Seconds the gateway waits for data from the service. '
+                                               'GATEWAY_READ_TIMEOUT is used if empty.')
+    max_concurrent_requests = models.PositiveIntegerField(
+        blank=True, null=True,
+        help_text='Max. number of concurrent requests of a gateway process to the service, further requests wait '
+                  'for a free slot. GATEWAY_MAX_CONCURRENT_REQUESTS is used if empty, 0 means unlimited.')
     relationships = JSONField(blank=True, null=True)  # TODO: DEPRECATED. It wil be removed when the old data mesh is deleted
     core_groups = models.ManyToManyField(CoreGroup, verbose_name='Logic Module groups', blank=True, related_name='logic_module_set', related_query_name='logic_module')
     create_date = models.DateTimeField(null=True, blank=True)
@@ -1,7 +1,7 @@
 from django.contrib import admin
 
-from .models import LogicModuleModel, Relationship, JoinRecord
+from .models import LogicModuleModel, Relationship, JoinRecord, CompositeEndpoint, CompositeEndpointPart
 
 
-for model in [LogicModuleModel, Relationship, JoinRecord]:
+for model in [LogicModuleModel, Relationship, JoinRecord, CompositeEndpoint, CompositeEndpointPart]:
     admin.site.register(model)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class DatameshConfig(AppConfig):
     name = 'datamesh'
+
+    def ready(self):
+        from datamesh import signals  # noqa
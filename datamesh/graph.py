@@ -0,0 +1,134 @@
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Iterable, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+
+from .models import LogicModuleModel, Relationship
+
+
+class ModelNode(NamedTuple):
+    """ Immutable copy of a LogicModuleModel with the fields needed by DataMesh """
+    pk: uuid.UUID
+    logic_module_endpoint_name: str
+    model: str
+    endpoint: str
+    lookup_field_name: str
+    is_local: bool
+    bulk_lookup_param: str
+
+    @classmethod
+    def from_model(cls, logic_module_model: LogicModuleModel) -> 'ModelNode':
+        return cls(
+            pk=logic_module_model.pk,
+            logic_module_endpoint_name=logic_module_model.logic_module_endpoint_name,
+            model=logic_module_model.model,
+            endpoint=logic_module_model.endpoint,
+            lookup_field_name=logic_module_model.lookup_field_name,
+            is_local=logic_module_model.is_local,
+            bulk_lookup_param=logic_module_model.bulk_lookup_param,
+        )
+
+    def __str__(self):
+        return f'{self.logic_module_endpoint_name} - {self.model} - /{self.logic_module_endpoint_name}{self.endpoint}'
+
+
+class RelationshipEdge(NamedTuple):
+    """ Immutable copy of a Relationship between two nodes of the graph """
+    pk: uuid.UUID
+    key: str
+    origin_model: ModelNode
+    related_model: ModelNode
+
+    def __str__(self):
+        return f'{self.origin_model} -> {self.related_model}'
+
+
+class RelationshipGraph:
+    """
+    All LogicModuleModels and Relationships compiled into lookup tables: the models keyed by
+    (logic module endpoint name, endpoint) and for each model its relationships with direction
+    (True = forwards, False = backwards) like LogicModuleModel.get_relationships returns them.
+    """
+
+    def __init__(self, logic_module_models: Iterable[LogicModuleModel], relationships: Iterable[Relationship]):
+        nodes = {model.pk: ModelNode.from_model(model) for model in logic_module_models}
+        adjacency = defaultdict(list)
+        for relationship in relationships:
+            edge = RelationshipEdge(
+                pk=relationship.pk,
+                key=relationship.key,
+                origin_model=nodes[relationship.origin_model_id],
+                related_model=nodes[relationship.related_model_id],
+            )
+            adjacency[edge.origin_model.pk].append((edge, True))
+            if edge.related_model.pk != edge.origin_model.pk:
+                adjacency[edge.related_model.pk].append((edge, False))
+        self._models = {(node.logic_module_endpoint_name, node.endpoint): node for node in nodes.values()}
+        self._relationships = {pk: tuple(edges) for pk, edges in adjacency.items()}
+
+    @classmethod
+    def build(cls) -> 'RelationshipGraph':
+        return cls(LogicModuleModel.objects.all(), Relationship.objects.all())
+
+    def get_model(self, logic_module_endpoint: str, model_endpoint: str) -> ModelNode:
+        try:
+            return self._models[(logic_module_endpoint, model_endpoint)]
+        except KeyError:
+            raise LogicModuleModel.DoesNotExist(
+                f'LogicModuleModel matching query does not exist: /{logic_module_endpoint}{model_endpoint}')
+
+    def get_relationships(self, model: ModelNode) -> Tuple[Tuple[RelationshipEdge, bool], ...]:
+        return self._relationships.get(model.pk, ())
+
+
+class RelationshipGraphRegistry:
+    """
+    Process-wide relationship graph. It's built with two queries when it's needed and kept for `ttl`
+    seconds. Changes of LogicModuleModels or Relationships drop it right away in the process making
+    the change (see datamesh.signals), other processes see them when their graph expires.
+    """
+
+    def __init__(self, ttl: float = None):
+        self._ttl = ttl
+        self._entry = None  # (graph, built at)
+        self._version = 0
+        self._lock = threading.Lock()
+        self._version_lock = threading.Lock()
+
+    @property
+    def ttl(self) -> float:
+        return self._ttl if self._ttl is not None else settings.DATAMESH_RELATIONSHIP_GRAPH_TTL
+
+    def get(self) -> RelationshipGraph:
+        graph = self._get_fresh_graph()
+        if graph is not None:
+            return graph
+        with self._lock:
+            # the graph could have been built by another thread while waiting for the lock
+            graph = self._get_fresh_graph()
+            if graph is not None:
+                return graph
+            version = self._version
+            graph = RelationshipGraph.build()
+            with self._version_lock:
+                # don't keep a graph that was built while the models changed
+                if version == self._version:
+                    self._entry = (graph, time.monotonic())
+            return graph
+
+    def _get_fresh_graph(self) -> Optional[RelationshipGraph]:
+        entry = self._entry
+        if entry is not None and time.monotonic() - entry[1] < self.ttl:
+            return entry[0]
+        return None
+
+    def invalidate(self) -> None:
+        with self._version_lock:
+            self._version += 1
+            self._entry = None
+
+
+relationship_graph = RelationshipGraphRegistry()
@@ -1,6 +1,8 @@
-from typing import Any
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Tuple
 
-from django.db.models import Manager, QuerySet, Model
+from django.db.models import Manager, QuerySet, Model, Q
 from django.db.models.functions import Concat
 
 from gateway import utils
@@ -16,11 +18,20 @@ class LogicModuleModelManager(Manager):
 
 class JoinRecordManager(Manager):
 
+    @staticmethod
+    def get_origin_key(origin_pk: Any) -> str:
+        """Origin pk as string, UUIDs in their canonical form."""
+        origin_pk = str(origin_pk)
+        return str(uuid.UUID(origin_pk)) if utils.valid_uuid4(origin_pk) else origin_pk
+
     def get_join_records(self,
                          origin_pk: Any,
-                         relationship: Model,
+                         relationship: Any,
                          is_forward_relationship: bool) -> QuerySet:
-        """Get JoinRecords for relation on origin_pk in a certain direction."""
+        """
+        Get JoinRecords for relation on origin_pk in a certain direction.
+        The relationship can be a Relationship or an edge of the relationship graph.
+        """
         if utils.valid_uuid4(str(origin_pk)):
             pk_field = 'record_uuid'
         else:
@@ -28,4 +39,33 @@ class JoinRecordManager(Manager):
         if not is_forward_relationship:
             pk_field = 'related_' + pk_field
 
-        return self.filter(relationship=relationship).filter(**{pk_field: str(origin_pk)})
+        return self.filter(relationship=relationship.pk).filter(**{pk_field: str(origin_pk)})
+
+    def get_join_records_index(self,
+                               origin_pks: Iterable[Any],
+                               relationships: Iterable[Tuple[Any, bool]]) -> Dict[Tuple[Any, str], List[Model]]:
+        """
+        Get JoinRecords of many origin records for relations in a certain direction at once, with one query per
+        pk type (id and uuid). They are indexed by the relationship pk and the origin key (see get_origin_key).
+        """
+        relationships = list(relationships)
+        origin_keys = {self.get_origin_key(origin_pk) for origin_pk in origin_pks}
+        keys_by_type = {
+            'id': [key for key in origin_keys if not utils.valid_uuid4(key)],
+            'uuid': [key for key in origin_keys if utils.valid_uuid4(key)],
+        }
+
+        index = defaultdict(list)
+        for pk_type, keys in keys_by_type.items():
+            if not keys or not relationships:
+                continue
+            query = Q()
+            pk_fields = {}
+            for relationship, is_forward_relationship in relationships:
+                pk_field = f'record_{pk_type}' if is_forward_relationship else f'related_record_{pk_type}'
+                pk_fields[relationship.pk] = pk_field
+                query |= Q(relationship=relationship.pk, **{f'{pk_field}__in': keys})
+            for join_record in self.filter(query):
+                origin_key = str(getattr(join_record, pk_fields[join_record.relationship_id]))
+                index[(join_record.relationship_id, origin_key)].append(join_record)
+        return dict(index)
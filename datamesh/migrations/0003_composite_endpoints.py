@@ -0,0 +1,37 @@
+# Generated by Django 2.2.4 on 2026-10-16 20:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datamesh', '0002_auto_20190918_1659'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompositeEndpoint',
+            fields=[
+                ('composite_endpoint_uuid', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.SlugField(help_text="Name of the endpoint in the URL, p.e.: 'dashboard' for '/composite/dashboard/'", max_length=64, unique=True)),
+                ('description', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CompositeEndpointPart',
+            fields=[
+                ('composite_endpoint_part_uuid', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('key', models.SlugField(help_text="The key in the response body, where the data of the part will be saved into, p.e.: 'siteprofiles'.", max_length=64)),
+                ('object_id', models.CharField(blank=True, help_text="ID of the object for a detail request, the list is requested if it's empty", max_length=255)),
+                ('query', models.CharField(blank=True, help_text="Query string of the request, p.e.: 'status=active&limit=10'", max_length=1024)),
+                ('composite_endpoint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='parts', to='datamesh.CompositeEndpoint')),
+                ('logic_module_model', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='composite_endpoint_parts', to='datamesh.LogicModuleModel')),
+            ],
+            options={
+                'unique_together': {('composite_endpoint', 'key')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.4 on 2026-10-16 20:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datamesh', '0003_composite_endpoints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='logicmodulemodel',
+            name='bulk_lookup_param',
+            field=models.CharField(blank=True, help_text="Query parameter of the list endpoint filtering by many comma-separated lookup values, p.e.: 'id__in'. Related objects of the model are fetched in bulk if it's set.", max_length=64),
+        ),
+    ]
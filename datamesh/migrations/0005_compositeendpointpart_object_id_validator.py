@@ -0,0 +1,19 @@
+# Generated by Django 2.2.10 on 2026-10-16 22:26
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datamesh', '0004_logicmodulemodel_bulk_lookup_param'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='compositeendpointpart',
+            name='object_id',
+            field=models.CharField(blank=True, help_text="ID of the object for a detail request, the list is requested if it's empty", max_length=255, validators=[django.core.validators.RegexValidator('^(?!\\.\\.?$)[^/?#]+$', message='Enter an ID without slashes, question marks or hash signs.')]),
+        ),
+    ]
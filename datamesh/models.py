@@ -2,11 +2,13 @@ import uuid
 from typing import Tuple, List
 
 from django.core.exceptions import ValidationError
+from django.core.validators import RegexValidator
 from django.db import models
 from django.db.models import CheckConstraint, Q, UniqueConstraint
 
 from core.models import Organization
 from datamesh.managers import JoinRecordManager, LogicModuleModelManager
+from gateway import API_GATEWAY_PATH_SEGMENT_REGEX
 
 
 class LogicModuleModel(models.Model):
@@ -16,6 +18,7 @@ class LogicModuleModel(models.Model):
     endpoint = models.CharField(max_length=255, help_text="Endpoint of the model with leading and trailing slashs, p.e.: '/siteprofiles/'")
     lookup_field_name = models.SlugField(max_length=64, default='id', help_text="Name of the field in the model for detail methods, p.e.: 'id' or 'uuid'")
     is_local = models.BooleanField(default=False, help_text="Local model is taken from Buildly")
+    bulk_lookup_param = models.CharField(max_length=64, blank=True, help_text="Query parameter of the list endpoint filtering by many comma-separated lookup values, p.e.: 'id__in'. Related objects of the model are fetched in bulk if it's set.")
 
     objects = LogicModuleModelManager()
 
@@ -145,3 +148,27 @@ class JoinRecord(models.Model):
     def __str__(self):
         return f'{self.relationship} - ' \
             f'{self.record_id or self.record_uuid} -> {self.related_record_id or self.related_record_uuid}'
+
+
+class CompositeEndpoint(models.Model):
+    composite_endpoint_uuid = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.SlugField(max_length=64, unique=True, help_text="Name of the endpoint in the URL, p.e.: 'dashboard' for '/composite/dashboard/'")
+    description = models.TextField(blank=True)
+
+    def __str__(self):
+        return self.name
+
+
+class CompositeEndpointPart(models.Model):
+    composite_endpoint_part_uuid = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    composite_endpoint = models.ForeignKey(CompositeEndpoint, related_name='parts', on_delete=models.CASCADE)
+    key = models.SlugField(max_length=64, help_text="The key in the response body, where the data of the part will be saved into, p.e.: 'siteprofiles'.")
+    logic_module_model = models.ForeignKey(LogicModuleModel, related_name='composite_endpoint_parts', on_delete=models.CASCADE)
+    object_id = models.CharField(max_length=255, blank=True, validators=[RegexValidator(API_GATEWAY_PATH_SEGMENT_REGEX, message='Enter an ID without slashes, question marks or hash signs.')], help_text="ID of the object for a detail request, the list is requested if it's empty")
+    query = models.CharField(max_length=1024, blank=True, help_text="Query string of the request, p.e.: 'status=active&limit=10'")
+
+    class Meta:
+        unique_together = ('composite_endpoint', 'key')
+
+    def __str__(self):
+        return f'{self.composite_endpoint} - {self.key}: {self.logic_module_model}'
@@ -2,7 +2,7 @@ from collections import OrderedDict
 
 from rest_framework import serializers
 
-from datamesh.models import JoinRecord, Relationship, LogicModuleModel
+from datamesh.models import CompositeEndpoint, CompositeEndpointPart, JoinRecord, Relationship, LogicModuleModel
 
 
 class LogicModuleModelSerializer(serializers.ModelSerializer):
@@ -88,3 +88,19 @@ class JoinRecordSerializer(serializers.ModelSerializer):
         model = JoinRecord
         exclude = ('relationship', )
         read_only_fields = ('organization', )
+
+
+class CompositeEndpointPartSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = CompositeEndpointPart
+        fields = '__all__'
+
+
+class CompositeEndpointSerializer(serializers.ModelSerializer):
+
+    parts = CompositeEndpointPartSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = CompositeEndpoint
+        fields = '__all__'
@@ -1,12 +1,19 @@
 import logging
 import asyncio
-from typing import Any, Dict, Generator, Union
+from collections import OrderedDict
+from typing import Any, Dict, Generator, List, Tuple, Union
 
 from django.apps import apps
+from django.conf import settings
+from django.db.models import QuerySet
 from django.forms.models import model_to_dict
 
-from .models import LogicModuleModel, Relationship, JoinRecord
-from .utils import prepare_lookup_kwargs
+from gateway import metrics
+from gateway.explain import ExecutionPlan
+from gateway.timing import Timings
+from .graph import RelationshipEdge, relationship_graph
+from .models import JoinRecord
+from .utils import chunk_values, prepare_lookup_kwargs
 from .exceptions import DatameshConfigurationError
 
 logger = logging.getLogger(__name__)
@@ -16,15 +23,38 @@ class DataMesh:
     """
     Encapsulates aggregation of data from different services (logic modules).
     For each model DataMesh object should be created.
+    Time spent on database queries and on requests to services is recorded in the phases
+    `datamesh-db` and `datamesh-upstream` of the timings, relationships, join record queries
+    and local lookups are recorded in the execution plan.
+    Join records of all objects of the data are fetched at once and looked up in an index.
+    Related objects of models with a bulk lookup parameter are fetched with a few list requests
+    instead of one request per object. Models and relationships are taken from the compiled
+    relationship graph of the process.
     """
 
-    def __init__(self, logic_module_endpoint: str, model_endpoint: str, access_validator: Any = None):
-        self._logic_module_model = LogicModuleModel.objects.get(logic_module_endpoint_name=logic_module_endpoint,
-                                                                endpoint=model_endpoint)
-        self._relationships = self._logic_module_model.get_relationships()
+    def __init__(self, logic_module_endpoint: str, model_endpoint: str, access_validator: Any = None,
+                 timings: Timings = None, plan: ExecutionPlan = None):
+        self._timings = timings if timings is not None else Timings()
+        self._plan = plan if plan is not None else ExecutionPlan(enabled=False)
+        with self._plan.step('relationships', model=f'/{logic_module_endpoint}{model_endpoint}') as step:
+            graph = relationship_graph.get()
+            self._logic_module_model = graph.get_model(logic_module_endpoint, model_endpoint)
+            self._relationships = graph.get_relationships(self._logic_module_model)
+            step['relationships'] = [{
+                'key': relationship.key,
+                'direction': 'forward' if is_forward_lookup else 'reverse',
+                'related_model': str(relationship.related_model if is_forward_lookup else relationship.origin_model),
+            } for relationship, is_forward_lookup in self._relationships]
+        self._related_models = {
+            (model.logic_module_endpoint_name, model.endpoint.strip('/')): model
+            for relationship, _ in self._relationships
+            for model in (relationship.origin_model, relationship.related_model)
+        }
         self._origin_lookup_field = self._logic_module_model.lookup_field_name
         self._access_validator = access_validator
         self._cache = {}
+        self._join_records_index = {}
+        self._indexed_origin_keys = set()
 
     @property
     def related_logic_modules(self) -> list:
@@ -45,8 +75,16 @@ class DataMesh:
         """
         Gets list of related records' META-data that is used for retrieving data for each of these records
         """
+        origin_key = JoinRecord.objects.get_origin_key(origin_pk)
         for relationship, is_forward_lookup in self._relationships:
-            join_records = JoinRecord.objects.get_join_records(origin_pk, relationship, is_forward_lookup)
+            if origin_key in self._indexed_origin_keys:
+                join_records = self._join_records_index.get((relationship.pk, origin_key), [])
+            else:
+                with self._plan.step('join-records', relationship=relationship.key, origin_pk=str(origin_pk),
+                                     direction='forward' if is_forward_lookup else 'reverse') as step:
+                    join_records = list(JoinRecord.objects.get_join_records(origin_pk, relationship,
+                                                                            is_forward_lookup))
+                    step['count'] = len(join_records)
             if join_records:
                 related_model, related_record_field = prepare_lookup_kwargs(
                     is_forward_lookup, relationship, join_records[0])
@@ -62,124 +100,289 @@ class DataMesh:
 
                     yield relationship, params
 
-    def extend_data(self, data: Union[dict, list], client_map: Dict[str, Any]) -> None:
+    def index_join_records(self, data_items: List[dict]) -> None:
         """
-        Extends given data according to this DataMesh's relationships.
-        For getting extended data it uses a client objects (one for each related service).
+        Fetches the join records of all given objects for all relationships with one query per pk type
+        (instead of one query per object and relationship) and indexes them for get_related_records_meta
         """
-        if isinstance(data, dict):
-            # one-object JSON
-            self._add_nested_data(data, client_map)
-        elif isinstance(data, list):
-            # many-objects JSON
-            for data_item in data:
-                self._add_nested_data(data_item, client_map)
-
-    def _extend_with_local(self, data_item: dict, relationship: Relationship, params: dict) -> None:
-        """ Extend data from local object (via Django ORM query)"""
-        cache_key = f"{params['service']}.{params['model']}.{params['pk']}"
-        if cache_key in self._cache:
-            data_item[relationship.key].append(self._cache[cache_key])
+        origin_pks = [data_item.get(self._origin_lookup_field) for data_item in data_items
+                      if isinstance(data_item, dict)]
+        origin_pks = [origin_pk for origin_pk in origin_pks if origin_pk]
+        if not self._relationships or not origin_pks:
             return
-        try:
-            model = apps.get_model(app_label=params['service'], model_name=params['model'])
-        except LookupError as e:
-            raise DatameshConfigurationError(f'Data Mesh configuration error: {e}')
-        lookup = {
-            params['pk_name']: params['pk']
-        }
-        try:
-            obj = model.objects.get(**lookup)
-        except model.DoesNotExist as e:
-            logger.warning(f'{e}, params: {lookup}')
-        else:
-            # TODO: need to validate object access, like utils.validate_object_access(request, obj)
-            if self._access_validator:
-                if hasattr(self._access_validator, 'validate') and callable(self._access_validator.validate):
-                    self._access_validator.validate(obj)
-                else:
-                    raise DatameshConfigurationError(f'DataMesh Error: Access Validator should have validate method')
-            obj_dict = model_to_dict(obj)
-            data_item[relationship.key].append(obj_dict)
-            self._cache[cache_key] = obj_dict
+        relationship_keys = [relationship.key for relationship, _ in self._relationships]
+        with self._plan.step('join-records', relationships=relationship_keys, origins=len(origin_pks)) as step:
+            index = JoinRecord.objects.get_join_records_index(origin_pks, self._relationships)
+            step['count'] = sum(len(join_records) for join_records in index.values())
+        self._join_records_index.update(index)
+        self._indexed_origin_keys.update(JoinRecord.objects.get_origin_key(origin_pk) for origin_pk in origin_pks)
 
-    def _add_nested_data(self, data_item: dict, client_map: Dict[str, Any]) -> None:
+    def get_related_records(self, data: Union[dict, list]) -> List[Tuple[dict, RelationshipEdge, dict]]:
         """
-        Nest data retrieved from related services.
+        Gets META-data of the related records of all objects of the data together with the object and the
+        relationship they belong to. The relationship keys of the objects are initialized with empty lists.
         """
-        origin_pk = data_item.get(self._origin_lookup_field)
-        if not origin_pk:
-            raise DatameshConfigurationError(
-                f'DataMesh configuration error: lookup_field_name "{self._origin_lookup_field}" not found in response.'
-            )
+        data_items = data if isinstance(data, list) else [data] if isinstance(data, dict) else []
+        self.index_join_records(data_items)
+
+        related_records = []
+        for data_item in data_items:
+            origin_pk = data_item.get(self._origin_lookup_field)
+            if not origin_pk:
+                raise DatameshConfigurationError(
+                    f'DataMesh configuration error: lookup_field_name "{self._origin_lookup_field}" not found in '
+                    f'response.'
+                )
 
-        for relationship, _ in self._relationships:
-            data_item[relationship.key] = []
+            for relationship, _ in self._relationships:
+                data_item[relationship.key] = []
 
-        for relationship, params in self.get_related_records_meta(origin_pk):
+            for relationship, params in self.get_related_records_meta(origin_pk):
+                params['method'] = 'get'
+                related_records.append((data_item, relationship, params))
+        return related_records
+
+    def group_related_records(self,
+                              related_records: List[Tuple[dict, RelationshipEdge, dict]]) -> Tuple[dict, list, list]:
+        """
+        Splits related records into groups per related model with a bulk lookup parameter, which are fetched
+        with list requests, records of local models and the other records, which are requested one by one
+        """
+        bulk_groups = OrderedDict()
+        local_records = []
+        other_records = []
+        for related_record in related_records:
+            relationship, params = related_record[1:]
+            related_model = self._related_models.get((params['service'], params['model']))
             if relationship.related_model.is_local:
-                self._extend_with_local(data_item, relationship, params)
-                continue
-
-            params['method'] = 'get'
-            client = client_map.get(params['service'])
-
-            if hasattr(client, 'request') and callable(client.request):
-                content = client.request(**params)
-                if isinstance(content, tuple):  # assume that response body is the first returned value
-                    content = content[0]
-                if isinstance(content, dict):
-                    data_item[relationship.key].append(dict(content))
-                else:
-                    logger.error(f'No response data for join record (request params: {params})')
+                local_records.append(related_record)
+            elif related_model is not None and related_model.bulk_lookup_param and not related_model.is_local:
+                bulk_groups.setdefault((params['service'], params['model']), []).append(related_record)
             else:
-                raise DatameshConfigurationError(f'DataMesh Error: Client should have request method')
+                other_records.append(related_record)
+        return bulk_groups, local_records, other_records
+
+    def get_bulk_requests(self, related_records: List[Tuple[dict, RelationshipEdge, dict]]) -> List[dict]:
+        """
+        Request kwargs of the list requests fetching the related objects of a group of related records,
+        the lookup values are chunked, so the URLs don't exceed DATAMESH_BULK_LOOKUP_MAX_LENGTH
+        """
+        params = related_records[0][2]
+        related_model = self._related_models[(params['service'], params['model'])]
+        pks = list(OrderedDict.fromkeys(related_params['pk'] for _, _, related_params in related_records))
+        return [{
+            'method': 'get',
+            'service': params['service'],
+            'model': params['model'],
+            'pk': None,
+            'query': {related_model.bulk_lookup_param: ','.join(chunk)},
+        } for chunk in chunk_values(pks, settings.DATAMESH_BULK_LOOKUP_MAX_LENGTH)]
+
+    @staticmethod
+    def get_content(response: Any) -> Any:
+        if isinstance(response, tuple):  # assume that response body is the first returned value
+            return response[0]
+        return response
+
+    @classmethod
+    def index_objects(cls, response: Any, lookup_field: str) -> Dict[str, dict]:
+        """ Objects of a (paginated) list response by their lookup value """
+        content = cls.get_content(response)
+        if isinstance(content, dict):
+            content = content.get('results')
+        if not isinstance(content, list):
+            return {}
+        return {str(obj[lookup_field]): obj for obj in content if isinstance(obj, dict) and lookup_field in obj}
+
+    @staticmethod
+    def get_missing_records(related_records: List[Tuple[dict, RelationshipEdge, dict]],
+                            objects: Dict[str, dict]) -> Dict[str, dict]:
+        """
+        Request params of related records by their pk whose objects weren't in the list responses
+        (e.g. because of pagination), they are requested one by one
+        """
+        return OrderedDict((params['pk'], params) for _, _, params in related_records if params['pk'] not in objects)
+
+    @staticmethod
+    def scatter_objects(related_records: List[Tuple[dict, RelationshipEdge, dict]], objects: Dict[str, Any]) -> None:
+        """ Nests the fetched objects into the objects they are related to """
+        for data_item, relationship, params in related_records:
+            obj = objects.get(params['pk'])
+            if isinstance(obj, dict):
+                data_item[relationship.key].append(dict(obj))
+            else:
+                logger.error(f'No response data for join record (request params: {params})')
+
+    def extend_data(self, data: Union[dict, list], client_map: Dict[str, Any]) -> None:
+        """
+        Extends given data according to this DataMesh's relationships.
+        For getting extended data it uses a client objects (one for each related service).
+        Related objects of models with a bulk lookup parameter are fetched with list requests.
+        """
+        with self._timings.phase('datamesh-db'):
+            related_records = self.get_related_records(data)
+            bulk_groups, local_records, other_records = self.group_related_records(related_records)
+            self._extend_with_local(local_records)
+
+        fanout = 0
+        for (service, _), group_records in bulk_groups.items():
+            client = client_map.get(service)
+            lookup_field = group_records[0][2]['pk_name']
+            objects = {}
+            for request_kwargs in self.get_bulk_requests(group_records):
+                objects.update(self.index_objects(self._request(client, request_kwargs), lookup_field))
+                fanout += 1
+            for pk, params in self.get_missing_records(group_records, objects).items():
+                objects[pk] = self.get_content(self._request(client, params))
+                fanout += 1
+            self.scatter_objects(group_records, objects)
+
+        for data_item, relationship, params in other_records:
+            content = self.get_content(self._request(client_map.get(params['service']), params))
+            fanout += 1
+            if isinstance(content, dict):
+                data_item[relationship.key].append(dict(content))
+            else:
+                logger.error(f'No response data for join record (request params: {params})')
+        metrics.JOIN_FANOUT.observe(fanout)
+
+    def _request(self, client: Any, request_kwargs: dict) -> Any:
+        """ Performs a request to a related service """
+        if not hasattr(client, 'request') or not callable(client.request):
+            raise DatameshConfigurationError(f'DataMesh Error: Client should have request method')
+        with self._timings.phase('datamesh-upstream'):
+            response = client.request(**request_kwargs)
+        self._plan.count('join_requests')
+        return response
+
+    def _extend_with_local(self, related_records: List[Tuple[dict, RelationshipEdge, dict]]) -> None:
+        """
+        Extend data from local objects (via Django ORM query), objects of a model are queried at once
+        and serialized once
+        """
+        records_by_model = OrderedDict()
+        for related_record in related_records:
+            params = related_record[2]
+            records_by_model.setdefault((params['service'], params['model'], params['pk_name']), []).append(
+                related_record)
+
+        for (service, model_name, pk_name), model_records in records_by_model.items():
+            objects = self._get_local_objects(service, model_name, pk_name,
+                                              [params['pk'] for _, _, params in model_records])
+            for data_item, relationship, params in model_records:
+                obj_dict = objects.get(params['pk'])
+                if obj_dict is None:
+                    lookup = {pk_name: params['pk']}
+                    logger.warning(f'{service}.{model_name} matching query does not exist, params: {lookup}')
+                else:
+                    data_item[relationship.key].append(obj_dict)
+
+    def _get_local_objects(self, service: str, model_name: str, pk_name: str, pks: List[str]) -> Dict[str, dict]:
+        """ Serialized local objects by their lookup value, objects that were serialized already are cached """
+        model_label = f'{service}.{model_name}'
+        pks = list(OrderedDict.fromkeys(pks))
+        cached_pks = [pk for pk in pks if f'{model_label}.{pk}' in self._cache]
+        if cached_pks:
+            with self._plan.step('local', model=model_label, lookups=len(cached_pks), source='cache'):
+                pass
+        uncached_pks = [pk for pk in pks if f'{model_label}.{pk}' not in self._cache]
+        if uncached_pks:
+            try:
+                model = apps.get_model(app_label=service, model_name=model_name)
+            except LookupError as e:
+                raise DatameshConfigurationError(f'Data Mesh configuration error: {e}')
+            with self._plan.step('local', model=model_label, lookups=len(uncached_pks), source='database') as step:
+                objs = list(self._get_local_queryset(model).filter(**{f'{pk_name}__in': uncached_pks}))
+                step['found'] = len(objs)
+            if self._access_validator and objs:
+                self._validate_access(objs)
+            for obj in objs:
+                self._cache[f'{model_label}.{getattr(obj, pk_name)}'] = model_to_dict(obj)
+        return {pk: self._cache[f'{model_label}.{pk}'] for pk in pks if f'{model_label}.{pk}' in self._cache}
+
+    def _validate_access(self, objs: List[Any]) -> None:
+        """ Validates access to the objects of one model, at once if the validator supports it """
+        validate_many = getattr(self._access_validator, 'validate_many', None)
+        validate = getattr(self._access_validator, 'validate', None)
+        if callable(validate_many):
+            validate_many(objs)
+        elif callable(validate):
+            for obj in objs:
+                validate(obj)
+        else:
+            raise DatameshConfigurationError(f'DataMesh Error: Access Validator should have validate method')
+
+    def _get_local_queryset(self, model: Any) -> QuerySet:
+        """
+        Queryset of local objects with the relations needed for serializing them and validating access to them
+        """
+        queryset = model.objects.all()
+        many_to_many_fields = [field.name for field in model._meta.many_to_many]
+        if many_to_many_fields:
+            queryset = queryset.prefetch_related(*many_to_many_fields)
+        # object permissions are checked against the organization of the object
+        if self._access_validator and any(field.name == 'organization' and field.many_to_one
+                                          for field in model._meta.get_fields()):
+            queryset = queryset.select_related('organization')
+        return queryset
 
     async def async_extend_data(self, data: Union[dict, list], client_map: Dict[str, Any]):
         """
         Async aggregation logic
         """
+        await asyncio.gather(*self.prepare_async_tasks(data, client_map))
+
+    def prepare_async_tasks(self, data: Union[dict, list], client_map: Dict[str, Any]) -> list:
+        """
+        Creates a list of coroutines for extending data from other services asynchronously.
+        Join records and local models are queried here, so it can be called in a thread pool.
+        """
         tasks = []
-        if isinstance(data, dict):
-            # detailed view
-            tasks.extend(await self._prepare_tasks(data, client_map))
-        elif isinstance(data, list):
-            # list view
-            for data_item in data:
-                tasks.extend(await self._prepare_tasks(data_item, client_map))
-        await asyncio.gather(*tasks)
-
-    async def _prepare_tasks(self, data_item: dict, client_map: Dict[str, Any]) -> list:
-        """ Creates a list of coroutines for extending data from other services asynchronously """
-        tasks = []
+        fanout = 0
+        with self._timings.phase('datamesh-db'):
+            related_records = self.get_related_records(data)
+            bulk_groups, local_records, other_records = self.group_related_records(related_records)
+            self._extend_with_local(local_records)
 
-        origin_pk = data_item.get(self._origin_lookup_field)
-        if not origin_pk:
-            raise KeyError(
-                f'DataMesh Error: lookup_field_name "{self._origin_lookup_field}" not found in response.'
-            )
+            for (service, _), group_records in bulk_groups.items():
+                bulk_requests = self.get_bulk_requests(group_records)
+                tasks.append(self._extend_in_bulk(client_map.get(service), group_records, bulk_requests))
+                fanout += len(bulk_requests)
 
-        for relationship, _ in self._relationships:
-            data_item[relationship.key] = []
+            for data_item, relationship, params in other_records:
+                client = client_map.get(params['service'])
+                tasks.append(self._extend_content(client, data_item[relationship.key], **params))
+                fanout += 1
+        metrics.JOIN_FANOUT.observe(fanout)
+        return tasks
 
-        for relationship, params in self.get_related_records_meta(origin_pk):
-            if relationship.related_model.is_local:
-                self._extend_with_local(data_item, relationship, params)
-                continue
+    async def _extend_in_bulk(self, client: Any, related_records: List[Tuple[dict, RelationshipEdge, dict]],
+                              bulk_requests: List[dict]) -> None:
+        """ Fetches related objects with list requests and nests them into the objects they are related to """
+        objects = {}
+        responses = await asyncio.gather(*[self._async_request(client, request_kwargs)
+                                           for request_kwargs in bulk_requests])
+        for response in responses:
+            objects.update(self.index_objects(response, related_records[0][2]['pk_name']))
 
-            params['method'] = 'get'
-            client = client_map.get(params['service'])
-            tasks.append(self._extend_content(client, data_item[relationship.key], **params))
+        missing_records = self.get_missing_records(related_records, objects)
+        responses = await asyncio.gather(*[self._async_request(client, params) for params in missing_records.values()])
+        objects.update(zip(missing_records, map(self.get_content, responses)))
 
-        return tasks
+        self.scatter_objects(related_records, objects)
 
     async def _extend_content(self, client: Any, placeholder: list, **request_kwargs) -> None:
         """ Performs data request and extends data with received data """
 
-        content = await client.request(**request_kwargs)
-        if isinstance(content, tuple):  # assume that response body is the first returned value
-            content = content[0]
+        content = self.get_content(await self._async_request(client, request_kwargs))
         if isinstance(content, dict):
             placeholder.append(dict(content))
         else:
             logger.error(f'No response data for join record (request params: {request_kwargs})')
+
+    async def _async_request(self, client: Any, request_kwargs: dict) -> Any:
+        """ Performs a request to a related service asynchronously """
+        with self._timings.phase('datamesh-upstream'):
+            response = await client.request(**request_kwargs)
+        self._plan.count('join_requests')
+        return response
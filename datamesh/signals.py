@@ -0,0 +1,19 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from datamesh.graph import relationship_graph
+from datamesh.models import LogicModuleModel, Relationship
+
+
+@receiver(post_save, sender=LogicModuleModel)
+@receiver(post_delete, sender=LogicModuleModel)
+@receiver(post_save, sender=Relationship)
+@receiver(post_delete, sender=Relationship)
+def invalidate_relationship_graph(sender, **kwargs):
+    """
+    Drop the compiled relationship graph, so the next DataMesh request builds it again. It's dropped again
+    after the commit, so a graph built by another thread before the change was committed isn't kept.
+    """
+    relationship_graph.invalidate()
+    transaction.on_commit(relationship_graph.invalidate)
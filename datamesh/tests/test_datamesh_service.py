@@ -1,7 +1,10 @@
 import asyncio
+from unittest.mock import Mock
 
 import pytest
+from django.db import connection
 from django.forms.models import model_to_dict
+from django.test.utils import CaptureQueriesContext
 
 import factories
 from core.tests.fixtures import org
@@ -111,6 +114,65 @@ class TestSyncDataMesh:
             assert len(nested) == 1
             assert nested[0]['uuid'] == str(join_records[i].related_record_uuid)
 
+    def test_join_data_list_queries_join_records_once(self, relationship, relationship2):
+        for record_id in range(1, 6):
+            factories.JoinRecord(relationship=relationship, record_id=record_id, related_record_id=record_id * 10,
+                                 record_uuid=None, related_record_uuid=None)
+        factories.JoinRecord(relationship=relationship2, record_id=1, related_record_id=100,
+                             record_uuid=None, related_record_uuid=None)
+
+        logic_module_model = relationship.origin_model
+        data = [{'id': record_id} for record_id in range(1, 7)]
+
+        class ClientMock:
+            def request(self, **kwargs):
+                return {'id': int(kwargs['pk'])}
+        client_map = {
+            relationship.related_model.logic_module_endpoint_name: ClientMock(),
+            relationship2.related_model.logic_module_endpoint_name: ClientMock(),
+        }
+
+        datamesh = DataMesh(logic_module_endpoint=logic_module_model.logic_module_endpoint_name,
+                            model_endpoint=logic_module_model.endpoint)
+        with CaptureQueriesContext(connection) as queries:
+            datamesh.extend_data(data, client_map)
+
+        assert len(queries) == 1
+        assert [[obj['id'] for obj in item[relationship.key]] for item in data] == [[10], [20], [30], [40], [50], []]
+        assert data[0][relationship2.key] == [{'id': 100}]
+        assert all(item[relationship2.key] == [] for item in data[1:])
+
+    def test_join_data_list_in_bulk(self, relationship):
+        relationship.related_model.bulk_lookup_param = 'id__in'
+        relationship.related_model.save()
+        for record_id in range(1, 7):
+            factories.JoinRecord(relationship=relationship, record_id=record_id, related_record_id=record_id * 10,
+                                 record_uuid=None, related_record_uuid=None)
+
+        logic_module_model = relationship.origin_model
+        data = [{'id': record_id} for record_id in range(1, 7)]
+
+        # the list response of the related service misses the last object
+        requests = []
+
+        class ClientMock:
+            def request(self, **kwargs):
+                requests.append(kwargs)
+                if kwargs.get('query'):
+                    return [{'id': int(pk)} for pk in kwargs['query']['id__in'].split(',') if pk != '60']
+                return {'id': int(kwargs['pk'])}
+        client_map = {relationship.related_model.logic_module_endpoint_name: ClientMock()}
+
+        datamesh = DataMesh(logic_module_endpoint=logic_module_model.logic_module_endpoint_name,
+                            model_endpoint=logic_module_model.endpoint)
+        datamesh.extend_data(data, client_map)
+
+        assert [(request['pk'], request.get('query')) for request in requests] == [
+            (None, {'id__in': '10,20,30,40,50,60'}),
+            ('60', None),
+        ]
+        assert [item[relationship.key] for item in data] == [[{'id': pk}] for pk in range(10, 70, 10)]
+
     def test_relationship_with_local_lm(self, relationship_with_local, org):
         factories.JoinRecord(relationship=relationship_with_local, record_id=1,
                              related_record_uuid=org.organization_uuid,
@@ -133,6 +195,58 @@ class TestSyncDataMesh:
 
         assert data == expected_data
 
+    def test_relationship_with_local_lm_list(self, relationship_with_local):
+        orgs = [factories.Organization(name=f'Organization {i}') for i in range(2)]
+        for record_id, org in [(1, orgs[0]), (2, orgs[1]), (3, orgs[0])]:
+            factories.JoinRecord(relationship=relationship_with_local, record_id=record_id,
+                                 related_record_uuid=org.organization_uuid,
+                                 record_uuid=None, related_record_id=None)
+
+        logic_module_model = relationship_with_local.origin_model
+        data = [{'id': record_id} for record_id in range(1, 5)]
+
+        datamesh = DataMesh(logic_module_endpoint=logic_module_model.logic_module_endpoint_name,
+                            model_endpoint=logic_module_model.endpoint)
+        with CaptureQueriesContext(connection) as queries:
+            datamesh.extend_data(data, {})
+
+        # join records, organizations and their industries
+        assert len(queries) == 3
+        assert [item[relationship_with_local.key] for item in data] == [
+            [model_to_dict(orgs[0])], [model_to_dict(orgs[1])], [model_to_dict(orgs[0])], []]
+
+    def test_relationship_with_local_lm_list_validates_access_at_once(self, relationship_with_local):
+        orgs = [factories.Organization(name=f'Organization {i}') for i in range(2)]
+        for record_id, org in [(1, orgs[0]), (2, orgs[1])]:
+            factories.JoinRecord(relationship=relationship_with_local, record_id=record_id,
+                                 related_record_uuid=org.organization_uuid,
+                                 record_uuid=None, related_record_id=None)
+
+        logic_module_model = relationship_with_local.origin_model
+        data = [{'id': record_id} for record_id in range(1, 3)]
+        access_validator = Mock()
+
+        datamesh = DataMesh(logic_module_endpoint=logic_module_model.logic_module_endpoint_name,
+                            model_endpoint=logic_module_model.endpoint,
+                            access_validator=access_validator)
+        datamesh.extend_data(data, {})
+
+        access_validator.validate_many.assert_called_once()
+        assert set(access_validator.validate_many.call_args[0][0]) == set(orgs)
+        access_validator.validate.assert_not_called()
+
+    def test_relationships_from_compiled_graph(self, relationship):
+        logic_module_model = relationship.origin_model
+        DataMesh(logic_module_endpoint=logic_module_model.logic_module_endpoint_name,
+                 model_endpoint=logic_module_model.endpoint)
+
+        with CaptureQueriesContext(connection) as queries:
+            datamesh = DataMesh(logic_module_endpoint=logic_module_model.logic_module_endpoint_name,
+                                model_endpoint=logic_module_model.endpoint)
+
+        assert len(queries) == 0
+        assert datamesh.related_logic_modules == {'documents', 'products'}
+
 
 @pytest.mark.django_db()
 class TestAsyncDataMesh:
@@ -237,6 +351,33 @@ class TestAsyncDataMesh:
             assert len(nested) == 1
             assert nested[0]['uuid'] == str(join_records[i].related_record_uuid)
 
+    def test_join_data_list_in_bulk(self, relationship_with_10_records, settings):
+        settings.DATAMESH_BULK_LOOKUP_MAX_LENGTH = 200
+        related_model = relationship_with_10_records.related_model
+        related_model.bulk_lookup_param = 'uuid__in'
+        related_model.save()
+        join_records = relationship_with_10_records.joinrecords.all()
+
+        logic_module_model = relationship_with_10_records.origin_model
+        data = [{'uuid': str(item.record_uuid)} for item in join_records]
+
+        requests = []
+
+        class ClientMock:
+            async def request(self, **kwargs):
+                requests.append(kwargs)
+                return {'results': [{'uuid': pk} for pk in kwargs['query']['uuid__in'].split(',')]}
+        client_map = {related_model.logic_module_endpoint_name: ClientMock()}
+
+        datamesh = DataMesh(logic_module_endpoint=logic_module_model.logic_module_endpoint_name,
+                            model_endpoint=logic_module_model.endpoint)
+        asyncio.run(datamesh.async_extend_data(data, client_map))
+
+        # 10 UUIDs with commas don't fit into 200 characters
+        assert len(requests) == 2
+        for i, item in enumerate(data):
+            assert item[relationship_with_10_records.key] == [{'uuid': str(join_records[i].related_record_uuid)}]
+
     def test_relationship_with_local_lm(self, relationship_with_local, org):
         factories.JoinRecord(relationship=relationship_with_local, record_id=1,
                              related_record_uuid=org.organization_uuid,
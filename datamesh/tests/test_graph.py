@@ -0,0 +1,75 @@
+from unittest.mock import patch
+
+import pytest
+
+import factories
+from datamesh.graph import RelationshipGraph, RelationshipGraphRegistry, relationship_graph
+from datamesh.models import LogicModuleModel, Relationship
+from .fixtures import relationship
+
+
+def test_relationship_graph():
+    products = LogicModuleModel(logic_module_endpoint_name='products', model='Product', endpoint='/products/')
+    documents = LogicModuleModel(logic_module_endpoint_name='documents', model='Document', endpoint='/documents/',
+                                 lookup_field_name='uuid', bulk_lookup_param='uuid__in')
+    locations = LogicModuleModel(logic_module_endpoint_name='location', model='Location', endpoint='/siteprofile/')
+    relationships = [
+        Relationship(origin_model=products, related_model=documents, key='product_document_relationship'),
+        Relationship(origin_model=products, related_model=products, key='product_product_relationship'),
+    ]
+
+    graph = RelationshipGraph([products, documents, locations], relationships)
+
+    product_node = graph.get_model('products', '/products/')
+    document_node = graph.get_model('documents', '/documents/')
+    assert str(product_node) == str(products)
+    assert (document_node.lookup_field_name, document_node.bulk_lookup_param) == ('uuid', 'uuid__in')
+    assert [(edge.key, is_forward) for edge, is_forward in graph.get_relationships(product_node)] == [
+        ('product_document_relationship', True), ('product_product_relationship', True)]
+    [(edge, is_forward)] = graph.get_relationships(document_node)
+    assert (edge.pk, edge.origin_model, edge.related_model, is_forward) == (
+        relationships[0].pk, product_node, document_node, False)
+    assert str(edge) == str(relationships[0])
+    assert graph.get_relationships(graph.get_model('location', '/siteprofile/')) == ()
+    with pytest.raises(LogicModuleModel.DoesNotExist):
+        graph.get_model('products', '/documents/')
+
+
+@patch('datamesh.graph.RelationshipGraph.build')
+def test_relationship_graph_registry(mock_build):
+    registry = RelationshipGraphRegistry(ttl=60)
+
+    graph = registry.get()
+    assert registry.get() is graph
+    assert mock_build.call_count == 1
+
+    registry.invalidate()
+    registry.get()
+    assert mock_build.call_count == 2
+
+
+@patch('datamesh.graph.RelationshipGraph.build')
+def test_relationship_graph_registry_expired(mock_build):
+    registry = RelationshipGraphRegistry(ttl=0)
+
+    registry.get()
+    registry.get()
+    assert mock_build.call_count == 2
+
+
+@pytest.mark.django_db()
+def test_relationship_graph_invalidated_on_change(relationship):
+    origin_node = relationship_graph.get().get_model('products', '/products/')
+    assert [edge.key for edge, _ in relationship_graph.get().get_relationships(origin_node)] == [
+        'product_document_relationship']
+
+    lmm_location = factories.LogicModuleModel(logic_module_endpoint_name='location',
+                                              model='Location', endpoint='/siteprofile/')
+    factories.Relationship(origin_model=relationship.origin_model, related_model=lmm_location,
+                           key='location_relationship')
+    assert {edge.key for edge, _ in relationship_graph.get().get_relationships(origin_node)} == {
+        'product_document_relationship', 'location_relationship'}
+
+    relationship.delete()
+    assert [edge.key for edge, _ in relationship_graph.get().get_relationships(origin_node)] == [
+        'location_relationship']
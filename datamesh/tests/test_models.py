@@ -4,6 +4,7 @@ import pytest
 from django.core.exceptions import ValidationError
 from django.db import IntegrityError, transaction
 
+import factories
 from datamesh.models import JoinRecord, Relationship, LogicModuleModel
 
 from core.tests.fixtures import org
@@ -26,6 +27,27 @@ def test_get_by_concatenated_model_name(appointment_logic_module_model, document
     assert None == LogicModuleModel.objects.get_by_concatenated_model_name("nothing")
 
 
+@pytest.mark.django_db()
+def test_get_join_records_index(relationship, org):
+    record_uuid = uuid.uuid4()
+    by_id = JoinRecord.objects.create(relationship=relationship, record_id=1, related_record_id=2, organization=org)
+    by_uuid = JoinRecord.objects.create(relationship=relationship, record_uuid=record_uuid, related_record_id=3,
+                                        organization=org)
+    JoinRecord.objects.create(relationship=relationship, record_id=4, related_record_id=1, organization=org)
+
+    index = JoinRecord.objects.get_join_records_index([1, str(record_uuid).upper()], [(relationship, True)])
+    assert index == {
+        (relationship.pk, '1'): [by_id],
+        (relationship.pk, str(record_uuid)): [by_uuid],
+    }
+
+    reverse_index = JoinRecord.objects.get_join_records_index(['2', '3'], [(relationship, False)])
+    assert reverse_index == {
+        (relationship.pk, '2'): [by_id],
+        (relationship.pk, '3'): [by_uuid],
+    }
+
+
 @pytest.mark.django_db()
 def test_create_join_record(relationship, org):
     JoinRecord.objects.create(
@@ -159,3 +181,14 @@ def test_unique_together_join_record_uuid_id(relationship, org):
                 relationship=relationship,
             )
     assert JoinRecord.objects.count() == 1
+
+
+@pytest.mark.parametrize('object_id', ['1/../admin', '1?x=y', '1#x', '..'])
+@pytest.mark.django_db()
+def test_composite_endpoint_part_object_id_is_path_segment(object_id):
+    part = factories.CompositeEndpointPart(object_id='1')
+    part.full_clean()
+
+    part.object_id = object_id
+    with pytest.raises(ValidationError):
+        part.full_clean()
@@ -0,0 +1,8 @@
+from datamesh.utils import chunk_values
+
+
+def test_chunk_values():
+    assert list(chunk_values(['1', '22', '333', '4444'], 6)) == [['1', '22'], ['333'], ['4444']]
+    assert list(chunk_values(['1', '2', '3'], 5)) == [['1', '2', '3']]
+    assert list(chunk_values(['123456'], 3)) == [['123456']]
+    assert list(chunk_values([], 3)) == []
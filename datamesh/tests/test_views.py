@@ -194,6 +194,7 @@ class TestLogicModuleModelView:
             'model',
             'endpoint',
             'lookup_field_name',
+            'bulk_lookup_param',
             'is_local',
         }
 
@@ -5,6 +5,8 @@ from . import views
 
 router = routers.SimpleRouter()
 
+router.register('compositeendpoints', views.CompositeEndpointViewSet)
+router.register('compositeendpointparts', views.CompositeEndpointPartViewSet)
 router.register('joinrecords', views.JoinRecordViewSet)
 router.register('logicmodulemodels', views.LogicModuleModelViewSet)
 router.register('relationships', views.RelationshiplViewSet)
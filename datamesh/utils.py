@@ -1,4 +1,4 @@
-from typing import Tuple
+from typing import Iterator, List, Tuple
 
 from datamesh.models import Relationship, JoinRecord, LogicModuleModel
 
@@ -17,3 +17,16 @@ def prepare_lookup_kwargs(is_forward_lookup: bool,
             else 'record_uuid'
 
     return related_model, related_record_field
+
+
+def chunk_values(values: List[str], max_length: int) -> Iterator[List[str]]:
+    """Split values into chunks that are at most max_length characters long when joined by commas."""
+    chunk, length = [], 0
+    for value in values:
+        if chunk and length + 1 + len(value) > max_length:
+            yield chunk
+            chunk, length = [], 0
+        length += len(value) + (1 if chunk else 0)
+        chunk.append(value)
+    if chunk:
+        yield chunk
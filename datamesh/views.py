@@ -3,8 +3,9 @@ from rest_framework import viewsets
 
 from .filters import JoinRecordFilter
 from .mixins import OrganizationQuerySetMixin
-from .models import JoinRecord, LogicModuleModel, Relationship
-from .serializers import JoinRecordSerializer, LogicModuleModelSerializer, RelationshipSerializer
+from .models import CompositeEndpoint, CompositeEndpointPart, JoinRecord, LogicModuleModel, Relationship
+from .serializers import (CompositeEndpointPartSerializer, CompositeEndpointSerializer, JoinRecordSerializer,
+                          LogicModuleModelSerializer, RelationshipSerializer)
 from workflow.permissions import IsSuperUserOrReadOnly
 
 
@@ -20,6 +21,18 @@ class RelationshiplViewSet(viewsets.ModelViewSet):
     permission_classes = (IsSuperUserOrReadOnly,)
 
 
+class CompositeEndpointViewSet(viewsets.ModelViewSet):
+    queryset = CompositeEndpoint.objects.prefetch_related('parts')
+    serializer_class = CompositeEndpointSerializer
+    permission_classes = (IsSuperUserOrReadOnly,)
+
+
+class CompositeEndpointPartViewSet(viewsets.ModelViewSet):
+    queryset = CompositeEndpointPart.objects.all()
+    serializer_class = CompositeEndpointPartSerializer
+    permission_classes = (IsSuperUserOrReadOnly,)
+
+
 class JoinRecordViewSet(OrganizationQuerySetMixin,
                         viewsets.ModelViewSet):
 
@@ -2,11 +2,13 @@ import random
 import string
 import uuid
 
-from factory import DjangoModelFactory, SubFactory, LazyAttribute
+from factory import DjangoModelFactory, SubFactory, LazyAttribute, Sequence
 
 from datamesh.models import (LogicModuleModel as LogicModulModelM,
                              Relationship as RelationshipM,
-                             JoinRecord as JoinRecordM)
+                             JoinRecord as JoinRecordM,
+                             CompositeEndpoint as CompositeEndpointM,
+                             CompositeEndpointPart as CompositeEndpointPartM)
 from factories import Organization
 
 
@@ -35,3 +37,19 @@ class JoinRecord(DjangoModelFactory):
 
     class Meta:
         model = JoinRecordM
+
+
+class CompositeEndpoint(DjangoModelFactory):
+    name = Sequence(lambda n: f'composite{n}')
+
+    class Meta:
+        model = CompositeEndpointM
+
+
+class CompositeEndpointPart(DjangoModelFactory):
+    composite_endpoint = SubFactory(CompositeEndpoint)
+    key = Sequence(lambda n: f'part{n}')
+    logic_module_model = SubFactory(LogicModuleModel)
+
+    class Meta:
+        model = CompositeEndpointPartM
@@ -1,5 +1,7 @@
 from __future__ import absolute_import, unicode_literals
 
+default_app_config = 'gateway.apps.GatewayConfig'
+
 API_GATEWAY_RESERVED_NAMES = [
     'admin',
     'oauth',
@@ -15,4 +17,11 @@ API_GATEWAY_RESERVED_NAMES = [
     'user',
     'organization',
     'datamesh',
+    'batch',
+    'composite',
+    'metrics',
 ]
+
+# Service, model and object ID given outside of the URL (e.g. in batch requests) have to be path segments
+# like in the URL routes, so they can't point the service request to another path or add query params
+API_GATEWAY_PATH_SEGMENT_REGEX = r'^(?!\.\.?$)[^/?#]+$'
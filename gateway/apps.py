@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class GatewayConfig(AppConfig):
     name = 'gateway'
+
+    def ready(self):
+        from gateway import signals  # noqa
@@ -0,0 +1,220 @@
+import asyncio
+import io
+import logging
+import sys
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, List, Tuple
+
+from django.conf import settings
+from django.core import signals
+from django.core.handlers import base
+from django.core.handlers.wsgi import WSGIRequest, get_script_name
+from django.http import HttpResponse
+from django.urls import set_script_prefix
+
+from gateway import exceptions
+from gateway.sessions import async_session_pool
+
+logger = logging.getLogger(__name__)
+
+# META key of the Django request that holds the thread pool executor when the request is served via ASGI
+ASGI_EXECUTOR_KEY = 'gateway.asgi_executor'
+
+
+class DeferredGatewayResponse(HttpResponse):
+    """
+    Response of the async gateway view when it is served via ASGI. It passes Django's middleware and is
+    completed later on the event loop, where the requests to the underlying services are performed.
+    """
+
+    def __init__(self, gateway_request, *args, **kwargs):
+        self.gateway_request = gateway_request
+        self.async_streaming_content = None
+        super().__init__(*args, **kwargs)
+
+    async def resolve(self) -> None:
+        """ Performs the gateway request and fills the response with the result """
+        try:
+            await self._resolve()
+        finally:
+            self.gateway_request.timings.report(self.gateway_request.request, self)
+
+    async def _resolve(self) -> None:
+        result = {}
+        try:
+            await self.gateway_request.async_perform(result)
+        except exceptions.GatewayError as e:
+            self.set_result(e.content, e.status, e.content_type)
+            return
+        except Exception:
+            logger.exception('Error performing asynchronous gateway request')
+            self.set_result(exceptions.GatewayError('Error performing asynchronous gateway request').content,
+                            500, 'application/json')
+            return
+
+        gw_response = result['response']
+        if gw_response.is_not_modified(self.gateway_request.request):
+            self.set_result(b'', 304)
+            del self['Content-Type']
+        elif gw_response.is_streamed:
+            self.async_streaming_content = gw_response.content
+            self.set_result(b'', gw_response.status_code, gw_response.headers.get('Content-Type'))
+            if self.has_header('Content-Length'):
+                del self['Content-Length']
+        else:
+            self.set_result(gw_response.content, gw_response.status_code, gw_response.headers.get('Content-Type'))
+        for header, value in gw_response.get_forwarded_headers().items():
+            self[header] = value
+
+    async def aclose(self) -> None:
+        """ Releases the connection of a streamed service response, also if it wasn't read completely """
+        if self.async_streaming_content is not None and hasattr(self.async_streaming_content, 'aclose'):
+            await self.async_streaming_content.aclose()
+
+    def set_result(self, content, status_code: int, content_type: str = None) -> None:
+        self.content = content if content is not None else b''
+        self.status_code = status_code
+        if content_type:
+            self['Content-Type'] = content_type
+        if self.has_header('Content-Length'):
+            # set by middleware for the empty deferred response
+            self['Content-Length'] = str(len(self.content))
+
+
+class ASGIHandler(base.BaseHandler):
+    """
+    ASGI application for Buildly.
+
+    Django (2.2) is synchronous, so requests pass the middleware and views in a thread pool. The async gateway
+    view returns a DeferredGatewayResponse there, which is completed natively on the persistent event loop,
+    so the requests to the underlying services don't block any thread. Database access of the gateway request
+    is offloaded to the same thread pool.
+    """
+    request_class = WSGIRequest
+
+    def __init__(self, executor: Executor = None):
+        super().__init__()
+        self.load_middleware()
+        self.executor = executor or ThreadPoolExecutor(max_workers=settings.GATEWAY_ASGI_THREADS)
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope['type'] == 'lifespan':
+            await self.handle_lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.handle_http(scope, receive, send)
+        else:
+            raise ValueError(f'Unsupported ASGI scope type: {scope["type"]}')
+
+    async def handle_lifespan(self, receive: Callable, send: Callable) -> None:
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await async_session_pool.close()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def handle_http(self, scope: dict, receive: Callable, send: Callable) -> None:
+        body = await self.read_body(receive)
+        environ = self.get_environ(scope, body)
+        loop = asyncio.get_event_loop()
+        # streaming stops when the client disconnects, the rest of the body isn't read from the service
+        disconnect = asyncio.ensure_future(self.wait_for_disconnect(receive))
+
+        response = await loop.run_in_executor(self.executor, self.get_response_in_thread, environ)
+        try:
+            if isinstance(response, DeferredGatewayResponse):
+                await response.resolve()
+
+            await send({
+                'type': 'http.response.start',
+                'status': response.status_code,
+                'headers': self.get_response_headers(response),
+            })
+            if isinstance(response, DeferredGatewayResponse) and response.async_streaming_content is not None:
+                async for chunk in response.async_streaming_content:
+                    if disconnect.done():
+                        return
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                await send({'type': 'http.response.body', 'body': b''})
+            elif response.streaming:
+                # chunks are produced by Django code, so they are taken one by one in the thread pool
+                chunks = iter(response)
+                chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+                while chunk is not None:
+                    if disconnect.done():
+                        return
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                    chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+                await send({'type': 'http.response.body', 'body': b''})
+            else:
+                await send({'type': 'http.response.body', 'body': response.content})
+        finally:
+            disconnect.cancel()
+            if isinstance(response, DeferredGatewayResponse):
+                await response.aclose()
+            await loop.run_in_executor(self.executor, response.close)
+
+    def get_response_in_thread(self, environ: dict) -> HttpResponse:
+        """ Runs Django's request handling like the WSGI handler does """
+        set_script_prefix(get_script_name(environ))
+        signals.request_started.send(sender=self.__class__, environ=environ)
+        request = self.request_class(environ)
+        response = self.get_response(request)
+        response._handler_class = self.__class__
+        return response
+
+    def get_environ(self, scope: dict, body: bytes) -> dict:
+        """ Builds WSGI environ from the ASGI scope, so Django's WSGIRequest can be used """
+        server_name, server_port = scope.get('server') or ('localhost', 80)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+            'SERVER_NAME': server_name,
+            'SERVER_PORT': str(server_port),
+            'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+            'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+            ASGI_EXECUTOR_KEY: self.executor,
+        }
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin1').upper().replace('-', '_')
+            value = value.decode('latin1')
+            if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+                key = name
+            else:
+                key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+        return environ
+
+    @staticmethod
+    async def wait_for_disconnect(receive: Callable) -> None:
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    @staticmethod
+    async def read_body(receive: Callable) -> bytes:
+        body = b''
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+        return body
+
+    @staticmethod
+    def get_response_headers(response: HttpResponse) -> List[Tuple[bytes, bytes]]:
+        headers = [(name.encode('latin1'), value.encode('latin1')) for name, value in response.items()]
+        for cookie in response.cookies.values():
+            headers.append((b'Set-Cookie', cookie.output(header='').strip().encode('latin1')))
+        return headers
@@ -0,0 +1,115 @@
+import itertools
+import logging
+import threading
+import time
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+from django.conf import settings
+
+from core.models import LogicModule
+
+logger = logging.getLogger(__name__)
+
+
+class Replica:
+    """ One endpoint of a logic module with the state the load balancer needs for choosing it """
+
+    def __init__(self, endpoint: str):
+        parts = urlsplit(endpoint)
+        self.endpoint = endpoint
+        self.scheme = parts.scheme
+        self.netloc = parts.netloc
+        self.outstanding = 0
+        self.failures = 0
+        self.ejected_until = None
+
+    @property
+    def is_ejected(self) -> bool:
+        return self.ejected_until is not None and self.ejected_until > time.monotonic()
+
+    def get_url(self, url: str) -> str:
+        """ Points the URL to the replica """
+        parts = urlsplit(url)
+        return urlunsplit((self.scheme, self.netloc, parts.path, parts.query, parts.fragment))
+
+
+class LoadBalancer:
+    """
+    Balances requests to a logic module between its replicas either round-robin or to the replica with
+    the least outstanding requests. Replicas failing `ejection_failures` times in a row are skipped for
+    `ejection_time` seconds, unless all replicas are ejected.
+    """
+
+    def __init__(self, endpoints: List[str], strategy: str, ejection_failures: int = None,
+                 ejection_time: float = None):
+        self.replicas = [Replica(endpoint) for endpoint in endpoints]
+        self.strategy = strategy
+        self.ejection_failures = (ejection_failures if ejection_failures is not None
+                                  else settings.GATEWAY_EJECTION_FAILURES)
+        self.ejection_time = ejection_time if ejection_time is not None else settings.GATEWAY_EJECTION_TIME
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> Replica:
+        """ Choose the replica for a request, it has to be released with the outcome of the request """
+        with self._lock:
+            replicas = [replica for replica in self.replicas if not replica.is_ejected] or self.replicas
+            if self.strategy == LogicModule.LOAD_BALANCING_LEAST_OUTSTANDING:
+                # ties are resolved round-robin, so idle replicas are used evenly
+                offset = next(self._counter)
+                replicas = replicas[offset % len(replicas):] + replicas[:offset % len(replicas)]
+                replica = min(replicas, key=lambda r: r.outstanding)
+            else:
+                replica = replicas[next(self._counter) % len(replicas)]
+            replica.outstanding += 1
+            return replica
+
+    def release(self, replica: Replica, is_success: bool) -> None:
+        with self._lock:
+            replica.outstanding -= 1
+            if is_success:
+                replica.failures = 0
+                replica.ejected_until = None
+                return
+            replica.failures += 1
+            if replica.failures >= self.ejection_failures:
+                logger.warning(f'Replica {replica.endpoint} ejected after {replica.failures} failures')
+                replica.ejected_until = time.monotonic() + self.ejection_time
+
+
+class LoadBalancerRegistry:
+    """
+    Per-process load balancers of logic modules with replicas, a balancer is replaced when the replicas
+    or the strategy of its logic module change
+    """
+
+    def __init__(self):
+        self._balancers = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_config(logic_module: LogicModule) -> Tuple[Tuple[str, ...], str]:
+        return (logic_module.endpoint, *logic_module.replica_endpoints), logic_module.load_balancing
+
+    def get(self, logic_module: Optional[LogicModule]) -> Optional[LoadBalancer]:
+        """ Load balancer of the logic module or None if it has no replicas """
+        if logic_module is None or not logic_module.endpoint or not logic_module.replica_endpoints:
+            return None
+        key = logic_module.module_uuid
+        endpoints, strategy = self.get_config(logic_module)
+        config, balancer = self._balancers.get(key, (None, None))
+        if config != (endpoints, strategy):
+            with self._lock:
+                config, balancer = self._balancers.get(key, (None, None))
+                if config != (endpoints, strategy):
+                    balancer = LoadBalancer(list(endpoints), strategy)
+                    self._balancers[key] = ((endpoints, strategy), balancer)
+        return balancer
+
+    def reset(self) -> None:
+        with self._lock:
+            self._balancers.clear()
+
+
+load_balancers = LoadBalancerRegistry()
@@ -0,0 +1,221 @@
+"""
+Load test and benchmark harness of the gateway.
+
+A local stub logic module serving a Swagger spec and synthetic data is started in a background thread, logic module,
+DataMesh models and join records pointing to it are created in the database and the gateway views are driven
+concurrently by a thread pool. See the `benchmark_gateway` management command.
+"""
+import asyncio
+import json
+import math
+import socket
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Tuple, Type
+
+from aiohttp import web
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+
+from core.models import CoreUser, LogicModule
+from datamesh.models import JoinRecord, LogicModuleModel, Relationship
+from gateway.utils import call_closing_db_connections
+
+STUB_SERVICE_NAME = 'benchmark'
+
+
+class StubService:
+    """
+    Logic module with `items` objects with a payload of `item_size` bytes (`/items/`) and related objects
+    (`/relateds/`) for joins, running on its own event loop in a background thread
+    """
+
+    def __init__(self, items: int = 10, item_size: int = 1024, host: str = '127.0.0.1', port: int = 0):
+        self.items = items
+        self.item_size = item_size
+        self.host = host
+        self.port = port
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    @property
+    def endpoint(self) -> str:
+        return f'http://{self.host}:{self.port}'
+
+    def get_spec(self) -> dict:
+        responses = {'200': {'description': 'OK'}}
+        detail_parameters = [{'name': 'id', 'in': 'path', 'required': True, 'type': 'string'}]
+        return {
+            'swagger': '2.0',
+            'info': {'title': 'Benchmark Service', 'version': '1'},
+            'host': f'{self.host}:{self.port}',
+            'basePath': '/',
+            'schemes': ['http'],
+            'paths': {
+                '/items/': {'get': {'operationId': 'items_list', 'responses': responses}},
+                '/items/{id}/': {'get': {'operationId': 'items_read', 'parameters': detail_parameters,
+                                         'responses': responses}},
+                '/relateds/{id}/': {'get': {'operationId': 'relateds_read', 'parameters': detail_parameters,
+                                            'responses': responses}},
+            },
+        }
+
+    def get_item(self, pk: int) -> dict:
+        return {'id': pk, 'payload': 'x' * self.item_size}
+
+    def start(self) -> None:
+        started = threading.Event()
+        self._thread = threading.Thread(target=self._serve, args=(started,), daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def __enter__(self) -> 'StubService':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _serve(self, started: threading.Event) -> None:
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._runner = web.AppRunner(self._create_app())
+        self._loop.run_until_complete(self._runner.setup())
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind((self.host, self.port))
+        # the port is chosen by the OS if it's 0
+        self.port = sock.getsockname()[1]
+        self._loop.run_until_complete(web.SockSite(self._runner, sock).start())
+        started.set()
+        self._loop.run_forever()
+        self._loop.close()
+
+    def _create_app(self) -> web.Application:
+        items = json.dumps([self.get_item(pk) for pk in range(1, self.items + 1)])
+
+        async def spec(request):
+            return web.json_response(self.get_spec())
+
+        async def item_list(request):
+            return web.Response(text=items, content_type='application/json')
+
+        async def item_detail(request):
+            return web.json_response(self.get_item(int(request.match_info['id'])))
+
+        app = web.Application()
+        app.router.add_get('/docs/swagger.json', spec)
+        app.router.add_get('/items/', item_list)
+        app.router.add_get('/items/{id}/', item_detail)
+        app.router.add_get('/relateds/{id}/', item_detail)
+        return app
+
+
+class BenchmarkData:
+    """
+    Logic module of the stub service with a relationship joining `fanout` related objects to each item.
+    The service name is unique, so existing data isn't touched, and only the created objects are deleted on exit.
+    """
+
+    def __init__(self, service: StubService, fanout: int = 0):
+        self.service = service
+        self.fanout = fanout
+        self.service_name = f'{STUB_SERVICE_NAME}-{uuid.uuid4().hex[:8]}'
+        self.logic_module = None
+        self.models = []
+
+    def __enter__(self) -> 'BenchmarkData':
+        self.logic_module = LogicModule.objects.create(name=self.service_name, endpoint_name=self.service_name,
+                                                       endpoint=self.service.endpoint)
+        if self.fanout:
+            origin_model = LogicModuleModel.objects.create(logic_module_endpoint_name=self.service_name,
+                                                           model='Item', endpoint='/items/')
+            related_model = LogicModuleModel.objects.create(logic_module_endpoint_name=self.service_name,
+                                                            model='Related', endpoint='/relateds/')
+            self.models = [origin_model, related_model]
+            relationship = Relationship.objects.create(origin_model=origin_model, related_model=related_model,
+                                                       key='relateds')
+            JoinRecord.objects.bulk_create([
+                JoinRecord(relationship=relationship, record_id=pk, related_record_id=pk * self.fanout + i)
+                for pk in range(1, self.service.items + 1) for i in range(self.fanout)
+            ])
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        # the relationship and its join records are deleted together with the models
+        LogicModuleModel.objects.filter(pk__in=[model.pk for model in self.models]).delete()
+        self.logic_module.delete()
+
+
+class BenchmarkResult(NamedTuple):
+    name: str
+    requests: int
+    concurrency: int
+    duration: float
+    statuses: Dict[int, int]
+    latencies: List[float]
+
+    @property
+    def throughput(self) -> float:
+        """ Requests per second """
+        return self.requests / self.duration if self.duration else 0
+
+    def get_percentile(self, percentile: float) -> float:
+        """ Latency percentile in seconds (nearest-rank method) """
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return 0
+        return latencies[max(math.ceil(percentile / 100 * len(latencies)) - 1, 0)]
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'requests': self.requests,
+            'concurrency': self.concurrency,
+            'duration': round(self.duration, 3),
+            'throughput': round(self.throughput, 1),
+            'p50_ms': round(self.get_percentile(50) * 1000, 1),
+            'p95_ms': round(self.get_percentile(95) * 1000, 1),
+            'p99_ms': round(self.get_percentile(99) * 1000, 1),
+            'statuses': {str(status): count for status, count in sorted(self.statuses.items())},
+        }
+
+
+def run_benchmark(name: str, view_class: Type[APIView], path: str, view_kwargs: dict, requests: int = 100,
+                  concurrency: int = 10, query: dict = None) -> BenchmarkResult:
+    """ Perform `requests` GET requests with the view, `concurrency` of them at the same time """
+    view = view_class.as_view()
+    factory = APIRequestFactory()
+    user = CoreUser(username='benchmark', is_superuser=True)
+
+    def perform() -> Tuple[int, float]:
+        request = factory.get(path, query)
+        force_authenticate(request, user=user)
+        start = time.perf_counter()
+        response = view(request, **view_kwargs)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response.status_code, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        start = time.perf_counter()
+        # database connections are handled like for requests of the server
+        results = list(executor.map(lambda _: call_closing_db_connections(perform), range(requests)))
+        duration = time.perf_counter() - start
+
+    return BenchmarkResult(
+        name=name,
+        requests=requests,
+        concurrency=concurrency,
+        duration=duration,
+        statuses=dict(Counter(status for status, _ in results)),
+        latencies=[latency for _, latency in results],
+    )
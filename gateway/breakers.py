@@ -0,0 +1,104 @@
+import logging
+import threading
+import time
+from typing import Dict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker of one service. It opens after `failure_threshold` consecutive failures, so requests fail
+    fast instead of waiting for the degraded service. After `reset_timeout` seconds it's half-open and lets
+    one probe request through: it closes again if the probe succeeds, otherwise it stays open.
+    A probe without outcome (e.g. a cancelled request) is replaced by another one after `reset_timeout`.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow_request(self) -> bool:
+        """ Checks if a request can be made, only one probe request is allowed when the breaker is half-open """
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            if state == self.HALF_OPEN and (self.probe_started_at is None
+                                            or now - self.probe_started_at >= self.reset_timeout):
+                self.probe_started_at = now
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info(f'Circuit breaker of {self.name} closed')
+            self.failures = 0
+            self.opened_at = None
+            self.probe_started_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.probe_started_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning(f'Circuit breaker of {self.name} opened after {self.failures} failures')
+                self.opened_at = time.monotonic()
+            self.probe_started_at = None
+
+
+class CircuitBreakerRegistry:
+    """
+    Per-process circuit breakers of services keyed by the scheme and host of the service
+    """
+
+    def __init__(self, failure_threshold: int = None, reset_timeout: float = None):
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> CircuitBreaker:
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(key)
+                if breaker is None:
+                    breaker = self._breakers[key] = CircuitBreaker(
+                        key,
+                        failure_threshold=(self._failure_threshold if self._failure_threshold is not None
+                                           else settings.GATEWAY_CIRCUIT_BREAKER_FAILURES),
+                        reset_timeout=(self._reset_timeout if self._reset_timeout is not None
+                                       else settings.GATEWAY_CIRCUIT_BREAKER_RESET_TIMEOUT),
+                    )
+        return breaker
+
+    def get_states(self) -> Dict[str, str]:
+        return {key: breaker.state for key, breaker in self._breakers.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._breakers.clear()
+
+
+circuit_breakers = CircuitBreakerRegistry()
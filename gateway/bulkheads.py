@@ -0,0 +1,92 @@
+import asyncio
+import threading
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator, Optional
+
+from django.conf import settings
+
+from . import exceptions
+from . import metrics
+
+
+class Bulkhead:
+    """
+    Limits the concurrent requests of the gateway process to one service, so e.g. a DataMesh join with hundreds
+    of join records can't overload the service or exhaust sockets. Requests wait up to `timeout` seconds for
+    a free slot and fail with 503 afterwards. Threads share one bounded semaphore, asynchronous requests share
+    one semaphore per event loop.
+    """
+
+    def __init__(self, name: str, limit: int, timeout: float):
+        self.name = name
+        self.limit = limit
+        self.timeout = timeout
+        self._semaphore = threading.BoundedSemaphore(limit)
+        self._async_semaphores = weakref.WeakKeyDictionary()
+
+    @contextmanager
+    def acquire(self) -> Iterator[None]:
+        if not self._semaphore.acquire(timeout=self.timeout):
+            self._reject()
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+    @asynccontextmanager
+    async def async_acquire(self) -> AsyncIterator[None]:
+        semaphore = self._get_async_semaphore()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self._reject()
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+    def _get_async_semaphore(self) -> asyncio.BoundedSemaphore:
+        loop = asyncio.get_event_loop()
+        semaphore = self._async_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._async_semaphores[loop] = asyncio.BoundedSemaphore(self.limit)
+        return semaphore
+
+    def _reject(self) -> None:
+        metrics.BULKHEAD_REJECTIONS.labels(self.name).inc()
+        raise exceptions.ServiceUnavailable(
+            f'Too many concurrent requests to the service, no free slot within {self.timeout}s: {self.name}')
+
+
+class BulkheadRegistry:
+    """
+    Per-process bulkheads of services keyed by the service name, a bulkhead is replaced when the limit changes
+    """
+
+    def __init__(self, timeout: float = None):
+        self._timeout = timeout
+        self._bulkheads = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str, limit: Optional[int]) -> Optional[Bulkhead]:
+        """ Bulkhead of the service or None if its requests aren't limited """
+        if not limit:
+            return None
+        bulkhead = self._bulkheads.get(name)
+        if bulkhead is None or bulkhead.limit != limit:
+            with self._lock:
+                bulkhead = self._bulkheads.get(name)
+                if bulkhead is None or bulkhead.limit != limit:
+                    bulkhead = self._bulkheads[name] = Bulkhead(
+                        name, limit,
+                        timeout=self._timeout if self._timeout is not None else settings.GATEWAY_BULKHEAD_TIMEOUT,
+                    )
+        return bulkhead
+
+    def reset(self) -> None:
+        with self._lock:
+            self._bulkheads.clear()
+
+
+bulkheads = BulkheadRegistry()
@@ -0,0 +1,103 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Mapping, NamedTuple, Optional
+
+from django.conf import settings
+
+from . import metrics
+
+
+class CachedResponse(NamedTuple):
+    content: bytes
+    status_code: int
+    headers: Mapping[str, str]
+    expires_at: float
+
+    @property
+    def size(self) -> int:
+        return len(self.content)
+
+
+class ResponseCache:
+    """
+    Process-wide, thread-safe cache of GET responses of the services shared between gateway requests.
+
+    The cache is bounded by the total size of the cached bodies, least recently used responses are evicted first.
+    Responses are cached for the TTL of their logic module, so caching is enabled per logic module.
+    Hits, misses and the size of the cache are reported in the metrics.
+    """
+
+    def __init__(self, max_size: int = None):
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size if self._max_size is not None else settings.GATEWAY_RESPONSE_CACHE_MAX_SIZE
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def get_key(url: str, query_string: str, authorization: str) -> str:
+        """
+        Key of the response, responses are shared only by requests with the same authorization
+        """
+        scope = hashlib.sha256(authorization.encode('utf-8')).hexdigest()
+        return f'{url}?{query_string}#{scope}'
+
+    def get(self, key: str, service: str = '') -> Optional[CachedResponse]:
+        """ Cached response or None if it isn't cached or expired, the lookup is counted for the service """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        metrics.RESPONSE_CACHE_LOOKUPS.labels(service, 'miss' if entry is None else 'hit').inc()
+        return entry
+
+    def set(self, key: str, content: bytes, status_code: int, headers: Mapping[str, str], ttl: int) -> None:
+        """ Cache the response for `ttl` seconds, responses bigger than the cache aren't cached """
+        entry = CachedResponse(content, status_code, headers, time.monotonic() + ttl)
+        if entry.size > self.max_size:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = entry
+            self._size += entry.size
+            metrics.RESPONSE_CACHE_SIZE.inc(entry.size)
+            while self._size > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, url_prefix: str = None) -> None:
+        """ Drop cached responses of URLs starting with the prefix or all responses if no prefix is given """
+        with self._lock:
+            keys = [key for key in self._entries if url_prefix is None or key.startswith(url_prefix)]
+            for key in keys:
+                self._remove(key)
+
+    def clear(self) -> None:
+        """ Drop all responses """
+        with self._lock:
+            self._entries.clear()
+            metrics.RESPONSE_CACHE_SIZE.dec(self._size)
+            self._size = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry.size
+            metrics.RESPONSE_CACHE_SIZE.dec(entry.size)
+
+
+response_cache = ResponseCache()
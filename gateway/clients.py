@@ -1,73 +1,229 @@
+import asyncio
 import logging
 import json
-from typing import Any, Dict, Tuple
+from functools import partial
+from typing import Any, AsyncIterator, Dict, Iterator, List, Mapping, Optional, Tuple, Union
+from urllib.parse import urlsplit
 
-import requests
 import aiohttp
+import requests
+from django.conf import settings
 from django.http.request import QueryDict
+from django.utils.http import urlencode
 from bravado_core.spec import Spec
 from rest_framework.request import Request
 from rest_framework.authentication import get_authorization_header
 
 from . import exceptions
+from . import metrics
 from . import utils
+from .balancing import load_balancers
+from .breakers import CircuitBreaker, circuit_breakers
+from .bulkheads import Bulkhead, bulkheads
+from .cache import response_cache
+from .coalescing import async_request_coalescer, request_coalescer
+from .explain import ExecutionPlan
+from .sessions import async_session_pool, session_pool
+from .specs import spec_registry
+from core.models import LogicModule
 
 logger = logging.getLogger(__name__)
 
 
+def is_streamed_response(headers: Mapping[str, str]) -> bool:
+    """ Responses of unknown size or bigger than the streaming threshold are streamed instead of buffered """
+    content_length = headers.get('Content-Length')
+    if content_length is None:
+        return True
+    return int(content_length) > settings.GATEWAY_STREAMING_THRESHOLD
+
+
+def is_cacheable_response(status_code: int, headers: Mapping[str, str]) -> bool:
+    """ Successful responses can be kept in the shared cache unless the service forbids storing them """
+    return status_code == 200 and 'no-store' not in headers.get('Cache-Control', '')
+
+
+def iter_response_content(response: requests.Response) -> Iterator[bytes]:
+    """ Yields chunks of the body and releases the connection afterwards """
+    try:
+        yield from response.iter_content(chunk_size=settings.GATEWAY_STREAMING_CHUNK_SIZE)
+    finally:
+        response.close()
+
+
+async def aiter_response_content(response: aiohttp.ClientResponse) -> AsyncIterator[bytes]:
+    """ Yields chunks of the body and releases the connection afterwards """
+    try:
+        async for chunk in response.content.iter_chunked(settings.GATEWAY_STREAMING_CHUNK_SIZE):
+            yield chunk
+    finally:
+        response.release()
+
+
+def get_timeouts(logic_module: Optional[LogicModule]) -> Tuple[float, float]:
+    """ Connect and read timeouts of requests to the logic module in seconds, the defaults are used if it has none """
+    connect_timeout = getattr(logic_module, 'connect_timeout', None)
+    read_timeout = getattr(logic_module, 'read_timeout', None)
+    return (connect_timeout if connect_timeout is not None else settings.GATEWAY_CONNECT_TIMEOUT,
+            read_timeout if read_timeout is not None else settings.GATEWAY_READ_TIMEOUT)
+
+
 class BaseSwaggerClient:
     """ Base for client class that is responsible for retrieving data from the service with Swagger spec"""
 
-    def __init__(self, spec: Spec, incoming_request: Request):
+    # headers of the incoming request that make the service answer with 304 if the client has a fresh copy
+    CONDITIONAL_HEADERS = ('If-None-Match', 'If-Modified-Since')
+
+    def __init__(self, spec: Spec, incoming_request: Request, logic_module: LogicModule = None,
+                 plan: ExecutionPlan = None):
         self._spec = spec
         self._in_request = incoming_request
+        self._logic_module = logic_module
+        self._plan = plan if plan is not None else ExecutionPlan(enabled=False)
         self._data = dict()
 
     def request(self, **kwargs):
         raise NotImplementedError()
 
+    def get_service_name(self, url: str) -> str:
+        """ Name of the service in metrics, the host is used if there is no logic module """
+        if self._logic_module is not None:
+            return self._logic_module.endpoint_name
+        return urlsplit(url).netloc
+
     def is_valid_for_cache(self) -> bool:
         """ Checks if request is valid for caching operations """
         return self._in_request.method.lower() == 'get' and not self._in_request.query_params
 
+    def get_cache_ttl(self) -> Optional[int]:
+        """ TTL of responses in the shared response cache or None if they must not be cached """
+        if self._in_request.method.lower() != 'get' or self._logic_module is None:
+            return None
+        return self._logic_module.cache_ttl or None
+
+    def get_cache_key(self, url: str) -> str:
+        """ Key of the response in the shared response cache """
+        query_string = urlencode(sorted(self._in_request.query_params.lists()), doseq=True)
+        return response_cache.get_key(url, query_string, self.get_headers()['Authorization'])
+
+    def get_coalescing_key(self, url: str, conditional: bool) -> Optional[str]:
+        """
+        Key of identical GET requests that can share one request to the service, None if the request can't be shared
+        """
+        if not settings.GATEWAY_REQUEST_COALESCING or self._in_request.method.lower() != 'get':
+            return None
+        headers = self.get_headers(conditional=conditional)
+        validators = ','.join(headers.get(header, '') for header in self.CONDITIONAL_HEADERS)
+        return f'{self.get_cache_key(url)}#{validators}'
+
+    def invalidate_cache(self, **kwargs) -> None:
+        """ Drop cached responses of the model after it was changed via the gateway """
+        if self._in_request.method.lower() not in ['get', 'head', 'options']:
+            model = kwargs.get('model', '').lower()
+            response_cache.invalidate(self._spec.api_url.rstrip('/') + f'/{model}/')
+
+    @staticmethod
+    def decode_content(content: bytes) -> Any:
+        try:
+            return json.loads(content)
+        except ValueError:
+            return content
+
     def prepare_data(self, spec: Spec, **kwargs) -> Tuple[str, str]:
-        """ Parse request URL, validates operation, and returns method and URL for outgoing request"""
+        """
+        Parse request URL, validates operation, and returns method and URL for outgoing request.
+        Query parameters given in `query` are added to the URL, e.g. for filtering related objects of DataMesh.
+        """
 
         # Parse URL kwargs
         pk = kwargs.get('pk')
         model = kwargs.get('model', '').lower()
-        path_kwargs = {}
-        if kwargs.get('pk') is None:
-            path = f'/{model}/'
-        else:
+        pk_name = None
+        if pk is not None:
             pk_name = 'uuid' if utils.valid_uuid4(pk) else 'id'
-            path_kwargs = {pk_name: pk}
-            path = f'/{model}/{{{pk_name}}}/'
 
         # Check that operation is valid according to spec
-        operation = spec.get_op_for_request(self._in_request.method, path)
-        if not operation:
+        route = spec_registry.get_route_table(spec).get_route(self._in_request.method, model, pk_name)
+        if not route:
+            path = f'/{model}/' if pk_name is None else f'/{model}/{{{pk_name}}}/'
             raise exceptions.EndpointNotFound(f'Endpoint not found: {self._in_request.method} {path}')
-        method = operation.http_method.lower()
-        path_name = operation.path_name
+        method, url = route
 
         # Build URL for the operation to request data from the service
-        url = spec.api_url.rstrip('/') + path_name
-        for k, v in path_kwargs.items():
-            url = url.replace(f'{{{k}}}', v)
+        if pk_name is not None:
+            url = url.replace(f'{{{pk_name}}}', pk)
+        if kwargs.get('query'):
+            url = f'{url}?{urlencode(kwargs["query"])}'
 
         return method, url
 
-    def get_request_data(self) -> dict:
+    def get_session_key(self, url: str) -> str:
+        """ Key for sharing connections to the service (or its replica) between clients """
+        if self._logic_module is not None and self._logic_module.endpoint and not self._logic_module.replica_endpoints:
+            return self._logic_module.endpoint
+        return session_pool.get_key(url)
+
+    def get_timeouts(self) -> Tuple[float, float]:
+        """ Connect and read timeouts of requests to the service in seconds """
+        return get_timeouts(self._logic_module)
+
+    def get_bulkhead(self, url: str) -> Optional[Bulkhead]:
+        """ Bulkhead limiting the concurrent requests to the service or None if they are unlimited """
+        limit = getattr(self._logic_module, 'max_concurrent_requests', None)
+        if limit is None:
+            limit = settings.GATEWAY_MAX_CONCURRENT_REQUESTS
+        return bulkheads.get(self.get_service_name(url), limit)
+
+    @staticmethod
+    def get_circuit_breaker(url: str) -> CircuitBreaker:
+        """ Circuit breaker of the service, fails fast if the service is considered to be unavailable """
+        key = session_pool.get_key(url)
+        breaker = circuit_breakers.get(key)
+        if not breaker.allow_request():
+            raise exceptions.ServiceUnavailable(f'Service is temporarily unavailable: {key}')
+        return breaker
+
+    @staticmethod
+    def record_response(breaker: CircuitBreaker, status_code: int) -> None:
+        """ Server errors count as failures of the service """
+        if status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+    @staticmethod
+    def get_error_message(e: Exception) -> str:
+        return (f'An error occurred when redirecting the request to '
+                f'or receiving the response from the service.\n'
+                f'Origin: ({e.__class__.__name__}: {e})')
+
+    def get_raw_body(self) -> Optional[bytes]:
+        """
+        Body of the incoming request as it was received or None if it was consumed by parsing it already.
+        """
+        django_request = self._in_request._request
+        if not hasattr(django_request, '_body'):
+            if django_request._read_started:
+                return None
+            # like HttpRequest.body, but without the upload size limit that DRF's parsing doesn't have either
+            django_request._body = django_request.read()
+        return django_request._body
+
+    def get_request_data(self) -> Union[dict, str, bytes]:
         """
         Create the data structure to be used in Swagger request. GET and  DELETE
         requests don't require body, so the data structure will have just
         query parameters if passed to swagger request.
+        JSON bodies are forwarded as they were received, without parsing and serializing them again.
         """
+        method = self._in_request.META['REQUEST_METHOD'].lower()
+
         if self._in_request.content_type == 'application/json':
+            if method in ['post', 'put', 'patch']:
+                body = self.get_raw_body()
+                if body is not None:
+                    return body
             return json.dumps(self._in_request.data)
-
-        method = self._in_request.META['REQUEST_METHOD'].lower()
         data = self._in_request.query_params.dict()
 
         data.pop('aggregate', None)
@@ -79,8 +235,9 @@ class BaseSwaggerClient:
             data.update(body)
 
             # handle uploaded files
-            if self._in_request.FILES:
-                for key, value in self._in_request.FILES.items():
+            files = self.get_request_files()
+            if files:
+                for key, value in files.items():
                     data[key] = {
                         'header': {
                             'Content-Type': value.content_type,
@@ -91,50 +248,92 @@ class BaseSwaggerClient:
 
         return data
 
-    def get_headers(self) -> dict:
-        """Get data and headers from the incoming request."""
+    def get_request_files(self) -> Optional[Mapping[str, Any]]:
+        """
+        Files uploaded with a multipart body or None. Other bodies aren't parsed for it, so a JSON body can still
+        be forwarded as it was received.
+        """
+        if not (self._in_request.content_type or '').startswith('multipart/form-data'):
+            return None
+        return self._in_request.FILES or None
+
+    def get_query_params(self) -> List[Tuple[str, str]]:
+        """ Query parameters of the incoming request as pairs, so repeated parameters are kept """
+        return [(key, value) for key, values in self._in_request.query_params.lists() for value in values]
+
+    def get_headers(self, conditional: bool = False) -> dict:
+        """
+        Get data and headers from the incoming request. Conditional headers are passed only if requested,
+        because they apply only to responses passed through to the client.
+        """
         headers = {
             'Authorization': get_authorization_header(self._in_request).decode('utf-8'),
         }
         if self._in_request.content_type == 'application/json':
             headers['content-type'] = 'application/json'
+        if conditional:
+            for header in self.CONDITIONAL_HEADERS:
+                value = self._in_request.META.get('HTTP_' + header.upper().replace('-', '_'))
+                if value:
+                    headers[header] = value
         return headers
 
 
 class SwaggerClient(BaseSwaggerClient):
     """ Synchronous implementation of Swagger client using requests lib """
 
-    def request(self, **kwargs) -> Tuple[Any, int, Dict[str, str]]:
+    def request(self, decode_content: bool = True, stream: bool = False, **kwargs) -> Tuple[Any, int, Dict[str, str]]:
         """
-        Perform request to the service, use Swagger spec for validating operation
+        Perform request to the service, use Swagger spec for validating operation.
+        JSON content is decoded only if `decode_content` is set, otherwise the raw body is returned.
+        With `stream` big raw bodies are returned as an iterator of chunks.
         """
+        stream = stream and not decode_content
 
         method, url = self.prepare_data(self._spec, **kwargs)
 
-        # Check request cache if applicable
-        if self.is_valid_for_cache() and url in self._data:
-            logger.debug(f'Taking data from cache: {url}')
-            return self._data[url]
-
-        # Make request to the service
-        method = getattr(requests, method)
-        try:
-            response = method(url,
-                              headers=self.get_headers(),
-                              params=self._in_request.query_params,
-                              data=self.get_request_data(),
-                              files=self._in_request.FILES)
-        except Exception as e:
-            error_msg = (f'An error occurred when redirecting the request to '
-                         f'or receiving the response from the service.\n'
-                         f'Origin: ({e.__class__.__name__}: {e})')
-            raise exceptions.GatewayError(error_msg)
-
-        try:
-            content = response.json()
-        except ValueError:
-            content = response.content
-        return_data = (content, response.status_code, response.headers)
+        with self._plan.step('upstream', method=method.upper(), url=url) as step:
+            # Check request cache if applicable
+            if decode_content and self.is_valid_for_cache() and url in self._data:
+                logger.debug(f'Taking data from cache: {url}')
+                step.update(source='request-cache', status=self._data[url][1])
+                return self._data[url]
+
+            # Check shared response cache if enabled for the logic module
+            cache_ttl = self.get_cache_ttl()
+            if cache_ttl:
+                cache_key = self.get_cache_key(url)
+                cached = response_cache.get(cache_key, self.get_service_name(url))
+                if cached is not None:
+                    logger.debug(f'Taking response from shared cache: {url}')
+                    step.update(source='shared-cache', status=cached.status_code)
+                    content = self.decode_content(cached.content) if decode_content else cached.content
+                    return content, cached.status_code, cached.headers
+
+            # Identical concurrent GET requests share one request to the service
+            send = partial(self._send, method, url, not decode_content, stream)
+            coalescing_key = self.get_coalescing_key(url, not decode_content)
+            is_shared = False
+            if coalescing_key is None:
+                content, status_code, headers = send()
+            else:
+                (content, status_code, headers), is_shared = request_coalescer.do(
+                    coalescing_key, send, self.get_service_name(url))
+                if is_shared and isinstance(content, Iterator):
+                    # a streamed body can be read only once
+                    content, status_code, headers = send()
+                    is_shared = False
+            step.update(source='coalesced' if is_shared else 'service', status=status_code)
+        self.invalidate_cache(**kwargs)
+
+        if isinstance(content, Iterator):
+            return content, status_code, headers
+        if cache_ttl and not is_shared and is_cacheable_response(status_code, headers):
+            response_cache.set(cache_key, content, status_code, headers, cache_ttl)
+        if not decode_content:
+            return content, status_code, headers
+
+        return_data = (self.decode_content(content), status_code, headers)
 
         # Cache data if request is cache-valid
         if self.is_valid_for_cache():
@@ -142,42 +341,175 @@ class SwaggerClient(BaseSwaggerClient):
 
         return return_data
 
+    def _send(self, method: str, url: str, conditional: bool,
+              stream: bool) -> Tuple[Union[bytes, Iterator[bytes]], int, Mapping[str, str]]:
+        """ Make request to the service within its concurrency limit """
+        bulkhead = self.get_bulkhead(url)
+        if bulkhead is None:
+            return self._send_balanced(method, url, conditional, stream)
+        with bulkhead.acquire():
+            return self._send_balanced(method, url, conditional, stream)
+
+    def _send_balanced(self, method: str, url: str, conditional: bool,
+                       stream: bool) -> Tuple[Union[bytes, Iterator[bytes]], int, Mapping[str, str]]:
+        """ Make request to the service, requests are balanced between replicas of the service if it has any """
+        balancer = load_balancers.get(self._logic_module)
+        if balancer is None:
+            return self._send_to(method, url, conditional, stream)
+
+        replica = balancer.acquire()
+        is_success = False
+        try:
+            result = self._send_to(method, replica.get_url(url), conditional, stream)
+            is_success = result[1] < 500
+            return result
+        finally:
+            balancer.release(replica, is_success)
+
+    def _send_to(self, method: str, url: str, conditional: bool,
+                 stream: bool) -> Tuple[Union[bytes, Iterator[bytes]], int, Mapping[str, str]]:
+        """ Make request to the service using the pooled keep-alive session of the service """
+        session = session_pool.get_session(self.get_session_key(url))
+        method = getattr(session, method)
+        headers = self.get_headers(conditional=conditional)
+        data = self.get_request_data()
+
+        breaker = self.get_circuit_breaker(url)
+        with metrics.measure_upstream_request(self.get_service_name(url)) as measurement:
+            try:
+                response = method(url,
+                                  headers=headers,
+                                  params=self._in_request.query_params,
+                                  data=data,
+                                  files=self.get_request_files(),
+                                  stream=stream,
+                                  timeout=self.get_timeouts())
+            except Exception as e:
+                breaker.record_failure()
+                raise exceptions.GatewayError(self.get_error_message(e))
+            measurement.status_code = response.status_code
+        self.record_response(breaker, response.status_code)
+
+        if stream and is_streamed_response(response.headers):
+            return iter_response_content(response), response.status_code, response.headers
+        return response.content, response.status_code, response.headers
+
 
 class AsyncSwaggerClient(BaseSwaggerClient):
     """ Asynchronous implementation of Swagger client using aiohttp lib """
 
-    async def request(self, **kwargs) -> Tuple[Any, int, Dict[str, str]]:
+    async def request(self, decode_content: bool = True, stream: bool = False,
+                      **kwargs) -> Tuple[Any, int, Dict[str, str]]:
         method, url = self.prepare_data(self._spec, **kwargs)
-
-        # Check request cache if applicable
-        if self.is_valid_for_cache() and url in self._data:
-            logger.debug(f'Taking data from cache: {url}')
-            return self._data[url]
-
-        # Make request to the service
-        async with aiohttp.ClientSession() as session:
-            method = getattr(session, method)
-            if self._in_request.FILES:
-                request_data = self.get_request_data()
-                data = aiohttp.FormData()
-                for field in request_data:
-                    if field == 'file':
-                        data.add_field('file', request_data['file']['data'].file)
-                    else:
-                        data.add_field(field, request_data[field])
+        stream = stream and not decode_content
+
+        with self._plan.step('upstream', method=method.upper(), url=url) as step:
+            # Check request cache if applicable
+            if decode_content and self.is_valid_for_cache() and url in self._data:
+                logger.debug(f'Taking data from cache: {url}')
+                step.update(source='request-cache', status=self._data[url][1])
+                return self._data[url]
+
+            # Check shared response cache if enabled for the logic module
+            cache_ttl = self.get_cache_ttl()
+            if cache_ttl:
+                cache_key = self.get_cache_key(url)
+                cached = response_cache.get(cache_key, self.get_service_name(url))
+                if cached is not None:
+                    logger.debug(f'Taking response from shared cache: {url}')
+                    step.update(source='shared-cache', status=cached.status_code)
+                    content = self.decode_content(cached.content) if decode_content else cached.content
+                    return content, cached.status_code, cached.headers
+
+            # Identical concurrent GET requests within the event loop share one request to the service
+            send = partial(self._send, method, url, not decode_content, stream)
+            coalescing_key = self.get_coalescing_key(url, not decode_content)
+            is_shared = False
+            if coalescing_key is None:
+                content, status_code, headers = await send()
             else:
-                data = self.get_request_data()
-
-            async with method(url, data=data, headers=self.get_headers()) as response:
-                try:
-                    content = await response.json()
-                except (json.JSONDecodeError, aiohttp.ContentTypeError):
-                    content = await response.read()
-
-            return_data = (content, response.status, response.headers)
+                (content, status_code, headers), is_shared = await async_request_coalescer.do(
+                    coalescing_key, send, self.get_service_name(url))
+                if is_shared and isinstance(content, AsyncIterator):
+                    # a streamed body can be read only once
+                    content, status_code, headers = await send()
+                    is_shared = False
+            step.update(source='coalesced' if is_shared else 'service', status=status_code)
+        self.invalidate_cache(**kwargs)
+
+        if isinstance(content, AsyncIterator):
+            return content, status_code, headers
+        if cache_ttl and not is_shared and is_cacheable_response(status_code, headers):
+            response_cache.set(cache_key, content, status_code, headers, cache_ttl)
+        if not decode_content:
+            return content, status_code, headers
+
+        return_data = (self.decode_content(content), status_code, headers)
 
         # Cache data if request is cache-valid
         if self.is_valid_for_cache():
             self._data[url] = return_data
 
         return return_data
+
+    async def _send(self, method: str, url: str, conditional: bool,
+                    stream: bool) -> Tuple[Union[bytes, AsyncIterator[bytes]], int, Mapping[str, str]]:
+        """ Make request to the service within its concurrency limit """
+        bulkhead = self.get_bulkhead(url)
+        if bulkhead is None:
+            return await self._send_balanced(method, url, conditional, stream)
+        async with bulkhead.async_acquire():
+            return await self._send_balanced(method, url, conditional, stream)
+
+    async def _send_balanced(self, method: str, url: str, conditional: bool,
+                             stream: bool) -> Tuple[Union[bytes, AsyncIterator[bytes]], int, Mapping[str, str]]:
+        """ Make request to the service, requests are balanced between replicas of the service if it has any """
+        balancer = load_balancers.get(self._logic_module)
+        if balancer is None:
+            return await self._send_to(method, url, conditional, stream)
+
+        replica = balancer.acquire()
+        is_success = False
+        try:
+            result = await self._send_to(method, replica.get_url(url), conditional, stream)
+            is_success = result[1] < 500
+            return result
+        finally:
+            balancer.release(replica, is_success)
+
+    async def _send_to(self, method: str, url: str, conditional: bool,
+                       stream: bool) -> Tuple[Union[bytes, AsyncIterator[bytes]], int, Mapping[str, str]]:
+        """ Make request to the service using the session shared within the event loop """
+        session = async_session_pool.get_session()
+        method = getattr(session, method)
+        if self.get_request_files():
+            request_data = self.get_request_data()
+            data = aiohttp.FormData()
+            for field in request_data:
+                if field == 'file':
+                    data.add_field('file', request_data['file']['data'].file)
+                else:
+                    data.add_field(field, request_data[field])
+        else:
+            data = self.get_request_data()
+        headers = self.get_headers(conditional=conditional)
+        connect_timeout, read_timeout = self.get_timeouts()
+
+        breaker = self.get_circuit_breaker(url)
+        with metrics.measure_upstream_request(self.get_service_name(url)) as measurement:
+            try:
+                response = await method(url, data=data, headers=headers, params=self.get_query_params(),
+                                        timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout,
+                                                                      sock_read=read_timeout))
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                breaker.record_failure()
+                raise exceptions.GatewayError(self.get_error_message(e))
+            measurement.status_code = response.status
+        self.record_response(breaker, response.status)
+
+        if stream and is_streamed_response(response.headers):
+            return aiter_response_content(response), response.status, response.headers
+        try:
+            return await response.read(), response.status, response.headers
+        finally:
+            response.release()
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+import weakref
+from typing import Any, Awaitable, Callable, Tuple
+
+from . import metrics
+
+
+class InFlightCall:
+    """ Upstream call that is performed once for all threads asking for the same key """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RequestCoalescer:
+    """
+    Single-flight coalescing of identical concurrent requests of threads in the process:
+    while a call for a key is in flight, other callers of the same key wait for its result
+    instead of performing the call again. Collapsed calls are counted per service in the metrics.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, func: Callable[[], Any], service: str = '') -> Tuple[Any, bool]:
+        """
+        Returns the result of `func` and whether it's shared with another caller (the call was collapsed)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = InFlightCall()
+
+        if not is_leader:
+            metrics.COALESCED_CALLS.labels(service).inc()
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+class AsyncRequestCoalescer:
+    """
+    Single-flight coalescing of identical concurrent requests of tasks in an event loop,
+    calls in flight are tracked per event loop.
+    """
+
+    def __init__(self):
+        self._calls = weakref.WeakKeyDictionary()
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]], service: str = '') -> Tuple[Any, bool]:
+        """
+        Returns the result of the coroutine function and whether it's shared with another caller
+        """
+        calls = self._calls.setdefault(asyncio.get_event_loop(), {})
+        future = calls.get(key)
+        if future is not None:
+            metrics.COALESCED_CALLS.labels(service).inc()
+            # waiting callers must not cancel the call of the others if they are cancelled themselves
+            return await asyncio.shield(future), True
+
+        future = calls[key] = asyncio.get_event_loop().create_future()
+        try:
+            result = await func()
+        except Exception as e:
+            future.set_exception(e)
+            # mark the exception as retrieved in case no other caller waits for it
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            if not future.done():
+                future.cancel()
+            del calls[key]
+        return result, False
+
+
+request_coalescer = RequestCoalescer()
+async_request_coalescer = AsyncRequestCoalescer()
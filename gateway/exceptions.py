@@ -27,6 +27,10 @@ class ServiceDoesNotExist(GatewayError):
     default_status_code = 404
 
 
+class ServiceUnavailable(GatewayError):
+    default_status_code = 503
+
+
 class PermissionDenied(GatewayError):
     default_status_code = 403
 
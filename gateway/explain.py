@@ -0,0 +1,52 @@
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+# query parameter of gateway requests which returns the execution plan of the request instead of its payload
+EXPLAIN_PARAM = 'explain'
+
+
+class ExecutionPlan:
+    """
+    Steps a gateway request executed, e.g. spec loading, requests to services, DataMesh join record queries
+    and local lookups with their details and durations. Superusers get it instead of the payload in explain mode.
+    A disabled plan doesn't record anything, so it can be used unconditionally.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.steps: List[Dict[str, Any]] = []
+        self.counters = Counter()
+
+    @contextmanager
+    def step(self, name: str, **details) -> Iterator[Dict[str, Any]]:
+        """ Record a step, the yielded dict can be updated with details known only after the step """
+        step = {'step': name, **details}
+        if self.enabled:
+            self.steps.append(step)
+        start = time.perf_counter()
+        try:
+            yield step
+        finally:
+            step['duration_ms'] = round((time.perf_counter() - start) * 1000, 1)
+
+    def count(self, name: str) -> None:
+        if self.enabled:
+            self.counters[name] += 1
+
+    def get_summary(self) -> Dict[str, int]:
+        def count_steps(name: str, **details) -> int:
+            return len([step for step in self.steps
+                        if step['step'] == name and all(step.get(k) == v for k, v in details.items())])
+
+        upstream_requests = count_steps('upstream', source='service')
+        return {
+            'spec_fetches': count_steps('spec', fetched=True),
+            'upstream_requests': upstream_requests,
+            'upstream_cache_hits': count_steps('upstream') - upstream_requests,
+            'join_record_queries': count_steps('join-records'),
+            'join_requests': self.counters['join_requests'],
+            'local_lookups': count_steps('local', source='database'),
+            'local_cache_hits': count_steps('local', source='cache'),
+        }
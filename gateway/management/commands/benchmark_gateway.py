@@ -0,0 +1,69 @@
+import json
+
+from django.core.management import BaseCommand
+
+from gateway.benchmark import BenchmarkData, StubService, run_benchmark
+from gateway.views import APIAsyncGatewayView, APIGatewayView
+
+VIEWS = {
+    'sync': APIGatewayView,
+    'async': APIAsyncGatewayView,
+}
+
+
+class Command(BaseCommand):
+    help = """
+    Benchmark the gateway with a local stub logic module. The synchronous and asynchronous gateway views are
+    driven concurrently with list and detail requests and, with --fanout, list requests joining related objects.
+    Throughput and p50/p95/p99 latencies are reported, with --output they are written to a JSON file
+    for regression tracking.
+
+    The stub logic module and its DataMesh configuration are created in the database under a generated service
+    name and deleted afterwards, existing data isn't changed.
+
+    Example:
+    python manage.py benchmark_gateway --requests 500 --concurrency 20 --items 50 --item-size 2048 --fanout 2
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Number of requests per scenario.')
+        parser.add_argument('--concurrency', type=int, default=10, help='Number of concurrent requests.')
+        parser.add_argument('--items', type=int, default=10, help='Number of objects in list responses.')
+        parser.add_argument('--item-size', type=int, default=1024, help='Payload size of an object in bytes.')
+        parser.add_argument('--fanout', type=int, default=0, help='Number of related objects joined to an object.')
+        parser.add_argument('--views', nargs='+', choices=VIEWS.keys(), default=list(VIEWS.keys()),
+                            help='Gateway views to benchmark.')
+        parser.add_argument('--output', default=None, help='Path of a JSON file for the results.')
+
+    def handle(self, *args, **options):
+        scenarios = [
+            ('list', 'items', None, None),
+            ('detail', 'items', '1', None),
+        ]
+        if options['fanout']:
+            scenarios.append(('join', 'items', None, {'join': 'true'}))
+
+        results = []
+        with StubService(items=options['items'], item_size=options['item_size']) as service:
+            with BenchmarkData(service, fanout=options['fanout']) as data:
+                for view_name in options['views']:
+                    for scenario, model, pk, query in scenarios:
+                        path = f'/{data.service_name}/{model}/' + (f'{pk}/' if pk else '')
+                        result = run_benchmark(
+                            f'{view_name}-{scenario}', VIEWS[view_name], path,
+                            {'service': data.service_name, 'model': model, 'pk': pk},
+                            requests=options['requests'], concurrency=options['concurrency'], query=query)
+                        results.append(result.to_dict())
+                        self.stdout.write(self._format_result(results[-1]))
+
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                json.dump({'options': {key: options[key] for key in ('requests', 'concurrency', 'items',
+                                                                     'item_size', 'fanout')},
+                           'results': results}, output_file, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+    @staticmethod
+    def _format_result(result: dict) -> str:
+        return (f'{result["name"]:<14} {result["throughput"]:>8} req/s  p50 {result["p50_ms"]:>7} ms  '
+                f'p95 {result["p95_ms"]:>7} ms  p99 {result["p99_ms"]:>7} ms  statuses {result["statuses"]}')
@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Tuple
+
+from django.db import connection
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, multiprocess
+
+# Metrics are kept per process. When the `prometheus_multiproc_dir` environment variable is set (e.g. for gunicorn
+# with several workers), processes write them to files in that directory and they are aggregated when scraped.
+
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+UPSTREAM_REQUEST_DURATION = Histogram(
+    'gateway_upstream_request_duration_seconds', 'Duration of requests to services until the response headers',
+    ['service'])
+UPSTREAM_RESPONSES = Counter(
+    'gateway_upstream_responses_total', 'Responses of services by status code, "error" if there was no response',
+    ['service', 'status'])
+UPSTREAM_REQUESTS_IN_FLIGHT = Gauge(
+    'gateway_upstream_requests_in_flight', 'Requests to services in flight', ['service'],
+    multiprocess_mode='livesum')
+BULKHEAD_REJECTIONS = Counter(
+    'gateway_bulkhead_rejections_total', 'Requests to services rejected because of the concurrency limit',
+    ['service'])
+
+RESPONSE_CACHE_LOOKUPS = Counter(
+    'gateway_response_cache_lookups_total', 'Lookups of service responses in the shared response cache by result',
+    ['service', 'result'])
+RESPONSE_CACHE_SIZE = Gauge(
+    'gateway_response_cache_size_bytes', 'Bytes of service responses in the shared response cache',
+    multiprocess_mode='livesum')
+
+COALESCED_CALLS = Counter(
+    'gateway_coalesced_calls_total', 'GET requests to services that shared the call of an identical concurrent request',
+    ['service'])
+
+SPEC_FETCH_DURATION = Histogram(
+    'gateway_spec_fetch_duration_seconds', 'Duration of downloads of Swagger specs of services')
+SPEC_FETCHES = Counter(
+    'gateway_spec_fetches_total', 'Downloads of Swagger specs of services by status code', ['status'])
+
+REQUEST_PHASE_DURATION = Histogram(
+    'gateway_request_phase_duration_seconds', 'Duration of the phases of gateway requests', ['phase'])
+
+JOIN_FANOUT = Histogram(
+    'datamesh_join_fanout', 'Number of requests to related services per DataMesh join', buckets=COUNT_BUCKETS)
+
+REQUESTS_IN_FLIGHT = Gauge(
+    'http_requests_in_flight', 'Requests in flight', multiprocess_mode='livesum')
+REQUEST_DB_QUERIES = Histogram(
+    'http_request_db_queries', 'Number of database queries per request', buckets=COUNT_BUCKETS)
+
+# META key of the Django request that holds the QueryCounter of the request
+QUERY_COUNTER_KEY = 'gateway.query_counter'
+
+
+class RequestMeasurement:
+    """
+    Measures the duration and the outcome of a request to a service,
+    the status code has to be set when the response is received
+    """
+
+    def __init__(self, duration: Histogram, responses: Counter, in_flight: Gauge = None, labels: Tuple[str] = ()):
+        self.duration = duration.labels(*labels) if labels else duration
+        self.responses = responses
+        self.in_flight = in_flight.labels(*labels) if in_flight is not None and labels else in_flight
+        self.labels = labels
+        self.status_code = None
+        self._start = None
+
+    def __enter__(self) -> 'RequestMeasurement':
+        if self.in_flight is not None:
+            self.in_flight.inc()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.duration.observe(time.perf_counter() - self._start)
+        status = str(self.status_code) if self.status_code is not None else 'error'
+        self.responses.labels(*self.labels, status).inc()
+        if self.in_flight is not None:
+            self.in_flight.dec()
+
+
+def measure_upstream_request(service: str) -> RequestMeasurement:
+    return RequestMeasurement(UPSTREAM_REQUEST_DURATION, UPSTREAM_RESPONSES, UPSTREAM_REQUESTS_IN_FLIGHT,
+                              labels=(service,))
+
+
+def measure_spec_fetch() -> RequestMeasurement:
+    return RequestMeasurement(SPEC_FETCH_DURATION, SPEC_FETCHES)
+
+
+class QueryCounter:
+    """ Database execute wrapper counting the queries (see `connection.execute_wrapper`) """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def run(self, func: Callable, *args) -> Any:
+        """ Calls the function counting its queries, e.g. in a thread pool worker of the request """
+        with connection.execute_wrapper(self):
+            return func(*args)
+
+
+class RequestMetrics:
+    """
+    Tracks a request in flight and counts its database queries until it's finished. The query counter is kept
+    in the META of the request, so work done for it in other threads can be counted as well.
+    """
+
+    def __init__(self, request):
+        self.query_counter = QueryCounter()
+        request.META[QUERY_COUNTER_KEY] = self.query_counter
+        REQUESTS_IN_FLIGHT.inc()
+
+    def close(self) -> None:
+        """ Finishes the measurement, responses call it when they are closed (see `HttpResponse.close`) """
+        REQUESTS_IN_FLIGHT.dec()
+        REQUEST_DB_QUERIES.observe(self.query_counter.count)
+
+
+def get_registry() -> CollectorRegistry:
+    """ Registry of the metrics of this process or of all processes in multi-process mode """
+    if 'prometheus_multiproc_dir' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
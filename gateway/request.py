@@ -1,21 +1,32 @@
+import hashlib
 import logging
 import json
 import uuid
 import asyncio
-from urllib.error import URLError
-from typing import Any, Dict, Union
+from concurrent.futures import Executor
+from functools import partial
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Union
 
 import requests
 import aiohttp
 from bravado_core.spec import Spec
 from django.http.request import QueryDict
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe, quote_etag
 from django.forms.models import model_to_dict
+from requests.structures import CaseInsensitiveDict
 from rest_framework.request import Request
 
 from . import exceptions
+from . import metrics
 from . import utils
 from core.models import LogicModule
-from .clients import SwaggerClient, AsyncSwaggerClient
+from .balancing import load_balancers
+from .clients import SwaggerClient, AsyncSwaggerClient, get_timeouts
+from .explain import ExecutionPlan
+from .sessions import async_session_pool
+from .specs import SpecFetchResult, spec_registry
+from .timing import Timings
 from datamesh.services import DataMesh
 from workflow import models as wfm
 
@@ -27,11 +38,42 @@ class GatewayResponse(object):
     Response object used with GatewayRequest
     """
 
+    # headers of the service's response that are passed to the client besides Content-Type
+    FORWARDED_HEADERS = (
+        'Cache-Control',
+        'Content-Disposition',
+        'Content-Language',
+        'ETag',
+        'Expires',
+        'Last-Modified',
+        'Vary',
+    )
+
     def __init__(self, content: Any, status_code: int, headers: Dict[str, str]):
         self.content = content
         self.status_code = status_code
         self.headers = headers
 
+    @property
+    def is_streamed(self) -> bool:
+        """ Streamed content is an iterator (or async iterator) of body chunks """
+        return isinstance(self.content, (Iterator, AsyncIterator))
+
+    def get_forwarded_headers(self) -> Dict[str, str]:
+        return {header: self.headers[header] for header in self.FORWARDED_HEADERS if header in self.headers}
+
+    def is_not_modified(self, request: Request) -> bool:
+        """
+        Checks ETag and Last-Modified of the response against the conditional headers of the request,
+        the client's copy is still fresh if they match
+        """
+        if self.status_code != 200 or self.is_streamed:
+            return False
+        response = get_conditional_response(request,
+                                            etag=self.headers.get('ETag'),
+                                            last_modified=parse_http_date_safe(self.headers.get('Last-Modified')))
+        return response is not None and response.status_code == 304
+
 
 class BaseGatewayRequest(object):
     """
@@ -53,10 +95,44 @@ class BaseGatewayRequest(object):
         self._logic_modules = dict()
         self._specs = dict()
         self._data = dict()
+        # durations of the phases of the request, shared with the view when it reports them
+        self.timings = Timings()
+        # steps of the request, recorded only in explain mode
+        self.plan = ExecutionPlan(enabled=False)
 
     def perform(self):
         raise NotImplementedError('You need to implement this method')
 
+    def is_content_extended(self) -> bool:
+        """
+        Response content of the service has to be decoded only if DataMesh extends it,
+        otherwise it's passed through as it is.
+        """
+        query_params = self.request.query_params
+        return 'join' in query_params or query_params.get('aggregate', '_none').lower() == 'true'
+
+    @staticmethod
+    def get_extended_headers(headers: Dict[str, str], content: str) -> Dict[str, str]:
+        """
+        Validators of the service's response don't apply to content extended by DataMesh,
+        so they are replaced by an ETag of the extended content
+        """
+        headers = CaseInsensitiveDict(headers)
+        headers.pop('Last-Modified', None)
+        headers['ETag'] = quote_etag(hashlib.md5(content.encode('utf-8')).hexdigest())
+        return headers
+
+    @staticmethod
+    def get_spec_step_details(service_name: str, schema_url: str) -> Dict[str, Any]:
+        """ Details of loading the spec in the execution plan, the spec is fetched only if it isn't fresh or stale """
+        cache_state = spec_registry.get_state(schema_url)
+        return {
+            'service': service_name,
+            'url': schema_url,
+            'cache': cache_state,
+            'fetched': cache_state in ('missing', 'expired'),
+        }
+
     def _get_logic_module(self, service_name: str) -> LogicModule:
         """ Retrieve LogicModule by service name. """
         if service_name not in self._logic_modules:
@@ -77,7 +153,9 @@ class BaseGatewayRequest(object):
         endpoint = endpoint[:endpoint.index('/', 1) + 1]
         return DataMesh(logic_module_endpoint=logic_module.endpoint_name,
                         model_endpoint=endpoint,
-                        access_validator=utils.ObjectAccessValidator(self.request))
+                        access_validator=utils.ObjectAccessValidator(self.request),
+                        timings=self.timings,
+                        plan=self.plan)
 
 
 class GatewayRequest(BaseGatewayRequest):
@@ -91,32 +169,42 @@ class GatewayRequest(BaseGatewayRequest):
         """
         # init swagger spec from the service swagger doc file
         try:
-            spec = self._get_swagger_spec(self.url_kwargs['service'])
+            with self.timings.phase('spec'):
+                spec = self._get_swagger_spec(self.url_kwargs['service'])
         except exceptions.ServiceDoesNotExist as e:
             return GatewayResponse(e.content, e.status, {'Content-Type': e.content_type})
 
         # create a client for performing data requests
-        client = SwaggerClient(spec, self.request)
+        logic_module = self._get_logic_module(self.url_kwargs['service'])
+        client = SwaggerClient(spec, self.request, logic_module, plan=self.plan)
 
-        # perform a service data request
-        content, status_code, headers = client.request(**self.url_kwargs)
+        # perform a service data request, content that isn't extended is passed through (big bodies are streamed)
+        is_content_extended = self.is_content_extended()
+        with self.timings.phase('upstream'):
+            content, status_code, headers = client.request(decode_content=is_content_extended,
+                                                           stream=not is_content_extended,
+                                                           **self.url_kwargs)
 
         # aggregate/join with the JoinRecord-models
         if 'join' in self.request.query_params and status_code == 200 and type(content) in [dict, list]:
             try:
-                self._join_response_data(resp_data=content)
+                with self.timings.phase('datamesh'):
+                    self._join_response_data(resp_data=content)
             except exceptions.ServiceDoesNotExist as e:
                 logger.error(e.content)
 
         # old DataMesh aggregation TODO: remove after migrating to the new one
         if self.request.query_params.get('aggregate', '_none').lower() == 'true' and status_code == 200:
             try:
-                self._aggregate_response_data(resp_data=content)
+                with self.timings.phase('datamesh'):
+                    self._aggregate_response_data(resp_data=content)
             except exceptions.ServiceDoesNotExist as e:
                 logger.error(e.content)
 
         if type(content) in [dict, list]:
-            content = json.dumps(content, cls=utils.GatewayJSONEncoder)
+            with self.timings.phase('encode'):
+                content = json.dumps(content, cls=utils.GatewayJSONEncoder)
+                headers = self.get_extended_headers(headers, content)
 
         return GatewayResponse(content, status_code, headers)
 
@@ -126,16 +214,61 @@ class GatewayRequest(BaseGatewayRequest):
         schema_url = utils.get_swagger_url_by_logic_module(logic_module)
 
         if schema_url not in self._specs:
+            with self.plan.step('spec', **self.get_spec_step_details(endpoint_name, schema_url)):
+                fetch = partial(self._fetch_swagger_spec, logic_module=logic_module)
+                self._specs[schema_url] = spec_registry.get_spec(schema_url, fetch, self.SWAGGER_CONFIG)
+
+        return self._specs[schema_url]
+
+    @classmethod
+    def _fetch_swagger_spec(cls, schema_url: str, headers: dict, logic_module: LogicModule = None) -> SpecFetchResult:
+        """
+        Download Swagger spec document, headers are used for conditional requests.
+        It's downloaded from the replicas of the logic module via its load balancer, the next replica is tried
+        if one fails. The timeouts of the logic module apply like to its other requests.
+        """
+        balancer = load_balancers.get(logic_module)
+        if balancer is None:
+            return cls._fetch_swagger_spec_from(schema_url, headers, logic_module)
+
+        for _ in balancer.replicas:
+            replica = balancer.acquire()
+            result, error, is_success = None, None, False
             try:
-                response = requests.get(schema_url)
-                spec_dict = response.json()
-            except URLError:
-                raise URLError(f'Make sure that {schema_url} is accessible.')
+                result = cls._fetch_swagger_spec_from(replica.get_url(schema_url), headers, logic_module)
+                is_success = result[0] < 500
+            except exceptions.GatewayError as e:
+                error = e
+            finally:
+                balancer.release(replica, is_success)
+            if is_success:
+                return result
+        # all replicas failed, the outcome of the last one is given
+        if error is not None:
+            raise error
+        return result
 
-            swagger_spec = Spec.from_dict(spec_dict, config=self.SWAGGER_CONFIG)
-            self._specs[schema_url] = swagger_spec
+    @staticmethod
+    def _fetch_swagger_spec_from(schema_url: str, headers: dict, logic_module: LogicModule = None) -> SpecFetchResult:
+        """ Download Swagger spec document from the URL """
+        breaker = SwaggerClient.get_circuit_breaker(schema_url)
+        with metrics.measure_spec_fetch() as measurement:
+            try:
+                response = requests.get(schema_url, headers=headers, timeout=get_timeouts(logic_module))
+            except requests.RequestException as e:
+                breaker.record_failure()
+                raise exceptions.GatewayError(f'Make sure that {schema_url} is accessible. '
+                                              f'Origin: ({e.__class__.__name__}: {e})')
+            measurement.status_code = response.status_code
+        SwaggerClient.record_response(breaker, response.status_code)
+        if response.status_code != 200:
+            return response.status_code, None, response.headers
+        try:
+            spec_dict = response.json()
+        except ValueError:
+            raise exceptions.GatewayError(f'Failed to parse swagger schema from {schema_url}. Should be JSON.')
 
-        return self._specs[schema_url]
+        return response.status_code, spec_dict, response.headers
 
     def _join_response_data(self, resp_data: Union[dict, list]) -> None:
         """
@@ -153,7 +286,7 @@ class GatewayRequest(BaseGatewayRequest):
         client_map = {}
         for service in datamesh.related_logic_modules:
             spec = self._get_swagger_spec(service)
-            client_map[service] = SwaggerClient(spec, self.request)
+            client_map[service] = SwaggerClient(spec, self.request, self._get_logic_module(service), plan=self.plan)
         datamesh.extend_data(resp_data, client_map)
 
     # ===================================================================
@@ -220,7 +353,8 @@ class GatewayRequest(BaseGatewayRequest):
                 self.request._request.GET = QueryDict(mutable=True)
 
                 # create a client for performing data requests
-                client = SwaggerClient(spec, self.request)
+                client = SwaggerClient(spec, self.request, self._get_logic_module(extend_model['service']),
+                                       plan=self.plan)
 
                 # perform a service data request
                 content, _, _ = client.request(**extend_model)
@@ -263,57 +397,146 @@ class AsyncGatewayRequest(BaseGatewayRequest):
     Allows to perform asynchronous requests to underlying services with asyncio and aiohttp package
     """
 
+    def __init__(self, request: Request, **kwargs):
+        super().__init__(request, **kwargs)
+        # thread pool for blocking code when the request is performed on a persistent event loop (ASGI)
+        self.executor: Executor = None
+
     def perform(self) -> GatewayResponse:
         """
         Override base class's method for asynchronous execution. Wraps async method.
         """
         result = {}
-        asyncio.run(self.async_perform(result))
+        asyncio.run(self._async_perform_and_close(result))
         if 'response' not in result:
             raise exceptions.GatewayError('Error performing asynchronous gateway request')
         return result['response']
 
+    async def _async_perform_and_close(self, result: dict):
+        """ The event loop is closed after the request, so its shared session has to be closed as well """
+        try:
+            await self.async_perform(result)
+        finally:
+            await async_session_pool.close()
+
+    async def run_sync(self, func, *args) -> Any:
+        """
+        Runs blocking code (e.g. database queries) in the thread pool if there is one,
+        otherwise in the current thread.
+        """
+        if self.executor is None:
+            return func(*args)
+        # queries of the pool's threads are counted for the request like the ones of the request's thread
+        query_counter = self.request.META.get(metrics.QUERY_COUNTER_KEY)
+        if query_counter is not None:
+            func, args = query_counter.run, (func, *args)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, partial(utils.call_closing_db_connections, func, *args))
+
     async def async_perform(self, result: dict):
         try:
-            spec = await self._get_swagger_spec(self.url_kwargs['service'])
+            with self.timings.phase('spec'):
+                spec = await self._get_swagger_spec(self.url_kwargs['service'])
         except exceptions.ServiceDoesNotExist as e:
-            return GatewayResponse(e.content, e.status, {'Content-Type': e.content_type})
+            result['response'] = GatewayResponse(e.content, e.status, {'Content-Type': e.content_type})
+            return
 
         # create a client for performing data requests
-        client = AsyncSwaggerClient(spec, self.request)
+        client = AsyncSwaggerClient(spec, self.request, self._get_logic_module(self.url_kwargs['service']),
+                                    plan=self.plan)
 
-        # perform a service data request
-        content, status_code, headers = await client.request(**self.url_kwargs)
+        # perform a service data request, content that isn't extended is passed through.
+        # Big bodies can be streamed only if the event loop outlives this request (ASGI)
+        is_content_extended = self.is_content_extended()
+        with self.timings.phase('upstream'):
+            content, status_code, headers = await client.request(
+                decode_content=is_content_extended, stream=not is_content_extended and bool(self.executor),
+                **self.url_kwargs)
 
         # aggregate/join with the JoinRecord-models
         if 'join' in self.request.query_params and status_code == 200 and type(content) in [dict, list]:
             try:
-                await self._join_response_data(resp_data=content)
+                with self.timings.phase('datamesh'):
+                    await self._join_response_data(resp_data=content)
             except exceptions.ServiceDoesNotExist as e:
                 logger.error(e.content)
 
         if type(content) in [dict, list]:
-            content = json.dumps(content, cls=utils.GatewayJSONEncoder)
+            with self.timings.phase('encode'):
+                content = json.dumps(content, cls=utils.GatewayJSONEncoder)
+                headers = self.get_extended_headers(headers, content)
 
         result['response'] = GatewayResponse(content, status_code, headers)
 
     async def _get_swagger_spec(self, endpoint_name: str) -> Spec:
         """ Gets swagger spec asynchronously and adds it to specs cache """
-        logic_module = self._get_logic_module(endpoint_name)
+        logic_module = await self.run_sync(self._get_logic_module, endpoint_name)
         schema_url = utils.get_swagger_url_by_logic_module(logic_module)
 
         if schema_url not in self._specs:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(schema_url) as response:
+            with self.plan.step('spec', **self.get_spec_step_details(endpoint_name, schema_url)):
+                # specs are revalidated in the background only if the event loop outlives this request (ASGI)
+                fetch = partial(self._fetch_swagger_spec, logic_module=logic_module)
+                self._specs[schema_url] = await spec_registry.async_get_spec(schema_url, fetch, self.SWAGGER_CONFIG,
+                                                                             background=bool(self.executor),
+                                                                             run_sync=self.run_sync)
+        return self._specs[schema_url]
+
+    @classmethod
+    async def _fetch_swagger_spec(cls, schema_url: str, headers: dict,
+                                  logic_module: LogicModule = None) -> SpecFetchResult:
+        """
+        Downloads swagger spec document asynchronously, headers are used for conditional requests.
+        It's downloaded from the replicas of the logic module via its load balancer, the next replica is tried
+        if one fails. The timeouts of the logic module apply like to its other requests.
+        """
+        balancer = load_balancers.get(logic_module)
+        if balancer is None:
+            return await cls._fetch_swagger_spec_from(schema_url, headers, logic_module)
+
+        for _ in balancer.replicas:
+            replica = balancer.acquire()
+            result, error, is_success = None, None, False
+            try:
+                result = await cls._fetch_swagger_spec_from(replica.get_url(schema_url), headers, logic_module)
+                is_success = result[0] < 500
+            except exceptions.GatewayError as e:
+                error = e
+            finally:
+                balancer.release(replica, is_success)
+            if is_success:
+                return result
+        # all replicas failed, the outcome of the last one is given
+        if error is not None:
+            raise error
+        return result
+
+    @staticmethod
+    async def _fetch_swagger_spec_from(schema_url: str, headers: dict,
+                                       logic_module: LogicModule = None) -> SpecFetchResult:
+        """ Downloads swagger spec document from the URL asynchronously """
+        session = async_session_pool.get_session()
+        connect_timeout, read_timeout = get_timeouts(logic_module)
+        timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        breaker = AsyncSwaggerClient.get_circuit_breaker(schema_url)
+        try:
+            with metrics.measure_spec_fetch() as measurement:
+                async with session.get(schema_url, headers=headers, timeout=timeout) as response:
+                    measurement.status_code = response.status
+                    AsyncSwaggerClient.record_response(breaker, response.status)
+                    if response.status != 200:
+                        return response.status, None, response.headers
                     try:
                         spec_dict = await response.json()
                     except aiohttp.ContentTypeError:
                         raise exceptions.GatewayError(
                             f'Failed to parse swagger schema from {schema_url}. Should be JSON.'
                         )
-                swagger_spec = Spec.from_dict(spec_dict, config=self.SWAGGER_CONFIG)
-                self._specs[schema_url] = swagger_spec
-        return self._specs[schema_url]
+                    return response.status, spec_dict, response.headers
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            breaker.record_failure()
+            raise exceptions.GatewayError(f'Make sure that {schema_url} is accessible. '
+                                          f'Origin: ({e.__class__.__name__}: {e})')
 
     async def _join_response_data(self, resp_data: Union[dict, list]) -> None:
         """
@@ -327,11 +550,77 @@ class AsyncGatewayRequest(BaseGatewayRequest):
                 # In case of pagination take 'results' as a items data
                 resp_data = resp_data.get('results', None)
 
-        datamesh = self.get_datamesh()
+        datamesh = await self.run_sync(self.get_datamesh)
+        related_logic_modules = list(await self.run_sync(getattr, datamesh, 'related_logic_modules'))
         tasks = []
-        for service in datamesh.related_logic_modules:
+        for service in related_logic_modules:
             tasks.append(self._get_swagger_spec(service))
         specs = await asyncio.gather(*tasks)
-        clients = map(lambda x: AsyncSwaggerClient(x, self.request), specs)
-        client_map = dict(zip(datamesh.related_logic_modules, clients))
-        await datamesh.async_extend_data(resp_data, client_map)
+        clients = [AsyncSwaggerClient(spec, self.request, self._get_logic_module(service), plan=self.plan)
+                   for service, spec in zip(related_logic_modules, specs)]
+        client_map = dict(zip(related_logic_modules, clients))
+
+        # join records and local models are queried in the thread pool, only service requests run in the loop
+        tasks = await self.run_sync(datamesh.prepare_async_tasks, resp_data, client_map)
+        await asyncio.gather(*tasks)
+
+
+class BatchGatewayRequest(AsyncGatewayRequest):
+    """
+    Performs many gateway requests concurrently on one event loop and responds with the list of their
+    statuses and bodies. Items that couldn't be prepared (e.g. invalid or forbidden) are given as responses.
+    If keys of the items are given, the response is an object of the results by their keys instead.
+    """
+
+    def __init__(self, request: Request, items: List[Union[AsyncGatewayRequest, GatewayResponse]],
+                 keys: List[str] = None):
+        super().__init__(request)
+        self.items = items
+        self.keys = keys
+
+    async def async_perform(self, result: dict):
+        results = await asyncio.gather(*[self._perform_item(item) for item in self.items])
+        if self.keys is not None:
+            results = dict(zip(self.keys, results))
+        with self.timings.phase('encode'):
+            content = json.dumps(results, cls=utils.GatewayJSONEncoder)
+        result['response'] = GatewayResponse(content, 200, {'Content-Type': 'application/json'})
+
+    async def _perform_item(self, item: Union[AsyncGatewayRequest, GatewayResponse]) -> dict:
+        if isinstance(item, GatewayResponse):
+            gw_response = item
+        else:
+            item.executor = self.executor
+            item.timings = self.timings
+            item.plan = self.plan
+            item_result = {}
+            try:
+                await item.async_perform(item_result)
+                gw_response = item_result['response']
+            except exceptions.GatewayError as e:
+                gw_response = GatewayResponse(e.content, e.status, {'Content-Type': e.content_type})
+            except Exception:
+                logger.exception(f'Error performing batch item: {item.request.path}')
+                error = exceptions.GatewayError('Error performing gateway request')
+                gw_response = GatewayResponse(error.content, error.status, {'Content-Type': error.content_type})
+
+        content = gw_response.content
+        if gw_response.is_streamed:
+            content = b''.join([chunk async for chunk in content])
+        return {
+            'status': gw_response.status_code,
+            'body': self._decode_body(content, gw_response.headers.get('Content-Type')),
+        }
+
+    @staticmethod
+    def _decode_body(content: Union[str, bytes, None], content_type: Optional[str]) -> Any:
+        if not content:
+            return None
+        if isinstance(content, bytes):
+            content = content.decode('utf-8', errors='replace')
+        if content_type and content_type.split(';')[0].strip() == 'application/json':
+            try:
+                return json.loads(content)
+            except ValueError:
+                pass
+        return content
@@ -0,0 +1,123 @@
+import asyncio
+import threading
+import weakref
+from http import cookiejar
+from urllib.parse import urlsplit
+
+import aiohttp
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+
+class BlockAllCookiesPolicy(cookiejar.DefaultCookiePolicy):
+    """
+    Sessions are shared between the users of the gateway, so cookies set by services must never be stored
+    """
+
+    def set_ok(self, cookie, request):
+        return False
+
+    def return_ok(self, cookie, request):
+        return False
+
+
+class SessionPool:
+    """
+    Per-process pool of keep-alive `requests` sessions, one session per logic module endpoint.
+    Each session keeps its own connection pool, so connections (and TLS handshakes) are reused across
+    gateway requests.
+    """
+
+    def __init__(self, pool_connections: int = None, pool_maxsize: int = None):
+        self._pool_connections = pool_connections
+        self._pool_maxsize = pool_maxsize
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    @property
+    def pool_connections(self) -> int:
+        return self._pool_connections or settings.GATEWAY_HTTP_POOL_CONNECTIONS
+
+    @property
+    def pool_maxsize(self) -> int:
+        return self._pool_maxsize or settings.GATEWAY_HTTP_POOL_MAXSIZE
+
+    @staticmethod
+    def get_key(url: str) -> str:
+        """ Key of the service (scheme and host) the URL points to """
+        parts = urlsplit(url)
+        return f'{parts.scheme}://{parts.netloc}'
+
+    def get_session(self, key: str) -> requests.Session:
+        """ Get (or create) the session for the logic module endpoint """
+        session = self._sessions.get(key)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(key)
+                if session is None:
+                    session = self._create_session()
+                    self._sessions[key] = session
+        return session
+
+    def close(self, key: str = None) -> None:
+        """ Close the session of the endpoint or all sessions if no endpoint is given """
+        with self._lock:
+            keys = list(self._sessions) if key is None else [key]
+            for session_key in keys:
+                session = self._sessions.pop(session_key, None)
+                if session is not None:
+                    session.close()
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        session.cookies.set_policy(BlockAllCookiesPolicy())
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+
+class AsyncSessionPool:
+    """
+    aiohttp sessions shared by all asynchronous gateway and DataMesh traffic, one session per event loop.
+    The TCP connector of the session limits connections per host, caches DNS lookups and keeps connections alive.
+    """
+
+    def __init__(self, limit: int = None, limit_per_host: int = None, dns_cache_ttl: int = None,
+                 keepalive_timeout: int = None):
+        self._limit = limit
+        self._limit_per_host = limit_per_host
+        self._dns_cache_ttl = dns_cache_ttl
+        self._keepalive_timeout = keepalive_timeout
+        self._sessions = weakref.WeakKeyDictionary()
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """ Get (or create) the session of the current event loop """
+        loop = asyncio.get_event_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(connector=self._create_connector(),
+                                            cookie_jar=aiohttp.DummyCookieJar())
+            self._sessions[loop] = session
+        return session
+
+    async def close(self) -> None:
+        """ Close the session of the current event loop """
+        session = self._sessions.pop(asyncio.get_event_loop(), None)
+        if session is not None:
+            await session.close()
+
+    def _create_connector(self) -> aiohttp.TCPConnector:
+        return aiohttp.TCPConnector(
+            limit=self._limit if self._limit is not None else settings.GATEWAY_ASYNC_CONNECTION_LIMIT,
+            limit_per_host=(self._limit_per_host if self._limit_per_host is not None
+                            else settings.GATEWAY_ASYNC_CONNECTION_LIMIT_PER_HOST),
+            ttl_dns_cache=self._dns_cache_ttl if self._dns_cache_ttl is not None else settings.GATEWAY_DNS_CACHE_TTL,
+            keepalive_timeout=(self._keepalive_timeout if self._keepalive_timeout is not None
+                               else settings.GATEWAY_KEEPALIVE_TIMEOUT),
+        )
+
+
+session_pool = SessionPool()
+async_session_pool = AsyncSessionPool()
@@ -0,0 +1,23 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import LogicModule
+from gateway.sessions import session_pool
+from gateway.specs import spec_registry
+from gateway.utils import get_swagger_url_by_logic_module
+
+
+@receiver(post_save, sender=LogicModule)
+@receiver(post_delete, sender=LogicModule)
+def invalidate_swagger_spec(sender, instance: LogicModule, **kwargs):
+    """ Drop the cached swagger spec, so the next gateway request loads the spec of the changed logic module """
+    spec_registry.invalidate(get_swagger_url_by_logic_module(instance))
+
+
+@receiver(post_delete, sender=LogicModule)
+def close_session(sender, instance: LogicModule, **kwargs):
+    """ Release the keep-alive connections to the deleted logic module """
+    if instance.endpoint:
+        session_pool.close(instance.endpoint)
+    for endpoint in instance.replica_endpoints:
+        session_pool.close(session_pool.get_key(endpoint))
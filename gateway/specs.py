@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import re
+import threading
+import time
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from bravado_core.spec import Spec
+from django.conf import settings
+
+from . import exceptions
+
+logger = logging.getLogger(__name__)
+
+# (status code, parsed swagger document or None for 304, response headers)
+SpecFetchResult = Tuple[int, Optional[dict], Dict[str, str]]
+
+# (HTTP method, URL template of the operation)
+Route = Tuple[str, str]
+
+# coroutine function running a blocking function with the given arguments, e.g. in a thread pool
+RunSync = Callable[..., Awaitable[Any]]
+
+
+class RouteTable:
+    """
+    Operations of a Swagger spec compiled into a lookup table keyed by (HTTP method, model, name of the
+    primary key path parameter or None). Only operations with `/{model}/` or `/{model}/{pk}/` paths are
+    routable by the gateway, the others are skipped.
+    """
+    PATH_PATTERN = re.compile(r'^/(?P<model>[^/{}]+)/(?:{(?P<pk_name>[^/{}]+)}/)?$')
+
+    def __init__(self, spec: Spec):
+        self._routes = {}
+        base_path = spec.spec_dict.get('basePath', '').rstrip('/')
+        api_url = spec.api_url.rstrip('/')
+        for resource in spec.resources.values():
+            for operation in resource.operations.values():
+                # paths are matched including the base path like in Spec.get_op_for_request
+                match = self.PATH_PATTERN.match(base_path + operation.path_name)
+                if match:
+                    key = (operation.http_method, match.group('model'), match.group('pk_name'))
+                    self._routes[key] = (operation.http_method, api_url + operation.path_name)
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def get_route(self, method: str, model: str, pk_name: str = None) -> Optional[Route]:
+        """ Route of the operation or None if the spec doesn't have it """
+        return self._routes.get((method.lower(), model, pk_name))
+
+
+class SpecCacheEntry:
+    """
+    Swagger spec of one logic module together with the validators needed for revalidating it
+    """
+
+    def __init__(self, spec: Spec, etag: str = None, last_modified: str = None):
+        self.spec = spec
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = time.monotonic()
+        self.revalidating = False
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+    def get_conditional_headers(self) -> Dict[str, str]:
+        """ Headers for a conditional request, so the service can answer with 304 if the spec didn't change """
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class SwaggerSpecRegistry:
+    """
+    Process-wide, thread-safe cache of Swagger specs keyed by the schema URL of a logic module.
+
+    A spec is served from memory while it is younger than `ttl`. Afterwards, during the `stale_ttl` window,
+    the stale spec is still served while it is revalidated in the background. Older specs are revalidated
+    before serving. Revalidation uses ETag/Last-Modified, so an unchanged spec isn't downloaded and built again.
+    """
+
+    def __init__(self, ttl: int = None, stale_ttl: int = None):
+        self._ttl = ttl
+        self._stale_ttl = stale_ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._url_locks = {}
+        self._route_tables = weakref.WeakKeyDictionary()
+
+    @property
+    def ttl(self) -> int:
+        return self._ttl if self._ttl is not None else settings.GATEWAY_SPEC_CACHE_TTL
+
+    @property
+    def stale_ttl(self) -> int:
+        return self._stale_ttl if self._stale_ttl is not None else settings.GATEWAY_SPEC_CACHE_STALE_TTL
+
+    def get_spec(self, schema_url: str, fetch: Callable[[str, dict], SpecFetchResult], config: dict) -> Spec:
+        """
+        Get spec for the schema URL, `fetch` is called with the URL and request headers when it needs to be loaded.
+        """
+        entry = self._entries.get(schema_url)
+        if entry and entry.age < self.ttl:
+            return entry.spec
+        if entry and entry.age < self.ttl + self.stale_ttl:
+            if self._mark_revalidating(entry):
+                thread = threading.Thread(target=self._revalidate_in_background,
+                                          args=(schema_url, entry, fetch, config), daemon=True)
+                thread.start()
+            return entry.spec
+
+        with self._get_url_lock(schema_url):
+            # the spec could have been loaded by another thread while waiting for the lock
+            entry = self._entries.get(schema_url)
+            if entry and entry.age < self.ttl:
+                return entry.spec
+            headers = entry.get_conditional_headers() if entry else {}
+            return self._store(schema_url, entry, fetch(schema_url, headers), config)
+
+    async def async_get_spec(self, schema_url: str, fetch: Callable[[str, dict], Awaitable[SpecFetchResult]],
+                             config: dict, background: bool = True, run_sync: RunSync = None) -> Spec:
+        """
+        Asynchronous version of get_spec, `fetch` has to be a coroutine function.
+        A stale spec is revalidated in a task of the current event loop only if `background` is True, i.e. the loop
+        outlives the request (ASGI). Otherwise the task would be cancelled together with the loop,
+        so the spec is revalidated before serving and the stale one is served only if revalidation fails.
+        Building the fetched spec is CPU-bound, it's done by the `run_sync` coroutine function (e.g. in a thread pool)
+        if it's given, otherwise on the event loop.
+        """
+        run_sync = run_sync or self._run_inline
+        entry = self._entries.get(schema_url)
+        if entry and entry.age < self.ttl:
+            return entry.spec
+        if entry and entry.age < self.ttl + self.stale_ttl:
+            if self._mark_revalidating(entry):
+                revalidation = self._async_revalidate(schema_url, entry, fetch, config, run_sync)
+                if not background:
+                    await revalidation
+                    return self._entries.get(schema_url, entry).spec
+                asyncio.ensure_future(revalidation)
+            return entry.spec
+
+        headers = entry.get_conditional_headers() if entry else {}
+        result = await fetch(schema_url, headers)
+        return await run_sync(self._store, schema_url, entry, result, config)
+
+    def get_state(self, schema_url: str) -> str:
+        """
+        State of the cached spec of the schema URL: a fresh spec is served from memory, a stale one is served
+        and revalidated in the background, an expired or missing one is loaded when it's requested
+        """
+        entry = self._entries.get(schema_url)
+        if entry is None:
+            return 'missing'
+        if entry.age < self.ttl:
+            return 'fresh'
+        if entry.age < self.ttl + self.stale_ttl:
+            return 'stale'
+        return 'expired'
+
+    def get_route_table(self, spec: Spec) -> RouteTable:
+        """ Route table of the spec, it's compiled once and kept as long as the spec is alive """
+        route_table = self._route_tables.get(spec)
+        if route_table is None:
+            route_table = RouteTable(spec)
+            with self._lock:
+                self._route_tables[spec] = route_table
+        return route_table
+
+    def invalidate(self, schema_url: str = None) -> None:
+        """ Drop cached spec of the schema URL or all specs if no URL is given """
+        with self._lock:
+            if schema_url is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(schema_url, None)
+
+    def _get_url_lock(self, schema_url: str) -> threading.Lock:
+        with self._lock:
+            return self._url_locks.setdefault(schema_url, threading.Lock())
+
+    def _mark_revalidating(self, entry: SpecCacheEntry) -> bool:
+        """ Returns True if the caller is responsible for revalidating the entry """
+        with self._lock:
+            if entry.revalidating:
+                return False
+            entry.revalidating = True
+            return True
+
+    def _store(self, schema_url: str, entry: Optional[SpecCacheEntry], result: SpecFetchResult, config: dict) -> Spec:
+        """
+        Cache the fetched spec. Only a 200 response is a spec, a 304 refreshes the cached one and anything else
+        raises GatewayError, so a revalidation failing that way keeps the cached spec.
+        """
+        status_code, spec_dict, headers = result
+        if status_code == 304 and entry is not None:
+            logger.debug(f'Swagger spec not modified: {schema_url}')
+            entry.fetched_at = time.monotonic()
+            return entry.spec
+        if status_code != 200 or spec_dict is None:
+            raise exceptions.GatewayError(f'Failed to load swagger spec from {schema_url}, '
+                                          f'the service responded with {status_code}.')
+
+        spec = Spec.from_dict(spec_dict, config=config)
+        # compile routes before the spec is shared, so requests don't have to
+        self.get_route_table(spec)
+        with self._lock:
+            self._entries[schema_url] = SpecCacheEntry(spec, headers.get('ETag'), headers.get('Last-Modified'))
+        return spec
+
+    def _revalidate_in_background(self, schema_url: str, entry: SpecCacheEntry,
+                                  fetch: Callable[[str, dict], SpecFetchResult], config: dict) -> None:
+        try:
+            self._store(schema_url, entry, fetch(schema_url, entry.get_conditional_headers()), config)
+        except Exception as e:
+            logger.warning(f'Failed to revalidate swagger spec {schema_url}: {e}')
+        finally:
+            entry.revalidating = False
+
+    async def _async_revalidate(self, schema_url: str, entry: SpecCacheEntry,
+                                fetch: Callable[[str, dict], Awaitable[SpecFetchResult]], config: dict,
+                                run_sync: RunSync) -> None:
+        try:
+            result = await fetch(schema_url, entry.get_conditional_headers())
+            await run_sync(self._store, schema_url, entry, result, config)
+        except Exception as e:
+            logger.warning(f'Failed to revalidate swagger spec {schema_url}: {e}')
+        finally:
+            entry.revalidating = False
+
+    @staticmethod
+    async def _run_inline(func: Callable, *args) -> Any:
+        return func(*args)
+
+
+spec_registry = SwaggerSpecRegistry()
@@ -0,0 +1,211 @@
+import asyncio
+import os
+from concurrent.futures import Executor, Future
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from django.utils import timezone
+
+import factories
+from core.tests.fixtures import logic_module
+from gateway.asgi import ASGI_EXECUTOR_KEY, ASGIHandler, DeferredGatewayResponse
+from gateway.request import GatewayResponse
+from gateway.timing import Timings
+from .utils import AiohttpResponseMock, create_aiohttp_session_mock
+
+
+CURRENT_PATH = os.path.dirname(os.path.abspath(__file__))
+
+
+class InlineExecutor(Executor):
+    """ Runs submitted calls in the current thread, so the test database transaction is visible """
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+def call_asgi(handler, loop, path, headers=(), query_string=b'', disconnect_after=None):
+    """ Calls the ASGI application, the client disconnects after `disconnect_after` body messages if it's given """
+    scope = {
+        'type': 'http',
+        'method': 'GET',
+        'path': path,
+        'query_string': query_string,
+        'headers': list(headers),
+        'server': ('testserver', 80),
+    }
+    messages = []
+    requested = False
+    disconnected = loop.create_future()
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # like ASGI servers, wait until the client disconnects
+        await disconnected
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        messages.append(message)
+        body_messages = [m for m in messages if m['type'] == 'http.response.body']
+        if disconnect_after is not None and len(body_messages) >= disconnect_after and not disconnected.done():
+            disconnected.set_result(None)
+
+    loop.run_until_complete(handler(scope, receive, send))
+    return messages
+
+
+def test_get_environ():
+    handler = ASGIHandler(executor=InlineExecutor())
+    scope = {
+        'type': 'http',
+        'method': 'POST',
+        'path': '/documents/documents/',
+        'query_string': b'join=true',
+        'headers': [(b'content-type', b'application/json'), (b'authorization', b'Bearer token'),
+                    (b'accept', b'text/html'), (b'accept', b'application/json')],
+        'server': ('buildly', 8080),
+        'client': ('10.0.0.1', 5000),
+    }
+
+    environ = handler.get_environ(scope, b'{}')
+
+    assert environ['REQUEST_METHOD'] == 'POST'
+    assert environ['PATH_INFO'] == '/documents/documents/'
+    assert environ['QUERY_STRING'] == 'join=true'
+    assert environ['CONTENT_TYPE'] == 'application/json'
+    assert environ['HTTP_AUTHORIZATION'] == 'Bearer token'
+    assert environ['HTTP_ACCEPT'] == 'text/html,application/json'
+    assert environ['SERVER_PORT'] == '8080'
+    assert environ['REMOTE_ADDR'] == '10.0.0.1'
+    assert environ['wsgi.input'].read() == b'{}'
+    assert environ[ASGI_EXECUTOR_KEY] is handler.executor
+
+
+def test_deferred_response_resolve(request_factory):
+    class GatewayRequestMock:
+        request = request_factory.post('/documents/documents/')
+        timings = Timings()
+
+        async def async_perform(self, result):
+            result['response'] = GatewayResponse('{"id": 1}', 201, {'Content-Type': 'application/json'})
+
+    response = DeferredGatewayResponse(GatewayRequestMock())
+    response['Content-Length'] = '0'
+    asyncio.run(response.resolve())
+
+    assert response.status_code == 201
+    assert response.content == b'{"id": 1}'
+    assert response['Content-Type'] == 'application/json'
+    assert response['Content-Length'] == '9'
+    assert response['Server-Timing'].startswith('total;dur=')
+
+
+def test_deferred_response_resolve_streamed(request_factory):
+    async def chunks():
+        yield b'{"id": '
+        yield b'1}'
+
+    class GatewayRequestMock:
+        request = request_factory.get('/documents/documents/')
+        timings = Timings()
+
+        async def async_perform(self, result):
+            result['response'] = GatewayResponse(chunks(), 200, {'Content-Type': 'application/json'})
+
+    async def resolve_and_read(response):
+        await response.resolve()
+        return [chunk async for chunk in response.async_streaming_content]
+
+    response = DeferredGatewayResponse(GatewayRequestMock())
+    response['Content-Length'] = '0'
+
+    assert asyncio.run(resolve_and_read(response)) == [b'{"id": ', b'1}']
+    assert response.status_code == 200
+    assert not response.has_header('Content-Length')
+
+
+def test_asgi_streaming_stops_when_client_disconnects(request_factory, event_loop):
+    closed = []
+
+    async def chunks():
+        try:
+            for _ in range(100):
+                # like reading from the service connection
+                await asyncio.sleep(0)
+                yield b'chunk'
+        finally:
+            closed.append(True)
+
+    class GatewayRequestMock:
+        request = request_factory.get('/documents/documents/')
+        timings = Timings()
+
+        async def async_perform(self, result):
+            result['response'] = GatewayResponse(chunks(), 200, {'Content-Type': 'application/json'})
+
+    handler = ASGIHandler(executor=InlineExecutor())
+    with patch.object(handler, 'get_response_in_thread', return_value=DeferredGatewayResponse(GatewayRequestMock())):
+        messages = call_asgi(handler, event_loop, '/async/documents/documents/', disconnect_after=2)
+
+    assert len(messages) < 10
+    assert closed == [True]
+
+
+def test_deferred_response_resolve_not_modified(request_factory):
+    class GatewayRequestMock:
+        request = request_factory.get('/documents/documents/1/', HTTP_IF_NONE_MATCH='"v1"')
+        timings = Timings()
+
+        async def async_perform(self, result):
+            headers = {'Content-Type': 'application/json', 'ETag': '"v1"'}
+            result['response'] = GatewayResponse('{"id": 1}', 200, headers)
+
+    response = DeferredGatewayResponse(GatewayRequestMock())
+    asyncio.run(response.resolve())
+
+    assert response.status_code == 304
+    assert response.content == b''
+    assert response['ETag'] == '"v1"'
+    assert not response.has_header('Content-Type')
+
+
+# requests close old database connections like in production, so the test data has to be committed
+@pytest.mark.django_db(transaction=True)
+@patch('gateway.request.aiohttp.ClientSession')
+def test_asgi_async_gateway_request(client_session_mock, logic_module, event_loop):
+    access_token = factories.AccessToken(expires=timezone.now() + timedelta(hours=1))
+
+    with open(os.path.join(CURRENT_PATH, 'fixtures/swagger_documents.json'), 'rb') as r:
+        swagger_body = r.read()
+    responses = [
+        AiohttpResponseMock(method='GET', url=f'{logic_module.endpoint}/docs/swagger.json', status=200,
+                            body=swagger_body, headers={'Content-Type': 'application/json'}),
+        AiohttpResponseMock(method='GET', url=f'{logic_module.endpoint}/thumbnail/1/', status=200,
+                            body=b'{"id": 1}', headers={'Content-Type': 'application/json'}),
+    ]
+    client_session_mock.return_value = create_aiohttp_session_mock(responses, loop=event_loop)
+
+    handler = ASGIHandler(executor=InlineExecutor())
+    messages = call_asgi(handler, event_loop, f'/async/{logic_module.endpoint_name}/thumbnail/1/',
+                         headers=[(b'authorization', f'Bearer {access_token.token}'.encode())])
+
+    start, *body = messages
+    assert start['status'] == 200
+    assert (b'Content-Type', b'application/json') in start['headers']
+    assert b''.join(message['body'] for message in body) == b'{"id": 1}'
+    assert not body[-1].get('more_body', False)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_asgi_unauthenticated_request(logic_module, event_loop):
+    handler = ASGIHandler(executor=InlineExecutor())
+    start, _ = call_asgi(handler, event_loop, f'/async/{logic_module.endpoint_name}/thumbnail/1/')
+
+    # SessionAuthentication comes first and doesn't give a WWW-Authenticate header, so it's 403 rather than 401
+    assert start['status'] == 403
@@ -0,0 +1,85 @@
+import time
+
+from core.models import LogicModule
+from gateway.balancing import LoadBalancer, LoadBalancerRegistry, Replica
+
+ENDPOINTS = ['http://documentservice-1:8080', 'http://documentservice-2:8080', 'http://documentservice-3:8080']
+
+
+def test_replica_get_url():
+    replica = Replica('https://documentservice-2:8443')
+    assert replica.get_url('http://documentservice:8080/documents/1/?a=1') == \
+        'https://documentservice-2:8443/documents/1/?a=1'
+
+
+def test_round_robin():
+    balancer = LoadBalancer(ENDPOINTS, LogicModule.LOAD_BALANCING_ROUND_ROBIN, ejection_failures=1, ejection_time=30)
+    endpoints = []
+    for _ in range(6):
+        replica = balancer.acquire()
+        endpoints.append(replica.endpoint)
+        balancer.release(replica, is_success=True)
+
+    assert endpoints == ENDPOINTS + ENDPOINTS
+
+
+def test_least_outstanding():
+    balancer = LoadBalancer(ENDPOINTS, LogicModule.LOAD_BALANCING_LEAST_OUTSTANDING, ejection_failures=1,
+                            ejection_time=30)
+    busy = [balancer.acquire(), balancer.acquire()]
+    assert {replica.endpoint for replica in busy} == set(ENDPOINTS[:2])
+
+    idle = balancer.acquire()
+    assert idle.endpoint == ENDPOINTS[2]
+
+    balancer.release(busy[0], is_success=True)
+    assert balancer.acquire() is busy[0]
+
+
+def test_failing_replica_is_ejected():
+    balancer = LoadBalancer(ENDPOINTS[:2], LogicModule.LOAD_BALANCING_ROUND_ROBIN, ejection_failures=2,
+                            ejection_time=30)
+    failing = balancer.replicas[0]
+    for _ in range(2):
+        balancer.release(balancer.acquire(), is_success=True)
+        failing.outstanding += 1
+        balancer.release(failing, is_success=False)
+    assert failing.is_ejected
+
+    endpoints = set()
+    for _ in range(4):
+        replica = balancer.acquire()
+        endpoints.add(replica.endpoint)
+        balancer.release(replica, is_success=True)
+    assert endpoints == {ENDPOINTS[1]}
+
+    # the replica gets requests again after the ejection time
+    failing.ejected_until = time.monotonic() - 1
+    replicas = [balancer.acquire() for _ in range(2)]
+    assert failing in replicas
+
+
+def test_all_replicas_ejected():
+    balancer = LoadBalancer(ENDPOINTS[:2], LogicModule.LOAD_BALANCING_ROUND_ROBIN, ejection_failures=1,
+                            ejection_time=30)
+    for replica in balancer.replicas:
+        replica.outstanding += 1
+        balancer.release(replica, is_success=False)
+
+    assert balancer.acquire() in balancer.replicas
+
+
+def test_registry():
+    registry = LoadBalancerRegistry()
+    logic_module = LogicModule(endpoint=ENDPOINTS[0])
+    assert registry.get(logic_module) is None
+
+    logic_module.replica_endpoints = ENDPOINTS[1:]
+    balancer = registry.get(logic_module)
+    assert [replica.endpoint for replica in balancer.replicas] == ENDPOINTS
+    assert registry.get(logic_module) is balancer
+
+    # balancer is replaced when the logic module changes
+    logic_module.load_balancing = LogicModule.LOAD_BALANCING_LEAST_OUTSTANDING
+    assert registry.get(logic_module) is not balancer
+    assert registry.get(logic_module).strategy == LogicModule.LOAD_BALANCING_LEAST_OUTSTANDING
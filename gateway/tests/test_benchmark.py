@@ -0,0 +1,71 @@
+import json
+
+import pytest
+import requests
+from django.core.management import call_command
+
+import factories
+from core.models import LogicModule
+from datamesh.models import JoinRecord, LogicModuleModel, Relationship
+from gateway.benchmark import STUB_SERVICE_NAME, BenchmarkData, BenchmarkResult, StubService
+
+
+def test_result_percentiles():
+    result = BenchmarkResult(name='test', requests=100, concurrency=10, duration=2.0, statuses={200: 99, 502: 1},
+                             latencies=[i / 1000 for i in range(100, 0, -1)])
+
+    assert result.throughput == 50
+    assert result.get_percentile(50) == 0.05
+    assert result.get_percentile(99) == 0.099
+    assert result.get_percentile(100) == 0.1
+    assert result.to_dict() == {
+        'name': 'test',
+        'requests': 100,
+        'concurrency': 10,
+        'duration': 2.0,
+        'throughput': 50.0,
+        'p50_ms': 50.0,
+        'p95_ms': 95.0,
+        'p99_ms': 99.0,
+        'statuses': {'200': 99, '502': 1},
+    }
+
+
+def test_stub_service():
+    with StubService(items=3, item_size=10) as service:
+        spec = requests.get(f'{service.endpoint}/docs/swagger.json').json()
+        items = requests.get(f'{service.endpoint}/items/').json()
+        related = requests.get(f'{service.endpoint}/relateds/7/').json()
+
+    assert spec['host'] == f'127.0.0.1:{service.port}'
+    assert len(items) == 3
+    assert items[0] == {'id': 1, 'payload': 'x' * 10}
+    assert related['id'] == 7
+
+
+@pytest.mark.django_db(transaction=True)
+def test_benchmark_command(tmp_path):
+    output = tmp_path / 'results.json'
+
+    call_command('benchmark_gateway', requests=4, concurrency=2, items=2, fanout=1, output=str(output))
+
+    results = json.loads(output.read_text())['results']
+    assert [result['name'] for result in results] == [
+        'sync-list', 'sync-detail', 'sync-join', 'async-list', 'async-detail', 'async-join']
+    assert all(result['statuses'] == {'200': 4} for result in results)
+
+
+@pytest.mark.django_db()
+def test_benchmark_data_keeps_existing_data():
+    logic_module = factories.LogicModule(name=STUB_SERVICE_NAME, endpoint_name=STUB_SERVICE_NAME,
+                                         endpoint='http://benchmark:8080')
+    model = factories.LogicModuleModel(logic_module_endpoint_name=STUB_SERVICE_NAME, model='Item')
+
+    with BenchmarkData(StubService(items=2), fanout=1) as data:
+        assert data.service_name != STUB_SERVICE_NAME
+        assert LogicModuleModel.objects.filter(logic_module_endpoint_name=data.service_name).count() == 2
+        assert JoinRecord.objects.filter(relationship__origin_model__in=data.models).count() == 2
+
+    assert list(LogicModule.objects.all()) == [logic_module]
+    assert list(LogicModuleModel.objects.all()) == [model]
+    assert not Relationship.objects.exists()
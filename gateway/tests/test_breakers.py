@@ -0,0 +1,66 @@
+from gateway.breakers import CircuitBreaker, CircuitBreakerRegistry
+
+
+def expire(breaker, seconds):
+    breaker.opened_at -= seconds
+    if breaker.probe_started_at is not None:
+        breaker.probe_started_at -= seconds
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker('documents', failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+
+def test_half_open_breaker_allows_one_probe():
+    breaker = CircuitBreaker('documents', failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    expire(breaker, 31)
+
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    # successful probe closes the breaker
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_failed_probe_opens_breaker_again():
+    breaker = CircuitBreaker('documents', failure_threshold=3, reset_timeout=30)
+    for _ in range(3):
+        breaker.record_failure()
+    expire(breaker, 31)
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+
+def test_probe_without_outcome_is_replaced():
+    breaker = CircuitBreaker('documents', failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    expire(breaker, 31)
+    assert breaker.allow_request()
+
+    expire(breaker, 31)
+    assert breaker.allow_request()
+
+
+def test_registry():
+    registry = CircuitBreakerRegistry(failure_threshold=1, reset_timeout=30)
+    breaker = registry.get('http://documentservice:8080')
+    assert registry.get('http://documentservice:8080') is breaker
+
+    breaker.record_failure()
+    assert registry.get_states() == {'http://documentservice:8080': CircuitBreaker.OPEN}
@@ -0,0 +1,87 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from gateway import exceptions
+from gateway.bulkheads import Bulkhead, BulkheadRegistry
+
+
+def test_bulkhead_limits_concurrent_threads():
+    bulkhead = Bulkhead('documents', limit=2, timeout=5)
+    lock = threading.Lock()
+    running = []
+    max_running = []
+
+    def request():
+        with bulkhead.acquire():
+            with lock:
+                running.append(1)
+                max_running.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.pop()
+
+    threads = [threading.Thread(target=request) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert max(max_running) == 2
+
+
+def test_bulkhead_limits_concurrent_coroutines():
+    bulkhead = Bulkhead('documents', limit=3, timeout=5)
+    running = []
+    max_running = []
+
+    async def request():
+        async with bulkhead.async_acquire():
+            running.append(1)
+            max_running.append(len(running))
+            await asyncio.sleep(0.01)
+            running.pop()
+
+    async def fan_out():
+        await asyncio.gather(*[request() for _ in range(20)])
+
+    asyncio.run(fan_out())
+
+    assert max(max_running) == 3
+
+
+def test_bulkhead_rejects_after_timeout():
+    bulkhead = Bulkhead('documents', limit=1, timeout=0.01)
+
+    with bulkhead.acquire():
+        with pytest.raises(exceptions.ServiceUnavailable):
+            with bulkhead.acquire():
+                pass
+
+    async def request():
+        async with bulkhead.async_acquire():
+            with pytest.raises(exceptions.ServiceUnavailable):
+                async with bulkhead.async_acquire():
+                    pass
+
+    asyncio.run(request())
+
+    # slots are released again
+    with bulkhead.acquire():
+        pass
+
+
+def test_registry():
+    registry = BulkheadRegistry(timeout=1)
+
+    assert registry.get('documents', 0) is None
+    assert registry.get('documents', None) is None
+    bulkhead = registry.get('documents', 5)
+    assert registry.get('documents', 5) is bulkhead
+    assert registry.get('products', 5) is not bulkhead
+
+    changed = registry.get('documents', 10)
+    assert changed is not bulkhead
+    assert changed.limit == 10
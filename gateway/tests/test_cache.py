@@ -0,0 +1,78 @@
+import time
+
+from prometheus_client import REGISTRY
+
+from gateway.cache import ResponseCache
+
+URL = 'http://documentservice:8080/documents/'
+
+
+def test_get_key_depends_on_authorization():
+    assert ResponseCache.get_key(URL, 'a=1', 'Bearer 1') == ResponseCache.get_key(URL, 'a=1', 'Bearer 1')
+    assert ResponseCache.get_key(URL, 'a=1', 'Bearer 1') != ResponseCache.get_key(URL, 'a=1', 'Bearer 2')
+    assert ResponseCache.get_key(URL, 'a=1', 'Bearer 1') != ResponseCache.get_key(URL, 'a=2', 'Bearer 1')
+    assert 'Bearer' not in ResponseCache.get_key(URL, '', 'Bearer 1')
+
+
+def get_lookups(result):
+    return REGISTRY.get_sample_value('gateway_response_cache_lookups_total',
+                                     {'service': 'cache-test', 'result': result}) or 0
+
+
+def test_hits_and_misses():
+    cache = ResponseCache(max_size=100)
+    hits, misses = get_lookups('hit'), get_lookups('miss')
+    size = REGISTRY.get_sample_value('gateway_response_cache_size_bytes')
+    assert cache.get('key', 'cache-test') is None
+
+    cache.set('key', b'content', 200, {'Content-Type': 'application/json'}, ttl=60)
+    cached = cache.get('key', 'cache-test')
+
+    assert cached.content == b'content'
+    assert cached.status_code == 200
+    assert cached.headers == {'Content-Type': 'application/json'}
+    assert (get_lookups('hit'), get_lookups('miss')) == (hits + 1, misses + 1)
+    assert REGISTRY.get_sample_value('gateway_response_cache_size_bytes') == size + 7
+
+    cache.clear()
+    assert REGISTRY.get_sample_value('gateway_response_cache_size_bytes') == size
+
+
+def test_expired_response_is_dropped():
+    cache = ResponseCache(max_size=100)
+    cache.set('key', b'content', 200, {}, ttl=60)
+    cache._entries['key'] = cache._entries['key']._replace(expires_at=time.monotonic() - 1)
+
+    assert cache.get('key') is None
+    assert len(cache) == 0
+    assert cache.size == 0
+
+
+def test_least_recently_used_responses_are_evicted():
+    cache = ResponseCache(max_size=10)
+    cache.set('a', b'1234', 200, {}, ttl=60)
+    cache.set('b', b'1234', 200, {}, ttl=60)
+    cache.get('a')
+    cache.set('c', b'1234', 200, {}, ttl=60)
+
+    assert cache.get('a') is not None
+    assert cache.get('b') is None
+    assert cache.get('c') is not None
+    assert cache.size == 8
+
+    # responses bigger than the cache are not cached at all
+    cache.set('d', b'12345678901', 200, {}, ttl=60)
+    assert cache.get('d') is None
+    assert len(cache) == 2
+
+
+def test_invalidate_by_url_prefix():
+    cache = ResponseCache(max_size=100)
+    cache.set(ResponseCache.get_key(URL, '', 'Bearer 1'), b'1', 200, {}, ttl=60)
+    cache.set(ResponseCache.get_key(f'{URL}1/', '', 'Bearer 1'), b'2', 200, {}, ttl=60)
+    cache.set(ResponseCache.get_key('http://locationservice:8080/siteprofiles/', '', 'Bearer 1'), b'3', 200, {},
+              ttl=60)
+
+    cache.invalidate(URL)
+    assert len(cache) == 1
+    assert cache.size == 1
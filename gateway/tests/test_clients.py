@@ -0,0 +1,64 @@
+import asyncio
+from unittest.mock import Mock, patch
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.request import Empty, Request
+
+from gateway.clients import AsyncSwaggerClient, SwaggerClient
+
+URL = 'http://documentservice:8080/documents/'
+BODY = '{"file_name":  "report.pdf", "size": 1.50}'
+
+
+def create_request(request_factory, body=BODY, content_type='application/json'):
+    django_request = request_factory.post('/documents/documents/', body, content_type=content_type)
+    return Request(django_request, parsers=[JSONParser(), FormParser(), MultiPartParser()])
+
+
+class AiohttpSessionMock:
+
+    def __init__(self):
+        self.calls = []
+
+    async def post(self, url, **kwargs):
+        self.calls.append(kwargs)
+        return Mock(status=201, headers={}, read=asyncio.coroutine(lambda: b''))
+
+
+def test_json_body_is_forwarded_without_parsing(request_factory):
+    request = create_request(request_factory)
+    session = Mock()
+    session.post.return_value = Mock(status_code=201, headers={}, content=b'')
+
+    with patch('gateway.clients.session_pool.get_session', return_value=session):
+        SwaggerClient(None, request)._send_to('post', URL, conditional=False, stream=False)
+
+    kwargs = session.post.call_args[1]
+    assert kwargs['data'] == BODY.encode()
+    assert kwargs['files'] is None
+    assert request._full_data is Empty
+
+
+def test_async_json_body_is_forwarded_without_parsing(request_factory):
+    request = create_request(request_factory)
+    session = AiohttpSessionMock()
+
+    with patch('gateway.clients.async_session_pool.get_session', return_value=session):
+        asyncio.run(AsyncSwaggerClient(None, request)._send_to('post', URL, conditional=False, stream=False))
+
+    assert session.calls[0]['data'] == BODY.encode()
+    assert request._full_data is Empty
+
+
+def test_multipart_files_are_forwarded(request_factory):
+    django_request = request_factory.post('/documents/documents/', {'file': SimpleUploadedFile('report.txt', b'report')},
+                                          format='multipart')
+    request = Request(django_request, parsers=[JSONParser(), FormParser(), MultiPartParser()])
+    session = Mock()
+    session.post.return_value = Mock(status_code=201, headers={}, content=b'')
+
+    with patch('gateway.clients.session_pool.get_session', return_value=session):
+        SwaggerClient(None, request)._send_to('post', URL, conditional=False, stream=False)
+
+    assert list(session.post.call_args[1]['files']) == ['file']
@@ -0,0 +1,115 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from prometheus_client import REGISTRY
+
+from gateway.coalescing import AsyncRequestCoalescer, RequestCoalescer
+
+
+def get_collapsed(service):
+    return REGISTRY.get_sample_value('gateway_coalesced_calls_total', {'service': service}) or 0
+
+
+def test_concurrent_calls_are_collapsed():
+    coalescer = RequestCoalescer()
+    release = threading.Event()
+    calls = []
+    results = []
+    collapsed = get_collapsed('coalescing-test')
+
+    def func():
+        calls.append(1)
+        release.wait()
+        return b'content'
+
+    threads = [threading.Thread(target=lambda: results.append(coalescer.do('key', func, 'coalescing-test')))
+               for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for _ in range(100):
+        if get_collapsed('coalescing-test') == collapsed + 2:
+            break
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(results) == [(b'content', False), (b'content', True), (b'content', True)]
+    assert get_collapsed('coalescing-test') == collapsed + 2
+
+    # finished calls are not shared
+    assert coalescer.do('key', func) == (b'content', False)
+    assert len(calls) == 2
+
+
+def test_error_is_raised_for_all_callers():
+    coalescer = RequestCoalescer()
+    release = threading.Event()
+    errors = []
+    collapsed = get_collapsed('coalescing-error-test')
+
+    def func():
+        release.wait()
+        raise ValueError('service is down')
+
+    def call():
+        try:
+            coalescer.do('key', func, 'coalescing-error-test')
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for _ in range(100):
+        if get_collapsed('coalescing-error-test') == collapsed + 1:
+            break
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 2
+    assert errors[0] is errors[1]
+
+
+def test_async_concurrent_calls_are_collapsed():
+    coalescer = AsyncRequestCoalescer()
+    calls = []
+    collapsed = get_collapsed('async-coalescing-test')
+
+    async def func():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return b'content'
+
+    async def do_calls():
+        return await asyncio.gather(coalescer.do('key', func, 'async-coalescing-test'),
+                                    coalescer.do('key', func, 'async-coalescing-test'),
+                                    coalescer.do('other', func, 'async-coalescing-test'))
+
+    results = asyncio.run(do_calls())
+
+    assert len(calls) == 2
+    assert results == [(b'content', False), (b'content', True), (b'content', False)]
+    assert get_collapsed('async-coalescing-test') == collapsed + 1
+
+
+def test_async_error_is_raised_for_all_callers():
+    coalescer = AsyncRequestCoalescer()
+
+    async def func():
+        await asyncio.sleep(0.01)
+        raise ValueError('service is down')
+
+    async def do_calls():
+        return await asyncio.gather(coalescer.do('key', func), coalescer.do('key', func), return_exceptions=True)
+
+    results = asyncio.run(do_calls())
+    assert all(isinstance(result, ValueError) for result in results)
+
+    with pytest.raises(ValueError):
+        asyncio.run(coalescer.do('key', func))
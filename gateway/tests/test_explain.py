@@ -0,0 +1,41 @@
+import pytest
+
+from gateway.explain import ExecutionPlan
+
+
+def test_plan_records_steps():
+    plan = ExecutionPlan()
+    with plan.step('spec', service='documents', fetched=True):
+        pass
+    with plan.step('upstream', url='http://documentservice/documents/1/') as step:
+        step.update(source='service', status=200)
+    with plan.step('upstream', url='http://documentservice/documents/1/') as step:
+        step.update(source='request-cache', status=200)
+    plan.count('join_requests')
+
+    assert [step['step'] for step in plan.steps] == ['spec', 'upstream', 'upstream']
+    assert plan.steps[1]['status'] == 200
+    assert 'duration_ms' in plan.steps[1]
+    summary = plan.get_summary()
+    assert summary['spec_fetches'] == 1
+    assert summary['upstream_requests'] == 1
+    assert summary['upstream_cache_hits'] == 1
+    assert summary['join_requests'] == 1
+
+
+def test_step_duration_is_recorded_on_error():
+    plan = ExecutionPlan()
+    with pytest.raises(ValueError):
+        with plan.step('local', model='core.organization', pk='1'):
+            raise ValueError()
+    assert 'duration_ms' in plan.steps[0]
+
+
+def test_disabled_plan():
+    plan = ExecutionPlan(enabled=False)
+    with plan.step('spec') as step:
+        step['fetched'] = True
+    plan.count('join_requests')
+
+    assert plan.steps == []
+    assert plan.get_summary()['join_requests'] == 0
@@ -0,0 +1,83 @@
+from prometheus_client import REGISTRY
+
+from core.middleware import MetricsMiddleware
+from gateway import metrics, views
+from gateway.asgi import DeferredGatewayResponse
+from gateway.timing import Timings
+
+
+def get_sample_value(name, labels=None):
+    return REGISTRY.get_sample_value(name, labels or {}) or 0
+
+
+def test_measure_upstream_request():
+    labels = {'service': 'metrics-test'}
+    count = get_sample_value('gateway_upstream_request_duration_seconds_count', labels)
+
+    with metrics.measure_upstream_request('metrics-test') as measurement:
+        assert get_sample_value('gateway_upstream_requests_in_flight', labels) == 1
+        measurement.status_code = 200
+
+    assert get_sample_value('gateway_upstream_requests_in_flight', labels) == 0
+    assert get_sample_value('gateway_upstream_request_duration_seconds_count', labels) == count + 1
+    assert get_sample_value('gateway_upstream_responses_total', {**labels, 'status': '200'}) >= 1
+
+
+def test_measure_failed_spec_fetch():
+    errors = get_sample_value('gateway_spec_fetches_total', {'status': 'error'})
+
+    try:
+        with metrics.measure_spec_fetch():
+            raise ConnectionError()
+    except ConnectionError:
+        pass
+
+    assert get_sample_value('gateway_spec_fetches_total', {'status': 'error'}) == errors + 1
+
+
+def test_query_counter():
+    counter = metrics.QueryCounter()
+    assert counter(lambda *args: 'result', 'SELECT 1', None, False, {}) == 'result'
+    assert counter.count == 1
+
+
+def test_metrics_view(request_factory):
+    metrics.JOIN_FANOUT.observe(3)
+
+    response = views.MetricsView.as_view()(request_factory.get('/metrics'))
+
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith('text/plain')
+    assert b'datamesh_join_fanout_bucket{le="5.0"}' in response.content
+
+
+def test_metrics_view_for_not_allowed_client(request_factory, settings):
+    settings.GATEWAY_METRICS_ALLOWED_NETWORKS = ['10.0.0.0/8']
+
+    response = views.MetricsView.as_view()(request_factory.get('/metrics', REMOTE_ADDR='10.1.2.3'))
+    assert response.status_code == 200
+
+    response = views.MetricsView.as_view()(request_factory.get('/metrics', REMOTE_ADDR='192.168.1.1'))
+    assert response.status_code == 403
+
+
+def test_metrics_middleware_is_installed_once(settings):
+    assert settings.MIDDLEWARE.count('core.middleware.MetricsMiddleware') == 1
+
+
+def test_metrics_middleware_tracks_deferred_response_until_closed(request_factory):
+    class GatewayRequestMock:
+        timings = Timings()
+
+    deferred_response = DeferredGatewayResponse(GatewayRequestMock())
+    middleware = MetricsMiddleware(lambda request: deferred_response)
+    in_flight = get_sample_value('http_requests_in_flight')
+    queries = get_sample_value('http_request_db_queries_count')
+
+    response = middleware(request_factory.get('/async/documents/documents/'))
+    assert get_sample_value('http_requests_in_flight') == in_flight + 1
+    assert get_sample_value('http_request_db_queries_count') == queries
+
+    response.close()
+    assert get_sample_value('http_requests_in_flight') == in_flight
+    assert get_sample_value('http_request_db_queries_count') == queries + 1
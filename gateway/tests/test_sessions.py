@@ -0,0 +1,73 @@
+import asyncio
+
+import httpretty
+import requests
+
+from gateway.sessions import AsyncSessionPool, SessionPool
+
+
+def test_session_is_reused_per_endpoint():
+    pool = SessionPool(pool_connections=2, pool_maxsize=5)
+
+    session = pool.get_session('http://documentservice:8080')
+
+    assert pool.get_session('http://documentservice:8080') is session
+    assert pool.get_session('http://locationservice:8080') is not session
+    adapter = session.get_adapter('http://documentservice:8080/documents/')
+    assert adapter._pool_connections == 2
+    assert adapter._pool_maxsize == 5
+
+
+def test_get_key():
+    assert SessionPool.get_key('https://documentservice:8080/documents/1/?a=b') == 'https://documentservice:8080'
+
+
+def test_close():
+    pool = SessionPool(pool_connections=1, pool_maxsize=1)
+    session = pool.get_session('http://documentservice:8080')
+
+    pool.close('http://documentservice:8080')
+
+    assert pool.get_session('http://documentservice:8080') is not session
+
+
+@httpretty.activate
+def test_session_does_not_store_cookies():
+    httpretty.register_uri(httpretty.GET, 'http://documentservice:8080/documents/',
+                           body='[]', adding_headers={'Set-Cookie': 'sessionid=secret; Path=/'})
+    pool = SessionPool(pool_connections=1, pool_maxsize=1)
+    session = pool.get_session('http://documentservice:8080')
+
+    response = session.get('http://documentservice:8080/documents/')
+
+    assert isinstance(response, requests.Response)
+    assert len(session.cookies) == 0
+
+
+def test_async_session_is_shared_within_event_loop():
+    pool = AsyncSessionPool(limit=10, limit_per_host=2, dns_cache_ttl=60, keepalive_timeout=15)
+
+    async def get_sessions():
+        sessions = [pool.get_session(), pool.get_session()]
+        await pool.close()
+        return sessions
+
+    session1, session2 = asyncio.run(get_sessions())
+    assert session1 is session2
+    assert session1.closed
+    assert session1.connector is None or session1.connector.closed
+
+    session3, _ = asyncio.run(get_sessions())
+    assert session3 is not session1
+
+
+def test_async_session_connector_settings():
+    pool = AsyncSessionPool(limit=10, limit_per_host=2, dns_cache_ttl=60, keepalive_timeout=15)
+
+    async def get_connector():
+        connector = pool.get_session().connector
+        limits = connector.limit, connector.limit_per_host, connector.use_dns_cache
+        await pool.close()
+        return limits
+
+    assert asyncio.run(get_connector()) == (10, 2, True)
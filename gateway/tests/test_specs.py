@@ -0,0 +1,289 @@
+import asyncio
+import json
+import os
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+import factories
+from bravado_core.spec import Spec
+
+from gateway.balancing import load_balancers
+from gateway.exceptions import GatewayError
+from gateway.request import AsyncGatewayRequest, GatewayRequest
+from gateway.specs import RouteTable, SwaggerSpecRegistry, spec_registry
+from gateway.utils import get_swagger_url_by_logic_module
+
+CURRENT_PATH = os.path.dirname(os.path.abspath(__file__))
+SCHEMA_URL = 'http://documentservice:8080/docs/swagger.json'
+SPEC_DICT = {
+    'swagger': '2.0',
+    'info': {'title': 'Documents Service API', 'version': 'latest'},
+    'paths': {'/documents/': {'get': {'responses': {'200': {'description': ''}}}}},
+}
+SWAGGER_CONFIG = {
+    'validate_requests': False,
+    'validate_responses': False,
+    'use_models': False,
+    'validate_swagger_spec': False,
+}
+
+
+class FetchMock:
+
+    def __init__(self, status_code=200, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.calls = []
+
+    def __call__(self, schema_url, headers):
+        self.calls.append(headers)
+        if self.status_code == 304:
+            return self.status_code, None, self.headers
+        return self.status_code, SPEC_DICT, self.headers
+
+
+def expire(registry, seconds):
+    for entry in registry._entries.values():
+        entry.fetched_at -= seconds
+
+
+def test_spec_is_fetched_once_while_fresh():
+    registry = SwaggerSpecRegistry(ttl=60, stale_ttl=0)
+    fetch = FetchMock()
+
+    spec1 = registry.get_spec(SCHEMA_URL, fetch, SWAGGER_CONFIG)
+    spec2 = registry.get_spec(SCHEMA_URL, fetch, SWAGGER_CONFIG)
+
+    assert spec1 is spec2
+    assert len(fetch.calls) == 1
+
+
+def test_expired_spec_is_revalidated_with_validators():
+    registry = SwaggerSpecRegistry(ttl=60, stale_ttl=0)
+    spec = registry.get_spec(SCHEMA_URL, FetchMock(headers={'ETag': '"v1"', 'Last-Modified': 'yesterday'}),
+                             SWAGGER_CONFIG)
+    expire(registry, 61)
+
+    fetch = FetchMock(status_code=304)
+    assert registry.get_spec(SCHEMA_URL, fetch, SWAGGER_CONFIG) is spec
+    assert fetch.calls == [{'If-None-Match': '"v1"', 'If-Modified-Since': 'yesterday'}]
+
+    # 304 makes the spec fresh again
+    assert registry.get_spec(SCHEMA_URL, fetch, SWAGGER_CONFIG) is spec
+    assert len(fetch.calls) == 1
+
+
+def test_stale_spec_is_served_while_revalidating():
+    registry = SwaggerSpecRegistry(ttl=60, stale_ttl=60)
+    spec = registry.get_spec(SCHEMA_URL, FetchMock(), SWAGGER_CONFIG)
+    expire(registry, 61)
+
+    fetch = FetchMock()
+    assert registry.get_spec(SCHEMA_URL, fetch, SWAGGER_CONFIG) is spec
+
+    for _ in range(100):
+        if registry._entries[SCHEMA_URL].spec is not spec:
+            break
+        time.sleep(0.01)
+    assert len(fetch.calls) == 1
+    assert registry._entries[SCHEMA_URL].spec is not spec
+
+
+def test_failed_spec_fetch_is_not_cached():
+    registry = SwaggerSpecRegistry(ttl=60, stale_ttl=0)
+
+    for status_code in [500, 404, 304]:
+        with pytest.raises(GatewayError):
+            registry.get_spec(SCHEMA_URL, FetchMock(status_code=status_code), SWAGGER_CONFIG)
+        assert registry.get_state(SCHEMA_URL) == 'missing'
+
+
+def test_failed_revalidation_keeps_spec():
+    registry = SwaggerSpecRegistry(ttl=60, stale_ttl=60)
+    spec = registry.get_spec(SCHEMA_URL, FetchMock(), SWAGGER_CONFIG)
+    expire(registry, 61)
+
+    fetch = FetchMock(status_code=503)
+    assert registry.get_spec(SCHEMA_URL, fetch, SWAGGER_CONFIG) is spec
+    for _ in range(100):
+        if not registry._entries[SCHEMA_URL].revalidating:
+            break
+        time.sleep(0.01)
+    assert len(fetch.calls) == 1
+    assert registry._entries[SCHEMA_URL].spec is spec
+
+    # an expired spec isn't replaced either, the request fails
+    expire(registry, 60)
+    with pytest.raises(GatewayError):
+        registry.get_spec(SCHEMA_URL, fetch, SWAGGER_CONFIG)
+    assert registry._entries[SCHEMA_URL].spec is spec
+
+
+def test_invalidate():
+    registry = SwaggerSpecRegistry(ttl=60, stale_ttl=0)
+    fetch = FetchMock()
+    registry.get_spec(SCHEMA_URL, fetch, SWAGGER_CONFIG)
+
+    registry.invalidate(SCHEMA_URL)
+    registry.get_spec(SCHEMA_URL, fetch, SWAGGER_CONFIG)
+
+    assert len(fetch.calls) == 2
+    assert fetch.calls[1] == {}
+
+
+def test_async_spec_is_fetched_once_while_fresh():
+    registry = SwaggerSpecRegistry(ttl=60, stale_ttl=0)
+    fetch = FetchMock()
+
+    async def async_fetch(schema_url, headers):
+        return fetch(schema_url, headers)
+
+    async def get_specs():
+        return [await registry.async_get_spec(SCHEMA_URL, async_fetch, SWAGGER_CONFIG) for _ in range(2)]
+
+    spec1, spec2 = asyncio.run(get_specs())
+    assert spec1 is spec2
+    assert len(fetch.calls) == 1
+
+
+def test_async_stale_spec_is_revalidated_inline_without_background():
+    registry = SwaggerSpecRegistry(ttl=60, stale_ttl=60)
+    fetch = FetchMock()
+
+    async def async_fetch(schema_url, headers):
+        return fetch(schema_url, headers)
+
+    # every request runs on its own event loop like under WSGI
+    spec = asyncio.run(registry.async_get_spec(SCHEMA_URL, async_fetch, SWAGGER_CONFIG, background=False))
+    expire(registry, 61)
+
+    new_spec = asyncio.run(registry.async_get_spec(SCHEMA_URL, async_fetch, SWAGGER_CONFIG, background=False))
+    assert new_spec is not spec
+    assert registry._entries[SCHEMA_URL].spec is new_spec
+    assert registry.get_state(SCHEMA_URL) == 'fresh'
+    assert len(fetch.calls) == 2
+
+
+def test_async_spec_is_built_with_run_sync():
+    registry = SwaggerSpecRegistry(ttl=60, stale_ttl=0)
+    fetch = FetchMock()
+    calls = []
+
+    async def async_fetch(schema_url, headers):
+        return fetch(schema_url, headers)
+
+    async def run_sync(func, *args):
+        calls.append(func)
+        return func(*args)
+
+    spec = asyncio.run(registry.async_get_spec(SCHEMA_URL, async_fetch, SWAGGER_CONFIG, run_sync=run_sync))
+    assert isinstance(spec, Spec)
+    assert calls == [registry._store]
+
+
+def test_spec_fetch_uses_timeouts_of_logic_module(settings):
+    settings.GATEWAY_CONNECT_TIMEOUT = 5
+    settings.GATEWAY_READ_TIMEOUT = 30
+    logic_module = factories.LogicModule.build(endpoint='http://documentservice:8080', connect_timeout=1,
+                                               read_timeout=2)
+
+    with patch('gateway.request.requests.get', return_value=Mock(status_code=304, headers={})) as get:
+        GatewayRequest._fetch_swagger_spec(SCHEMA_URL, {}, logic_module=logic_module)
+        GatewayRequest._fetch_swagger_spec(SCHEMA_URL, {})
+
+    assert [call[1]['timeout'] for call in get.call_args_list] == [(1, 2), (5, 30)]
+
+
+
+def test_spec_fetch_falls_back_to_other_replica():
+    logic_module = factories.LogicModule.build(endpoint='http://documentservice:8080',
+                                               replica_endpoints=['http://documentservice-2:8080'])
+    results = {'http://documentservice:8080': GatewayError('Connection refused', status=503),
+               'http://documentservice-2:8080': (200, SPEC_DICT, {})}
+
+    def fetch_from(schema_url, headers, logic_module=None):
+        result = results[schema_url.rsplit('/docs/', 1)[0]]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    with patch.object(GatewayRequest, '_fetch_swagger_spec_from', side_effect=fetch_from) as fetch:
+        assert GatewayRequest._fetch_swagger_spec(SCHEMA_URL, {}, logic_module=logic_module)[0] == 200
+
+    assert [call[0][0] for call in fetch.call_args_list] == [
+        'http://documentservice:8080/docs/swagger.json',
+        'http://documentservice-2:8080/docs/swagger.json',
+    ]
+    primary, replica = load_balancers.get(logic_module).replicas
+    assert (primary.failures, replica.failures) == (1, 0)
+    assert primary.outstanding == replica.outstanding == 0
+
+
+def test_async_spec_fetch_falls_back_to_other_replica():
+    logic_module = factories.LogicModule.build(endpoint='http://documentservice:8080',
+                                               replica_endpoints=['http://documentservice-2:8080'])
+
+    async def fetch_from(schema_url, headers, logic_module=None):
+        return (503, None, {}) if schema_url.startswith('http://documentservice:') else (200, SPEC_DICT, {})
+
+    with patch.object(AsyncGatewayRequest, '_fetch_swagger_spec_from', side_effect=fetch_from):
+        result = asyncio.run(AsyncGatewayRequest._fetch_swagger_spec(SCHEMA_URL, {}, logic_module=logic_module))
+
+    assert result == (200, SPEC_DICT, {})
+    primary, replica = load_balancers.get(logic_module).replicas
+    assert (primary.failures, replica.failures) == (1, 0)
+
+
+def test_spec_fetch_fails_if_all_replicas_fail():
+    logic_module = factories.LogicModule.build(endpoint='http://documentservice:8080',
+                                               replica_endpoints=['http://documentservice-2:8080'])
+
+    with patch.object(GatewayRequest, '_fetch_swagger_spec_from', return_value=(502, None, {})) as fetch:
+        assert GatewayRequest._fetch_swagger_spec(SCHEMA_URL, {}, logic_module=logic_module)[0] == 502
+
+    assert fetch.call_count == 2
+    assert all(replica.failures == 1 for replica in load_balancers.get(logic_module).replicas)
+
+
+@pytest.mark.django_db()
+def test_logic_module_save_invalidates_spec():
+    logic_module = factories.LogicModule.create(name='documents', endpoint_name='documents',
+                                                endpoint='http://documentservice:8080')
+    schema_url = get_swagger_url_by_logic_module(logic_module)
+    spec_registry.get_spec(schema_url, FetchMock(), SWAGGER_CONFIG)
+    assert schema_url in spec_registry._entries
+
+    logic_module.save()
+    assert schema_url not in spec_registry._entries
+
+
+def test_route_table():
+    with open(os.path.join(CURRENT_PATH, 'fixtures/swagger_documents.json')) as r:
+        spec = Spec.from_dict(json.load(r), config=SWAGGER_CONFIG)
+    route_table = RouteTable(spec)
+
+    assert route_table.get_route('GET', 'documents') == ('get', 'http://documentservice:8080/documents/')
+    assert route_table.get_route('PATCH', 'documents', 'id') == ('patch',
+                                                                 'http://documentservice:8080/documents/{id}/')
+    assert route_table.get_route('GET', 'file', 'id') == ('get', 'http://documentservice:8080/file/{id}/')
+    assert route_table.get_route('DELETE', 'documents') is None
+    assert route_table.get_route('GET', 'documents', 'uuid') is None
+    assert route_table.get_route('GET', 'file') is None
+
+    # routes match the operations found by bravado
+    for method, model, pk_name in [('get', 'documents', None), ('put', 'documents', 'id'), ('get', 'thumbnail', 'id')]:
+        path = f'/{model}/' if pk_name is None else f'/{model}/{{{pk_name}}}/'
+        operation = spec.get_op_for_request(method, path)
+        assert route_table.get_route(method, model, pk_name) == (operation.http_method,
+                                                                 spec.api_url.rstrip('/') + operation.path_name)
+
+
+def test_route_table_is_compiled_once_per_spec():
+    registry = SwaggerSpecRegistry(ttl=60, stale_ttl=0)
+    spec = registry.get_spec(SCHEMA_URL, FetchMock(), SWAGGER_CONFIG)
+
+    route_table = registry.get_route_table(spec)
+    assert len(route_table) == 1
+    assert registry.get_route_table(spec) is route_table
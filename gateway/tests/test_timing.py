@@ -0,0 +1,66 @@
+import asyncio
+import logging
+
+from django.http import HttpResponse
+
+from gateway.timing import Timings
+
+
+def test_phase_durations_are_summed_up():
+    timings = Timings()
+    timings.add('upstream', 0.010)
+    with timings.phase('spec'):
+        pass
+    timings.add('upstream', 0.0025)
+
+    assert list(timings.durations) == ['upstream', 'spec']
+    assert round(timings.durations['upstream'], 4) == 0.0125
+
+
+def test_concurrent_phases():
+    timings = Timings()
+
+    async def request():
+        with timings.phase('upstream'):
+            await asyncio.sleep(0.05)
+
+    async def gather():
+        await asyncio.gather(request(), request())
+
+    asyncio.run(gather())
+    assert timings.durations['upstream'] >= 0.1
+
+
+def test_header_and_log_fields():
+    timings = Timings()
+    timings.add('auth', 0.0012)
+    timings.add('datamesh-db', 0.5)
+
+    header = timings.get_header()
+    assert header.startswith('auth;dur=1.2, datamesh-db;dur=500.0, total;dur=')
+
+    fields = timings.get_log_fields()
+    assert fields['auth_ms'] == 1.2
+    assert fields['datamesh_db_ms'] == 500.0
+    assert 'total_ms' in fields
+
+
+def test_report(request_factory, settings, caplog):
+    timings = Timings()
+    timings.add('upstream', 0.002)
+    response = HttpResponse(status=201)
+
+    with caplog.at_level(logging.INFO, logger='gateway.timing'):
+        timings.report(request_factory.post('/documents/documents/'), response)
+
+    assert response['Server-Timing'].startswith('upstream;dur=2.0, total;dur=')
+    record = caplog.records[-1]
+    assert record.method == 'POST'
+    assert record.path == '/documents/documents/'
+    assert record.status_code == 201
+    assert record.upstream_ms == 2.0
+
+    settings.GATEWAY_SERVER_TIMING = False
+    response = HttpResponse()
+    timings.report(request_factory.get('/documents/documents/'), response)
+    assert not response.has_header('Server-Timing')
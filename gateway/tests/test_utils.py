@@ -14,7 +14,8 @@ from rest_framework.exceptions import NotAuthenticated, PermissionDenied
 
 import factories
 from gateway.exceptions import GatewayError
-from gateway.utils import GatewayJSONEncoder, validate_object_access, get_swagger_url_by_logic_module, get_swagger_urls, get_swagger_from_url
+from gateway.utils import (GatewayJSONEncoder, validate_object_access, validate_objects_access,
+                           get_swagger_url_by_logic_module, get_swagger_urls, get_swagger_from_url)
 from gateway.views import APIGatewayView
 
 
@@ -71,6 +72,41 @@ class UtilsValidateBuildlyObjectAccessTest(TestCase):
         ret = validate_object_access(request, core_user)
         self.assertIsNone(ret)
 
+    def test_validate_buildly_wfl2s_access_superuser(self):
+        self.core_user.is_staff = True
+        self.core_user.is_superuser = True
+        self.core_user.save()
+
+        request = self.get_mock_request('/', APIGatewayView, self.core_user)
+        wflvl2s = factories.WorkflowLevel2.create_batch(3)
+        validate_objects_access(request, wflvl2s)
+
+    def test_validate_buildly_wfl2s_no_permission(self):
+        request = self.get_mock_request('/', APIGatewayView, self.core_user)
+        wflvl2s = factories.WorkflowLevel2.create_batch(3)
+
+        error_message = 'You do not have permission to perform this action.'
+        with self.assertRaisesMessage(PermissionDenied, error_message):
+            validate_objects_access(request, wflvl2s)
+
+    def test_validate_buildly_wfl1s_not_authenticated_user(self):
+        request = self.get_mock_request('/', APIGatewayView)
+        wflvl1s = factories.WorkflowLevel1.create_batch(2)
+
+        with self.assertRaises(NotAuthenticated):
+            validate_objects_access(request, wflvl1s)
+
+    def test_validate_buildly_logic_modules_no_viewset(self):
+        request = self.get_mock_request('/', APIGatewayView, self.core_user)
+        lms = factories.LogicModule.create_batch(2)
+
+        with self.assertRaises(GatewayError):
+            validate_objects_access(request, lms)
+
+    def test_validate_no_objects(self):
+        request = self.get_mock_request('/', APIGatewayView, self.core_user)
+        self.assertIsNone(validate_objects_access(request, []))
+
 
 def test_json_dump():
     obj = {
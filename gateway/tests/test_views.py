@@ -3,9 +3,10 @@ import json
 
 import pytest
 import httpretty
+from prometheus_client import REGISTRY
 
 import factories
-from core.tests.fixtures import auth_api_client, logic_module
+from core.tests.fixtures import auth_api_client, auth_superuser_api_client, logic_module, superuser
 from .fixtures import datamesh
 
 
@@ -44,6 +45,240 @@ def test_make_service_request_data_and_raw(auth_api_client, logic_module, conten
     assert response.get('Content-Type') == content_type
 
 
+@pytest.mark.django_db()
+@httpretty.activate
+def test_make_service_request_passes_content_through(auth_api_client, logic_module):
+    url = f'/{logic_module.endpoint_name}/thumbnail/1/'
+    content = '{"id":1,  "name": "caf\\u00e9", "price": 1.10}'
+
+    # mock requests
+    with open(os.path.join(CURRENT_PATH, 'fixtures/swagger_documents.json')) as r:
+        swagger_body = r.read()
+    httpretty.register_uri(
+        httpretty.GET,
+        f'{logic_module.endpoint}/docs/swagger.json',
+        body=swagger_body,
+        adding_headers={'Content-Type': 'application/json'}
+    )
+    httpretty.register_uri(
+        httpretty.GET,
+        f'{logic_module.endpoint}/thumbnail/1/',
+        body=content,
+        adding_headers={'Content-Type': 'application/json', 'Content-Disposition': 'attachment; filename="1.json"'}
+    )
+
+    # make api request
+    response = auth_api_client.get(url)
+
+    # without join the body isn't decoded and encoded again
+    assert response.status_code == 200
+    assert response.content == content.encode()
+    assert response.get('Content-Disposition') == 'attachment; filename="1.json"'
+    # durations of the phases of the request are reported
+    phases = [metric.split(';')[0] for metric in response['Server-Timing'].split(', ')]
+    assert phases == ['auth', 'spec', 'upstream', 'total']
+
+
+@pytest.mark.django_db()
+@httpretty.activate
+def test_make_service_request_streams_big_content(auth_api_client, logic_module, settings):
+    settings.GATEWAY_STREAMING_THRESHOLD = 100
+    settings.GATEWAY_STREAMING_CHUNK_SIZE = 64
+    url = f'/{logic_module.endpoint_name}/file/1/'
+    content = b'x' * 1000
+
+    # mock requests
+    with open(os.path.join(CURRENT_PATH, 'fixtures/swagger_documents.json')) as r:
+        swagger_body = r.read()
+    httpretty.register_uri(
+        httpretty.GET,
+        f'{logic_module.endpoint}/docs/swagger.json',
+        body=swagger_body,
+        adding_headers={'Content-Type': 'application/json'}
+    )
+    httpretty.register_uri(
+        httpretty.GET,
+        f'{logic_module.endpoint}/file/1/',
+        body=content,
+        adding_headers={'Content-Type': 'application/octet-stream'}
+    )
+
+    # make api request
+    response = auth_api_client.get(url)
+
+    assert response.status_code == 200
+    assert response.streaming
+    assert b''.join(response.streaming_content) == content
+    assert response.get('Content-Type') == 'application/octet-stream'
+
+
+@pytest.mark.django_db()
+@httpretty.activate
+def test_make_service_request_fails_fast_when_service_is_down(auth_api_client, logic_module, settings):
+    settings.GATEWAY_CIRCUIT_BREAKER_FAILURES = 2
+    url = f'/{logic_module.endpoint_name}/documents/'
+
+    # mock requests
+    with open(os.path.join(CURRENT_PATH, 'fixtures/swagger_documents.json')) as r:
+        swagger_body = r.read()
+    httpretty.register_uri(
+        httpretty.GET,
+        f'{logic_module.endpoint}/docs/swagger.json',
+        body=swagger_body,
+        adding_headers={'Content-Type': 'application/json'}
+    )
+    service_requests = []
+
+    def documents_callback(request, uri, response_headers):
+        service_requests.append(request)
+        return 503, response_headers, 'Service Unavailable'
+
+    httpretty.register_uri(httpretty.GET, f'{logic_module.endpoint}/documents/', body=documents_callback)
+
+    # make api requests
+    responses = [auth_api_client.get(url) for _ in range(3)]
+
+    # the third request isn't sent to the service
+    assert [response.status_code for response in responses] == [503, 503, 503]
+    assert len(service_requests) == 2
+    assert responses[2].json()['detail'].startswith('Service is temporarily unavailable')
+
+
+@pytest.mark.django_db()
+@httpretty.activate
+def test_make_service_request_forwards_caching_headers(auth_api_client, logic_module):
+    url = f'/{logic_module.endpoint_name}/documents/'
+
+    # mock requests
+    with open(os.path.join(CURRENT_PATH, 'fixtures/swagger_documents.json')) as r:
+        swagger_body = r.read()
+    httpretty.register_uri(
+        httpretty.GET,
+        f'{logic_module.endpoint}/docs/swagger.json',
+        body=swagger_body,
+        adding_headers={'Content-Type': 'application/json'}
+    )
+
+    def documents_callback(request, uri, response_headers):
+        response_headers.update({'Content-Type': 'application/json', 'ETag': '"v1"', 'Cache-Control': 'max-age=60'})
+        if request.headers.get('If-None-Match') == '"v1"':
+            return 304, response_headers, ''
+        return 200, response_headers, '[{"id": 1}]'
+
+    httpretty.register_uri(httpretty.GET, f'{logic_module.endpoint}/documents/', body=documents_callback)
+
+    # make api requests
+    response = auth_api_client.get(url)
+    assert response.status_code == 200
+    assert response['ETag'] == '"v1"'
+    assert response['Cache-Control'] == 'max-age=60'
+
+    # conditional requests are passed through
+    response = auth_api_client.get(url, HTTP_IF_NONE_MATCH='"v1"')
+    assert response.status_code == 304
+    assert response.content == b''
+    assert httpretty.last_request().headers['If-None-Match'] == '"v1"'
+
+
+@pytest.mark.django_db()
+@httpretty.activate
+def test_make_service_request_not_modified_by_etag(auth_api_client, logic_module):
+    url = f'/{logic_module.endpoint_name}/documents/'
+
+    # mock requests
+    with open(os.path.join(CURRENT_PATH, 'fixtures/swagger_documents.json')) as r:
+        swagger_body = r.read()
+    httpretty.register_uri(
+        httpretty.GET,
+        f'{logic_module.endpoint}/docs/swagger.json',
+        body=swagger_body,
+        adding_headers={'Content-Type': 'application/json'}
+    )
+    # the service doesn't support conditional requests
+    httpretty.register_uri(
+        httpretty.GET,
+        f'{logic_module.endpoint}/documents/',
+        body='[{"id": 1}]',
+        adding_headers={'Content-Type': 'application/json', 'ETag': '"v1"'}
+    )
+
+    # make api request
+    response = auth_api_client.get(url, HTTP_IF_NONE_MATCH='"v1"')
+
+    assert response.status_code == 304
+    assert response.content == b''
+    assert response['ETag'] == '"v1"'
+
+
+@pytest.mark.django_db()
+@httpretty.activate
+def test_make_service_request_uses_shared_response_cache(auth_api_client, logic_module):
+    logic_module.cache_ttl = 60
+    logic_module.save()
+    url = f'/{logic_module.endpoint_name}/documents/'
+    hits = REGISTRY.get_sample_value('gateway_response_cache_lookups_total',
+                                     {'service': logic_module.endpoint_name, 'result': 'hit'}) or 0
+
+    # mock requests
+    with open(os.path.join(CURRENT_PATH, 'fixtures/swagger_documents.json')) as r:
+        swagger_body = r.read()
+    httpretty.register_uri(
+        httpretty.GET,
+        f'{logic_module.endpoint}/docs/swagger.json',
+        body=swagger_body,
+        adding_headers={'Content-Type': 'application/json'}
+    )
+    service_requests = []
+
+    def documents_callback(request, uri, response_headers):
+        service_requests.append(request)
+        response_headers['Content-Type'] = 'application/json'
+        return 200, response_headers, '[{"id": 1}]'
+
+    httpretty.register_uri(httpretty.GET, f'{logic_module.endpoint}/documents/', body=documents_callback)
+
+    # make api requests
+    responses = [auth_api_client.get(url) for _ in range(2)]
+
+    # the service is requested once
+    assert [response.content for response in responses] == [b'[{"id": 1}]', b'[{"id": 1}]']
+    assert len(service_requests) == 1
+    assert REGISTRY.get_sample_value('gateway_response_cache_lookups_total',
+                                     {'service': logic_module.endpoint_name, 'result': 'hit'}) == hits + 1
+
+
+@pytest.mark.django_db()
+@httpretty.activate
+def test_make_service_request_forwards_raw_json_body(auth_api_client, logic_module):
+    url = f'/{logic_module.endpoint_name}/documents/'
+    body = '{"file_name":  "report.pdf", "size": 1.50}'
+
+    # mock requests
+    with open(os.path.join(CURRENT_PATH, 'fixtures/swagger_documents.json')) as r:
+        swagger_body = r.read()
+    httpretty.register_uri(
+        httpretty.GET,
+        f'{logic_module.endpoint}/docs/swagger.json',
+        body=swagger_body,
+        adding_headers={'Content-Type': 'application/json'}
+    )
+    httpretty.register_uri(
+        httpretty.POST,
+        f'{logic_module.endpoint}/documents/',
+        body='{"id": 1}',
+        status=201,
+        adding_headers={'Content-Type': 'application/json'}
+    )
+
+    # make api request
+    response = auth_api_client.post(url, body, content_type='application/json')
+
+    # the body is forwarded as it was received
+    assert response.status_code == 201
+    assert httpretty.last_request().body == body.encode()
+    assert httpretty.last_request().headers['Content-Type'] == 'application/json'
+
+
 @pytest.mark.django_db()
 @httpretty.activate
 def test_make_service_request_to_unexisting_list_endpoint(auth_api_client, logic_module):
@@ -151,6 +386,11 @@ def test_make_service_request_with_datamesh_detailed(auth_api_client, datamesh):
     assert len(data[relationship.key]) == 1
     assert data[relationship.key][0]['id'] == 1
 
+    # the joined content has its own ETag
+    etag = response['ETag']
+    response = auth_api_client.get(url, {'join': 'true'}, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+
 
 @pytest.mark.django_db()
 @httpretty.activate
@@ -270,3 +510,49 @@ def test_make_service_request_with_datamesh_list(auth_api_client, datamesh):
     item2 = data["results"][1]
     assert relationship.key in item2
     assert len(item2[relationship.key]) == 0
+
+
+@pytest.mark.django_db()
+@httpretty.activate
+def test_explain_service_request_with_datamesh(auth_superuser_api_client, datamesh):
+    lm1, lm2, relationship = datamesh
+    factories.JoinRecord(relationship=relationship,
+                         record_id=None, record_uuid='19a7f600-74a0-4123-9be5-dfa69aa172cc',
+                         related_record_id=1, related_record_uuid=None)
+
+    url = f'/{lm1.endpoint_name}/siteprofiles/19a7f600-74a0-4123-9be5-dfa69aa172cc/'
+
+    # mock requests
+    for lm, swagger_file in [(lm1, 'swagger_location.json'), (lm2, 'swagger_documents.json')]:
+        with open(os.path.join(CURRENT_PATH, 'fixtures', swagger_file)) as r:
+            httpretty.register_uri(httpretty.GET, f'{lm.endpoint}/docs/swagger.json', body=r.read(),
+                                   adding_headers={'Content-Type': 'application/json'})
+    with open(os.path.join(CURRENT_PATH, 'fixtures/data_detail_siteprofile.json')) as r:
+        httpretty.register_uri(httpretty.GET, f'{lm1.endpoint}/siteprofiles/19a7f600-74a0-4123-9be5-dfa69aa172cc/',
+                               body=r.read(), adding_headers={'Content-Type': 'application/json'})
+    with open(os.path.join(CURRENT_PATH, 'fixtures/data_detail_document.json')) as r:
+        httpretty.register_uri(httpretty.GET, f'{lm2.endpoint}/documents/1/',
+                               body=r.read(), adding_headers={'Content-Type': 'application/json'})
+
+    # make api request
+    response = auth_superuser_api_client.get(url, {'join': 'true', 'explain': '1'})
+
+    assert response.status_code == 200
+    explanation = response.json()
+    assert explanation['response']['status'] == 200
+    assert [step['step'] for step in explanation['plan']] == [
+        'spec', 'upstream', 'relationships', 'spec', 'join-records', 'upstream']
+    assert explanation['plan'][1]['url'] == f'{lm1.endpoint}/siteprofiles/19a7f600-74a0-4123-9be5-dfa69aa172cc/'
+    assert explanation['plan'][2]['relationships'] == [
+        {'key': relationship.key, 'direction': 'forward', 'related_model': str(relationship.related_model)}]
+    assert explanation['plan'][4]['count'] == 1
+    assert explanation['plan'][5]['url'] == f'{lm2.endpoint}/documents/1/'
+    assert explanation['summary']['spec_fetches'] == 2
+    assert explanation['summary']['upstream_requests'] == 2
+    assert explanation['summary']['join_requests'] == 1
+
+
+@pytest.mark.django_db()
+def test_explain_service_request_requires_superuser(auth_api_client, logic_module):
+    response = auth_api_client.get(f'/{logic_module.endpoint_name}/documents/', {'explain': '1'})
+    assert response.status_code == 403
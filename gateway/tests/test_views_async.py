@@ -6,6 +6,7 @@ import pytest
 
 import factories
 from core.tests.fixtures import auth_api_client, logic_module
+from gateway.specs import spec_registry
 from .fixtures import datamesh
 from .utils import AiohttpResponseMock, create_aiohttp_session_mock
 
@@ -193,3 +194,150 @@ def test_make_service_request_with_datamesh_list(client_session_mock, auth_api_c
     item2 = data["results"][1]
     assert relationship.key in item2
     assert len(item2[relationship.key]) == 0
+
+
+@pytest.mark.django_db()
+@patch('gateway.request.aiohttp.ClientSession')
+def test_stale_spec_is_refreshed(client_session_mock, auth_api_client, logic_module, event_loop):
+    # mock aiohttp responses
+    with open(os.path.join(CURRENT_PATH, 'fixtures/swagger_documents.json'), 'rb') as r:
+        swagger_body = r.read()
+
+    responses = [
+        AiohttpResponseMock(method='GET', url=f'{logic_module.endpoint}/docs/swagger.json', status=200,
+                            body=swagger_body, headers={'Content-Type': 'application/json'}, delay=0.1),
+        AiohttpResponseMock(method='GET', url=f'{logic_module.endpoint}/documents/', status=200,
+                            body=b'[{"id": 1}]', headers={'Content-Type': 'application/json'}),
+    ]
+    client_session_mock.return_value = create_aiohttp_session_mock(responses, loop=event_loop)
+
+    url = f'/async/{logic_module.endpoint_name}/documents/'
+    schema_url = f'{logic_module.endpoint}/docs/swagger.json'
+    assert auth_api_client.get(url).status_code == 200
+    spec = spec_registry._entries[schema_url].spec
+
+    # make the spec stale, the event loop of the request ends with it, so it's revalidated before serving
+    spec_registry._entries[schema_url].fetched_at -= spec_registry.ttl + 1
+    assert spec_registry.get_state(schema_url) == 'stale'
+    assert auth_api_client.get(url).status_code == 200
+
+    assert spec_registry.get_state(schema_url) == 'fresh'
+    assert spec_registry._entries[schema_url].spec is not spec
+
+
+@pytest.mark.django_db()
+@patch('gateway.request.aiohttp.ClientSession')
+def test_batch_request(client_session_mock, auth_api_client, logic_module, event_loop):
+    # mock aiohttp responses
+    with open(os.path.join(CURRENT_PATH, 'fixtures/swagger_documents.json'), 'rb') as r:
+        swagger_body = r.read()
+
+    responses = [
+        AiohttpResponseMock(method='GET', url=f'{logic_module.endpoint}/docs/swagger.json', status=200,
+                            body=swagger_body, headers={'Content-Type': 'application/json'}),
+        AiohttpResponseMock(method='GET', url=f'{logic_module.endpoint}/documents/', status=200,
+                            body=b'[{"id": 1}]', headers={'Content-Type': 'application/json'}),
+        AiohttpResponseMock(method='GET', url=f'{logic_module.endpoint}/thumbnail/1/', status=200,
+                            body=b'IT IS A TEST', headers={'Content-Type': 'text/html; charset=utf-8'}),
+    ]
+    client_session_mock.return_value = create_aiohttp_session_mock(responses, loop=event_loop)
+
+    # make api request
+    response = auth_api_client.post('/batch/', [
+        {'service': logic_module.endpoint_name, 'model': 'documents'},
+        {'method': 'GET', 'service': logic_module.endpoint_name, 'model': 'thumbnail', 'pk': 1},
+        {'service': 'unknown', 'model': 'documents'},
+        {'method': 'DELETE', 'service': logic_module.endpoint_name, 'model': 'documents'},
+    ], format='json')
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {'status': 200, 'body': [{'id': 1}]},
+        {'status': 200, 'body': 'IT IS A TEST'},
+        {'status': 404, 'body': {'detail': 'Service "unknown" not found.'}},
+        {'status': 400, 'body': {'detail': 'The object ID is missing.'}},
+    ]
+
+
+@pytest.mark.django_db()
+def test_batch_request_validation(auth_api_client, settings):
+    settings.GATEWAY_BATCH_MAX_REQUESTS = 1
+
+    response = auth_api_client.post('/batch/', {'service': 'documents', 'model': 'documents'}, format='json')
+    assert response.status_code == 400
+
+    response = auth_api_client.post('/batch/', [{'service': 'documents', 'model': 'documents'}] * 2, format='json')
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db()
+def test_batch_request_with_invalid_path_segments(auth_api_client, logic_module):
+    response = auth_api_client.post('/batch/', [
+        {'service': logic_module.endpoint_name, 'model': 'documents', 'pk': '1/../../admin'},
+        {'service': logic_module.endpoint_name, 'model': 'documents', 'pk': '1?x=y'},
+        {'service': logic_module.endpoint_name, 'model': 'documents', 'pk': '..'},
+        {'service': logic_module.endpoint_name, 'model': 'documents/1'},
+    ], format='json')
+
+    assert response.status_code == 200
+    assert [item['status'] for item in response.json()] == [400] * 4
+    assert response.json()[0]['body'] == {'detail': 'Invalid pk of the request: 1/../../admin'}
+
+
+@pytest.mark.django_db()
+@patch('gateway.request.aiohttp.ClientSession')
+def test_composite_request(client_session_mock, auth_api_client, logic_module, event_loop):
+    # mock aiohttp responses
+    with open(os.path.join(CURRENT_PATH, 'fixtures/swagger_documents.json'), 'rb') as r:
+        swagger_body = r.read()
+
+    responses = [
+        AiohttpResponseMock(method='GET', url=f'{logic_module.endpoint}/docs/swagger.json', status=200,
+                            body=swagger_body, headers={'Content-Type': 'application/json'}),
+        AiohttpResponseMock(method='GET', url=f'{logic_module.endpoint}/documents/', status=200,
+                            body=b'[{"id": 1}]', headers={'Content-Type': 'application/json'}),
+        AiohttpResponseMock(method='GET', url=f'{logic_module.endpoint}/thumbnail/1/', status=200,
+                            body=b'IT IS A TEST', headers={'Content-Type': 'text/html; charset=utf-8'}),
+    ]
+    client_session_mock.return_value = create_aiohttp_session_mock(responses, loop=event_loop)
+
+    composite_endpoint = factories.CompositeEndpoint(name='dashboard')
+    factories.CompositeEndpointPart(
+        composite_endpoint=composite_endpoint, key='documents',
+        logic_module_model=factories.LogicModuleModel(logic_module_endpoint_name=logic_module.endpoint_name,
+                                                      model='Document', endpoint='/documents/'))
+    factories.CompositeEndpointPart(
+        composite_endpoint=composite_endpoint, key='thumbnail', object_id='1',
+        logic_module_model=factories.LogicModuleModel(logic_module_endpoint_name=logic_module.endpoint_name,
+                                                      model='Thumbnail', endpoint='/thumbnail/'))
+
+    # make api request
+    response = auth_api_client.get('/composite/dashboard/')
+
+    assert response.status_code == 200
+    assert response.json() == {
+        'documents': {'status': 200, 'body': [{'id': 1}]},
+        'thumbnail': {'status': 200, 'body': 'IT IS A TEST'},
+    }
+
+
+@pytest.mark.django_db()
+def test_composite_request_with_invalid_object_id(auth_api_client, logic_module):
+    composite_endpoint = factories.CompositeEndpoint(name='dashboard')
+    factories.CompositeEndpointPart(
+        composite_endpoint=composite_endpoint, key='thumbnail', object_id='1/../../admin',
+        logic_module_model=factories.LogicModuleModel(logic_module_endpoint_name=logic_module.endpoint_name,
+                                                      model='Thumbnail', endpoint='/thumbnail/'))
+
+    response = auth_api_client.get('/composite/dashboard/')
+
+    assert response.status_code == 200
+    assert response.json() == {
+        'thumbnail': {'status': 400, 'body': {'detail': 'Invalid pk of the request: 1/../../admin'}},
+    }
+
+
+@pytest.mark.django_db()
+def test_composite_request_to_unexisting_endpoint(auth_api_client):
+    response = auth_api_client.get('/composite/unknown/')
+    assert response.status_code == 404
@@ -8,12 +8,14 @@ from aiohttp import ClientSession, StreamReader, ContentTypeError, RequestInfo
 
 class AiohttpResponseMock:
 
-    def __init__(self, method, url, status, body, headers=None):
+    def __init__(self, method, url, status, body, headers=None, delay=0):
         self.method = method
         self.url = url
         self.status = status
         self.body = body
         self._headers = headers or {}
+        # seconds the body takes to be read like from a slow service
+        self.delay = delay
 
     def match_request(self, method, url):
         # URLs should exactly match (incl. order of query params), TODO: make more intelligent URL matching
@@ -43,6 +45,7 @@ class AiohttpResponseMock:
 
     @asyncio.coroutine
     def json(self, encoding='utf-8'):
+        yield from asyncio.sleep(self.delay)
         if not getattr(self.body, "decode", False):
             raise ContentTypeError(request_info=RequestInfo(self.url, self.method, self.headers), history=[self])
         return json.loads(self.body.decode(encoding))
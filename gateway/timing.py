@@ -0,0 +1,61 @@
+import logging
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Timings:
+    """
+    Durations of the phases of a gateway request (e.g. permission checks, spec loading, service requests),
+    reported in the Server-Timing header and in the log. Durations of a phase entered several times, also
+    concurrently, are summed up.
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.durations = OrderedDict()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, duration: float) -> None:
+        self.durations[name] = self.durations.get(name, 0) + duration
+
+    def get_total(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def get_header(self) -> str:
+        """ Value of the Server-Timing header with durations in milliseconds """
+        durations = [*self.durations.items(), ('total', self.get_total())]
+        return ', '.join(f'{name};dur={duration * 1000:.1f}' for name, duration in durations)
+
+    def get_log_fields(self) -> Dict[str, float]:
+        """ Durations in milliseconds as fields of a structured log record """
+        durations = [*self.durations.items(), ('total', self.get_total())]
+        return {f'{name.replace("-", "_")}_ms': round(duration * 1000, 1) for name, duration in durations}
+
+    def report(self, request: HttpRequest, response: HttpResponse) -> None:
+        """
+        Add the Server-Timing header to the response, log the durations of the request and add them to the metrics
+        """
+        for name, duration in self.durations.items():
+            metrics.REQUEST_PHASE_DURATION.labels(name).observe(duration)
+        if settings.GATEWAY_SERVER_TIMING:
+            response['Server-Timing'] = self.get_header()
+        fields = self.get_log_fields()
+        logger.info(f'{request.method} {request.path} {response.status_code} {fields["total_ms"]}ms',
+                    extra={'method': request.method, 'path': request.path,
+                           'status_code': response.status_code, **fields})
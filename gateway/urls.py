@@ -22,6 +22,9 @@ schema_view = get_schema_view(
 )
 
 urlpatterns = [
+    re_path(r'^metrics/?$', views.MetricsView.as_view(), name='metrics'),
+    path('batch/', views.APIBatchGatewayView.as_view(), name='api-gateway-batch'),
+    path('composite/<slug:name>/', views.APICompositeGatewayView.as_view(), name='api-gateway-composite'),
     re_path(
         rf"^(?!{'|'.join(API_GATEWAY_RESERVED_NAMES)})"  # Reject any of these
         r"async/"
@@ -1,5 +1,5 @@
 import re
-from typing import Dict
+from typing import Any, Callable, Dict, List
 from uuid import UUID
 
 import datetime
@@ -7,7 +7,7 @@ import json
 import requests
 import logging
 
-from django.db import models
+from django.db import close_old_connections, models
 from rest_framework.request import Request
 
 from workflow import views as wfv
@@ -76,6 +76,18 @@ def get_swagger_from_url(api_url: str):
             f'Please, check that {api_url} is accessible.') from error
 
 
+def call_closing_db_connections(func: Callable, *args) -> Any:
+    """
+    Call a function in a thread pool worker. Database connections of the thread are handled
+    like at the beginning and at the end of a Django request.
+    """
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
 def validate_object_access(request: Request, obj):
     """
     Raise a PermissionDenied-Exception in case the User has no access to
@@ -84,17 +96,42 @@ def validate_object_access(request: Request, obj):
     :param Request request: incoming request
     :param obj: the object to be validated
     """
-    # instantiate ViewSet with action for has_obj_permission
-    model = obj.__class__
+    viewset = get_object_access_viewset(request, obj.__class__)
+    viewset.check_object_permissions(request, obj)
+
+
+def validate_objects_access(request: Request, objs: List[models.Model]):
+    """
+    Raise a PermissionDenied-Exception in case the User has no access to
+    any of the objects of one model or return None. Permissions with a
+    `has_objects_permission` method check all objects at once, so the number
+    of queries doesn't grow with the number of objects.
+
+    :param Request request: incoming request
+    :param objs: the objects of one model to be validated
+    """
+    if not objs:
+        return
+    viewset = get_object_access_viewset(request, objs[0].__class__)
+    for permission in viewset.get_permissions():
+        if hasattr(permission, 'has_objects_permission'):
+            has_permission = permission.has_objects_permission(request, viewset, objs)
+        else:
+            has_permission = all(permission.has_object_permission(request, viewset, obj) for obj in objs)
+        if not has_permission:
+            viewset.permission_denied(request, message=getattr(permission, 'message', None))
+
+
+def get_object_access_viewset(request: Request, model: type):
+    """ Instantiate the ViewSet of the model for checking object permissions """
     try:
         viewset = MODEL_VIEWSETS_DICT[model]()
     except KeyError:
         logging.critical(f'{model} needs to be added to MODEL_VIEWSETS_DICT')
         raise exceptions.GatewayError(
             msg=f'{model} not defined for object access lookup.')
-    else:
-        viewset.request = request
-        viewset.check_object_permissions(request, obj)
+    viewset.request = request
+    return viewset
 
 
 class ObjectAccessValidator:
@@ -107,6 +144,9 @@ class ObjectAccessValidator:
     def validate(self, obj):
         return validate_object_access(self._request, obj)
 
+    def validate_many(self, objs: List[models.Model]):
+        return validate_objects_access(self._request, objs)
+
 
 class GatewayJSONEncoder(json.JSONEncoder):
     """
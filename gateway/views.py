@@ -1,13 +1,29 @@
+import io
+import ipaddress
+import json
 import logging
+import re
+from types import SimpleNamespace
+from typing import Union
 
-from django.http import HttpResponse
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.utils.http import urlencode
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotModified, StreamingHttpResponse
+from django.views.generic import View
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from rest_framework import views
 from rest_framework.request import Request
 from rest_framework.permissions import IsAuthenticated
 
-from gateway import exceptions
+from datamesh.models import CompositeEndpoint, CompositeEndpointPart
+from gateway import API_GATEWAY_PATH_SEGMENT_REGEX, exceptions
+from gateway.asgi import ASGI_EXECUTOR_KEY, DeferredGatewayResponse
+from gateway.explain import EXPLAIN_PARAM, ExecutionPlan
+from gateway.metrics import get_registry
 from gateway.permissions import AllowLogicModuleGroup
-from gateway.request import GatewayRequest, AsyncGatewayRequest
+from gateway.request import AsyncGatewayRequest, BatchGatewayRequest, GatewayRequest, GatewayResponse
+from gateway.timing import Timings
 
 
 logger = logging.getLogger(__name__)
@@ -28,8 +44,21 @@ class APIGatewayView(views.APIView):
         self._logic_modules = dict()
         self._specs = dict()
         self._data = dict()
+        self.timings = Timings()
         super().__init__(*args, **kwargs)
 
+    def check_permissions(self, request):
+        # the user is authenticated lazily by the permission checks, so this includes authentication
+        with self.timings.phase('auth'):
+            super().check_permissions(request)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if not isinstance(response, DeferredGatewayResponse):
+            # deferred responses are reported when they are completed
+            self.timings.report(request, response)
+        return response
+
     def get(self, request, *args, **kwargs):
         return self.make_service_request(request, *args, **kwargs)
 
@@ -52,15 +81,75 @@ class APIGatewayView(views.APIView):
         # validate incoming request before creating a service request
         try:
             self._validate_incoming_request(request, **kwargs)
-        except exceptions.RequestValidationError as e:
+            is_explained = self._pop_explain_param(request)
+        except exceptions.GatewayError as e:
             return HttpResponse(content=e.content, status=e.status, content_type=e.content_type)
 
         gw_request = self.gateway_request_class(request, **kwargs)
+        gw_request.timings = self.timings
+        if is_explained:
+            gw_request.plan = ExecutionPlan()
+            return self.explain_gateway_request(request, gw_request)
+        return self.perform_gateway_request(request, gw_request)
+
+    def perform_gateway_request(self, request: Request, gw_request: GatewayRequest) -> HttpResponse:
+        """
+        Perform the gateway request and create the response from its result
+        """
         gw_response = gw_request.perform()
 
-        return HttpResponse(content=gw_response.content,
-                            status=gw_response.status_code,
-                            content_type=gw_response.headers.get('Content-Type'))
+        if gw_response.is_not_modified(request):
+            response = HttpResponseNotModified()
+        else:
+            response_class = StreamingHttpResponse if gw_response.is_streamed else HttpResponse
+            response = response_class(gw_response.content,
+                                      status=gw_response.status_code,
+                                      content_type=gw_response.headers.get('Content-Type'))
+        for header, value in gw_response.get_forwarded_headers().items():
+            response[header] = value
+        return response
+
+    def explain_gateway_request(self, request: Request, gw_request: GatewayRequest) -> HttpResponse:
+        """
+        Perform the gateway request and respond with the steps it executed instead of its payload
+        """
+        gw_response = gw_request.perform()
+        content = gw_response.content
+        if gw_response.is_streamed:
+            content = b''.join(content)
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+
+        explanation = {
+            'request': {
+                'method': request.method,
+                'path': request.path,
+                'query': request.query_params.urlencode(),
+            },
+            'response': {
+                'status': gw_response.status_code,
+                'content_type': gw_response.headers.get('Content-Type'),
+                'size': len(content or b''),
+            },
+            'plan': gw_request.plan.steps,
+            'summary': gw_request.plan.get_summary(),
+            'timings': self.timings.get_log_fields(),
+        }
+        return HttpResponse(json.dumps(explanation), content_type='application/json')
+
+    @staticmethod
+    def _pop_explain_param(request: Request) -> bool:
+        """
+        Checks if the request is explained and removes the parameter, so it isn't passed to the service
+        """
+        if EXPLAIN_PARAM not in request.query_params:
+            return False
+        if not request.user.is_superuser:
+            raise exceptions.PermissionDenied('Only superusers can explain gateway requests.')
+        query_params = request._request.GET.copy()
+        is_explained = query_params.pop(EXPLAIN_PARAM)[-1].lower() not in ('0', 'false')
+        request._request.GET = query_params
+        return is_explained
 
     def _validate_incoming_request(self, request: Request, **kwargs: dict) -> None:
         """
@@ -76,3 +165,169 @@ class APIAsyncGatewayView(APIGatewayView):
     """
 
     gateway_request_class = AsyncGatewayRequest
+
+    def perform_gateway_request(self, request: Request, gw_request: AsyncGatewayRequest) -> HttpResponse:
+        """
+        When served via ASGI, the gateway request is performed later on the event loop
+        instead of running an event loop in this thread
+        """
+        executor = request.META.get(ASGI_EXECUTOR_KEY)
+        if executor is None:
+            return super().perform_gateway_request(request, gw_request)
+
+        gw_request.executor = executor
+        return DeferredGatewayResponse(gw_request)
+
+
+class APIBatchGatewayView(APIGatewayView):
+    """
+    Performs many gateway requests in one round trip. The batch is authenticated once and its items,
+    a list of `{"method", "service", "model", "pk", "query", "data"}` objects, are performed concurrently.
+    The response is the list of statuses and bodies of the items in the same order.
+    """
+
+    permission_classes = (IsAuthenticated,)
+    http_method_names = ['post', 'options']
+
+    def post(self, request, *args, **kwargs):
+        items = request.data
+        if not isinstance(items, list):
+            e = exceptions.RequestValidationError('A list of requests is expected.', 400)
+            return HttpResponse(content=e.content, status=e.status, content_type=e.content_type)
+        if len(items) > settings.GATEWAY_BATCH_MAX_REQUESTS:
+            e = exceptions.RequestValidationError(
+                f'A batch can have {settings.GATEWAY_BATCH_MAX_REQUESTS} requests at most.', 400)
+            return HttpResponse(content=e.content, status=e.status, content_type=e.content_type)
+
+        permissions = {}
+        gw_request = BatchGatewayRequest(request, [self._prepare_item(request, item, permissions) for item in items])
+        return self.perform_batch_request(request, gw_request)
+
+    def perform_batch_request(self, request: Request, gw_request: BatchGatewayRequest) -> HttpResponse:
+        gw_request.timings = self.timings
+        executor = request.META.get(ASGI_EXECUTOR_KEY)
+        if executor is not None:
+            gw_request.executor = executor
+            return DeferredGatewayResponse(gw_request)
+        gw_response = gw_request.perform()
+        return HttpResponse(gw_response.content, status=gw_response.status_code,
+                            content_type=gw_response.headers.get('Content-Type'))
+
+    def _prepare_item(self, request: Request, item: dict,
+                      permissions: dict) -> Union[AsyncGatewayRequest, GatewayResponse]:
+        """
+        Create the gateway request of the item or the response of the item if it can't be performed.
+        Permissions are checked once per service and method.
+        """
+        try:
+            item_kwargs = self._get_item_kwargs(item)
+            item_request = self._create_item_request(request, item, item_kwargs)
+            self._validate_incoming_request(item_request, **item_kwargs)
+
+            permission_key = (item_kwargs['service'], item_request.method)
+            if permission_key not in permissions:
+                permissions[permission_key] = AllowLogicModuleGroup().has_permission(
+                    item_request, SimpleNamespace(kwargs=item_kwargs))
+            if not permissions[permission_key]:
+                raise exceptions.PermissionDenied('You do not have permission to perform this action.')
+        except exceptions.GatewayError as e:
+            return GatewayResponse(e.content, e.status, {'Content-Type': e.content_type})
+
+        return AsyncGatewayRequest(item_request, **item_kwargs)
+
+    @staticmethod
+    def _get_item_kwargs(item: dict) -> dict:
+        if not isinstance(item, dict) or not item.get('service') or not item.get('model'):
+            raise exceptions.RequestValidationError('Service and model of the request are required.', 400)
+        method = str(item.get('method', 'GET')).upper()
+        if method not in ['GET', 'POST', 'PUT', 'PATCH', 'DELETE']:
+            raise exceptions.RequestValidationError(f'Method not allowed: {method}', 405)
+        pk = item.get('pk')
+        item_kwargs = {
+            'service': str(item['service']),
+            'model': str(item['model']),
+            'pk': str(pk) if pk is not None else None,
+        }
+        for name, value in item_kwargs.items():
+            if value is not None and not re.match(API_GATEWAY_PATH_SEGMENT_REGEX, value):
+                raise exceptions.RequestValidationError(f'Invalid {name} of the request: {value}', 400)
+        return item_kwargs
+
+    def _create_item_request(self, request: Request, item: dict, item_kwargs: dict) -> Request:
+        """ Create the request of the item with the headers and the user of the batch request """
+        path = f'/{item_kwargs["service"]}/{item_kwargs["model"]}/'
+        if item_kwargs['pk'] is not None:
+            path += f'{item_kwargs["pk"]}/'
+        query = item.get('query') or ''
+        if isinstance(query, dict):
+            query = urlencode(query, doseq=True)
+        body = json.dumps(item['data']).encode('utf-8') if item.get('data') is not None else b''
+
+        environ = dict(request.META)
+        environ.update({
+            'REQUEST_METHOD': str(item.get('method', 'GET')).upper(),
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': io.BytesIO(body),
+        })
+        item_request = Request(WSGIRequest(environ), parsers=self.get_parsers(),
+                               negotiator=self.get_content_negotiator())
+        # the batch is authenticated already
+        item_request.user = request.user
+        item_request.auth = request.auth
+        return item_request
+
+
+class APICompositeGatewayView(APIBatchGatewayView):
+    """
+    Performs the requests of a composite endpoint defined in the data mesh concurrently and merges
+    the results into one response: an object with the status and body of each part under its key.
+    """
+
+    http_method_names = ['get', 'options']
+
+    def get(self, request, *args, **kwargs):
+        try:
+            composite_endpoint = CompositeEndpoint.objects.get(name=kwargs['name'])
+        except CompositeEndpoint.DoesNotExist:
+            e = exceptions.EndpointNotFound(f'Composite endpoint "{kwargs["name"]}" not found.')
+            return HttpResponse(content=e.content, status=e.status, content_type=e.content_type)
+
+        parts = list(composite_endpoint.parts.select_related('logic_module_model'))
+        permissions = {}
+        items = [self._prepare_item(request, self._get_part_item(part), permissions) for part in parts]
+        gw_request = BatchGatewayRequest(request, items, keys=[part.key for part in parts])
+        return self.perform_batch_request(request, gw_request)
+
+    @staticmethod
+    def _get_part_item(part: CompositeEndpointPart) -> dict:
+        return {
+            'method': 'GET',
+            'service': part.logic_module_model.logic_module_endpoint_name,
+            'model': part.logic_module_model.endpoint.strip('/'),
+            'pk': part.object_id or None,
+            'query': part.query,
+        }
+
+
+class MetricsView(View):
+    """
+    Metrics of the gateway in the Prometheus text format, aggregated over all processes in multi-process mode.
+    Only clients from GATEWAY_METRICS_ALLOWED_NETWORKS get them.
+    """
+
+    def get(self, request, *args, **kwargs):
+        if not self.is_client_allowed(request):
+            return HttpResponseForbidden()
+        return HttpResponse(generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST)
+
+    @staticmethod
+    def is_client_allowed(request) -> bool:
+        try:
+            address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+        except ValueError:
+            return False
+        return any(address in ipaddress.ip_network(network.strip(), strict=False)
+                   for network in settings.GATEWAY_METRICS_ALLOWED_NETWORKS if network.strip())
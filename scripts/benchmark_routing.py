@@ -0,0 +1,56 @@
+"""
+Micro-benchmark of routing gateway requests to service operations: resolving the operation via
+`Spec.get_op_for_request` with URL templating for every call versus the precompiled route table.
+
+Run from the project root:
+    python scripts/benchmark_routing.py [number of calls]
+"""
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bravado_core.spec import Spec  # noqa: E402
+
+from gateway.specs import RouteTable  # noqa: E402
+
+SWAGGER_PATH = 'gateway/tests/fixtures/swagger_documents.json'
+SWAGGER_CONFIG = {
+    'validate_requests': False,
+    'validate_responses': False,
+    'use_models': False,
+    'validate_swagger_spec': False,
+}
+PK = '1234'
+
+
+def route_with_spec(spec: Spec):
+    path = '/documents/{id}/'
+    operation = spec.get_op_for_request('GET', path)
+    url = spec.api_url.rstrip('/') + operation.path_name
+    return operation.http_method.lower(), url.replace('{id}', PK)
+
+
+def route_with_route_table(route_table: RouteTable):
+    method, url = route_table.get_route('GET', 'documents', 'id')
+    return method, url.replace('{id}', PK)
+
+
+def main(number: int):
+    with open(SWAGGER_PATH) as f:
+        spec = Spec.from_dict(json.load(f), config=SWAGGER_CONFIG)
+    route_table = RouteTable(spec)
+    assert route_with_spec(spec) == route_with_route_table(route_table)
+
+    compile_time = timeit.timeit(lambda: RouteTable(spec), number=100) / 100
+    print(f'Compiling the route table: {compile_time * 1e6:.1f} us once per spec')
+    for name, func, arg in [('Spec.get_op_for_request', route_with_spec, spec),
+                            ('RouteTable.get_route', route_with_route_table, route_table)]:
+        total = min(timeit.repeat(lambda: func(arg), number=number, repeat=5))
+        print(f'{name}: {total / number * 1e9:.0f} ns per call')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
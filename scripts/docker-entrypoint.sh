@@ -13,5 +13,15 @@ python manage.py loadinitialdata
 echo $(date -u) "- Collect Static"
 python manage.py collectstatic --no-input
 
+if [ -n "$prometheus_multiproc_dir" ] ; then
+    echo $(date -u) "- Clear Metrics"
+    rm -rf "$prometheus_multiproc_dir"
+    mkdir -p "$prometheus_multiproc_dir"
+fi
+
 echo $(date -u) "- Running the server"
-gunicorn -b 0.0.0.0:8080 buildly.wsgi
+if [ "$ASGI" = "True" ] ; then
+    gunicorn -c buildly/gunicorn.py -b 0.0.0.0:8080 -k uvicorn.workers.UvicornWorker buildly.asgi:application
+else
+    gunicorn -c buildly/gunicorn.py -b 0.0.0.0:8080 buildly.wsgi
+fi
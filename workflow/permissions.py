@@ -157,3 +157,37 @@ class CoreGroupsPermissions(permissions.BasePermission):
                     return True
 
         return False
+
+    def has_objects_permission(self, request, view, objs):
+        """
+        Object permissions of many objects of one model at once. The groups of the user are loaded once and
+        the groups of the related workflow levels 1 are checked with one query.
+        """
+        if request.user.is_anonymous or not request.user.is_active:
+            return False
+
+        if request.user.is_global_admin:
+            return True
+
+        model_cls = self._queryset(view).model
+
+        if request.user.is_org_admin:
+            return True
+
+        if model_cls is not WorkflowLevel1 and not all(hasattr(obj, 'workflowlevel1_id') for obj in objs):
+            return all(self.has_object_permission(request, view, obj) for obj in objs)
+        if not hasattr(view, 'action'):
+            return False
+
+        allowed_group_pks = {group.pk for group in request.user.core_groups.all()
+                             if has_permission(group.display_permissions, view.action)
+                             and (group.is_org_level or model_cls is not WorkflowLevel1)}
+        if model_cls is WorkflowLevel1 or not allowed_group_pks:
+            # Permissions on WorkflowLevel1 itself are defined by Org-level permissions
+            return bool(allowed_group_pks)
+
+        wflvl1_pks = {obj.workflowlevel1_id for obj in objs}
+        allowed_wflvl1_pks = set(WorkflowLevel1.core_groups.through.objects.filter(
+            workflowlevel1_id__in=wflvl1_pks, coregroup_id__in=allowed_group_pks,
+        ).values_list('workflowlevel1_id', flat=True))
+        return wflvl1_pks <= allowed_wflvl1_pks